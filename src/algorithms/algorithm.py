@@ -1,58 +1,146 @@
 import numpy as np
 import time
 from utils.stats_collector import StatsCollector
-from tqdm import tqdm
+from utils.random_stream import RandomStream
+from core.problem_context import ProblemContext
 
 class Algorithm:
-    def __init__(self, name, dcop_instance, args, seed=1234):
+    def __init__(self, name, dcop_instance, args, seed=1234, context=None):
         self.name = name
         self.instance = dcop_instance
+        # Structures derived from the instance, possibly shared with other algorithms
+        self.context = context if context is not None else ProblemContext(dcop_instance)
+        self.context.addListener(self)
         self.status = 'Initializing'
         self.iterations_limit = args['max_iter']
         self.curr_iterations_limit = args['max_iter']
         self.curr_iteration = 0
         self.prng = np.random.RandomState(seed)
+        # Block-buffered random numbers for the hot loops
+        self.rng = RandomStream(seed)
         self.num_messages_sent = 0
         self.curr_runtime = 0
         self.curr_cost = np.infty
         self.stats = StatsCollector()
+        # Wall-clock time (as returned by time.time()) at which the run is stopped, if any
+        self.deadline = None
+        # Optional communication profiler (see utils.comm_profiler.CommProfiler)
+        self.comm = None
+        # Optional monitor of the run, with a step(alg) method called at the end of each iteration which
+        # returns True to stop the run (e.g., portfolio.PortfolioMonitor)
+        self.monitor = None
+        self.interrupted = False
+
+    def attachCommProfiler(self, profiler):
+        self.comm = profiler
+
+    def attachMonitor(self, monitor):
+        self.monitor = monitor
 
     def reset(self, newseed):
         self.seed = newseed
         self.curr_iteration = 0
         self.prng = np.random.RandomState(newseed)
+        self.rng = RandomStream(newseed)
         self.num_messages_sent = 0
         self.curr_runtime = 0
         self.curr_cost = np.infty
         self.stats.reset()
+        if self.comm is not None:
+            self.comm.reset()
         self.curr_iterations_limit = self.iterations_limit
+        self.deadline = None
+        self.interrupted = False
         for var in self.instance.variables.values():
             var.setAssignment(0)
 
-    def run(self, interactive=True, pbar=None, chain=False):
-        # self.curr_iteration = 0
-        # self.curr_cost = 0
-        # self.num_messages_sent = 0
-        if len(self.stats.iter_stats) > 0:
-            self.curr_iteration = self.stats.iter_stats[-1]['iteration'] + 1
-            self.num_messages_sent = self.stats.iter_stats[-1]['messages']
-            self.curr_iterations_limit = self.curr_iteration + self.iterations_limit - 1
-        off_time = 0 if self.curr_iteration == 0 else self.stats.iter_stats[-1]['time']
+    def setDeadline(self, deadline):
+        """Stops the run at the end of the first iteration completed after the wall-clock time :param deadline"""
+        self.deadline = deadline
+
+    def getAssignment(self):
+        """:return: The array of value indexes of the assignment currently held by the algorithm"""
+        return self.context.getAssignment()
+
+    def warmStart(self, source):
+        """
+        Starts the next run from the assignment of :param source, which is either another algorithm
+        (e.g., the previous stage of a pipeline) or an array of value indexes.
+        """
+        x = source.getAssignment() if isinstance(source, Algorithm) else source
+        self.context.setAssignment(x)
+
+    def onInstanceChange(self, changes):
+        """
+        Called after the instance changed (see DCOPInstance.addListener), e.g., by a monitor between two
+        iterations of a run or between two runs: the algorithm adapts its state to the new instance, keeping
+        what is still valid (the assignment of the variables, the messages on the edges that still exist) so
+        that the run continues from it. By default the algorithm holds no state beyond the assignment.
+        """
+        pass
 
+    def getReport(self):
+        """:return: A dictionary of algorithm specific results added to the results of api.run (none by default)"""
+        return {}
+
+    def getState(self):
+        """
+        :return: The state of the run, from which setState() continues it exactly (see utils.checkpoint).
+        Algorithms holding more state (e.g., messages) extend it.
+        """
+        return {'name': self.name,
+                'curr_iteration': self.curr_iteration,
+                'curr_iterations_limit': self.curr_iterations_limit,
+                'num_messages_sent': self.num_messages_sent,
+                'curr_runtime': self.curr_runtime,
+                'curr_cost': self.curr_cost,
+                'prng': self.prng.get_state(),
+                'rng': self.rng.getState()}
+
+    def setState(self, state):
+        assert state['name'] == self.name, 'The state is of algorithm ' + state['name']
+        self.curr_iteration = state['curr_iteration']
+        self.curr_iterations_limit = state['curr_iterations_limit']
+        self.num_messages_sent = state['num_messages_sent']
+        self.curr_runtime = state['curr_runtime']
+        self.curr_cost = state['curr_cost']
+        self.prng.set_state(state['prng'])
+        self.rng.setState(state['rng'])
+
+    def run(self, interactive=True, pbar=None, chain=False, resume=False, checkpointer=None):
+        """
+        :param resume: Continues the run from the state restored by setState() instead of starting it.
+        :param checkpointer: An optional utils.checkpoint.Checkpointer, called at the end of every iteration.
+        """
+        if resume:
+            off_time = self.curr_runtime
+        else:
+            if len(self.stats.iter_stats) > 0:
+                self.curr_iteration = self.stats.iter_stats[-1]['iteration'] + 1
+                self.num_messages_sent = self.stats.iter_stats[-1]['messages']
+                self.curr_iterations_limit = self.curr_iteration + self.iterations_limit - 1
+            off_time = 0 if self.curr_iteration == 0 else self.stats.iter_stats[-1]['time']
 
         start_time = time.time()
-        for agtId in self.instance.agents:
-            agt = self.instance.agents[agtId]
-            self.onStart(agt)
+        if not resume:
+            for agtId in self.instance.agents:
+                agt = self.instance.agents[agtId]
+                self.onStart(agt)
 
-        self.curr_runtime = time.time() - start_time + off_time
-        self.stats.updateIterStats(self, interactive=interactive)
+            self.curr_runtime = time.time() - start_time + off_time
+            self.stats.updateIterStats(self, interactive=interactive)
 
         while not self.terminationCondition():
             self.runIteration()
             self.curr_runtime = time.time() - start_time + off_time
             self.stats.updateIterStats(self, interactive=interactive)
-            pbar.update(1)
+            if checkpointer is not None:
+                checkpointer.step(self)
+            if pbar is not None:
+                pbar.update(1)
+            if self.monitor is not None and self.monitor.step(self):
+                self.interrupted = True
+                break
 
         for agtId in self.instance.agents:
             agt = self.instance.agents[agtId]
@@ -72,6 +160,9 @@ class Algorithm:
             agt = self.instance.agents[agtId]
             self.onCycleEnd(agt)
 
+        if self.comm is not None:
+            self.comm.endIteration(self.curr_iteration)
+
     def onStart(self, agt):
         pass
 
@@ -88,4 +179,5 @@ class Algorithm:
         pass
 
     def terminationCondition(self):
-        return self.curr_iteration >= self.curr_iterations_limit
+        return self.curr_iteration >= self.curr_iterations_limit \
+               or self.deadline is not None and time.time() >= self.deadline
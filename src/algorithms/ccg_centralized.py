@@ -1,26 +1,36 @@
+import copy
 import networkx as nx
 import numpy as np
 
 from algorithms.algorithm import Algorithm
-from utils.ccg_utils import transform_dcop_instance_to_ccg, set_var_value
+from core.problem_context import ProblemContext
+from utils.ccg_utils import set_var_value
 
 
 class CCGCentralized(Algorithm):
 
-    def __init__(self, name, dcop_instance, args={'max_iter':10, 'damping':0}, ccg=None, seed=1234):
-        super(CCGCentralized, self).__init__(name, dcop_instance, args, seed)
+    def __init__(self, name, dcop_instance, args={'max_iter':10, 'damping':0}, ccg=None, seed=1234,
+                 context=None):
+        if ccg is not None and context is None:
+            context = ProblemContext(dcop_instance, ccg=ccg)
+        super(CCGCentralized, self).__init__(name, dcop_instance, args, seed, context)
         self.damping = args['damping']
+        self._bindContext()
 
-        if ccg is not None:
-            self.ccg = ccg
-        else:
-            self.ccg = transform_dcop_instance_to_ccg(dcop_instance)
+    def _bindContext(self):
+        self.ccg = self.context.ccg
         self.msgs = {u: {v: np.asarray([0,0]) for v in self.ccg.neighbors(u)} for u in self.ccg.nodes()}
-        self.root = min([aname for aname in dcop_instance.agents])
-        self.variables = dcop_instance.variables.values()
-        self.var_ccg_nodes = {vname : [(u, data['rank']) for u, data in self.ccg.nodes(data=True)
-                                                         if ('variable' in data and data['variable'] == vname)]
-                                for vname in dcop_instance.variables}
+        self.root = min([aname for aname in self.instance.agents])
+        self.ccg_owner = self.context.ccg_owner
+        self.variables = self.instance.variables.values()
+        self.var_ccg_nodes = self.context.var_ccg_nodes
+        self.ccg_index = self.context.ccg_index
+        self.decoder = self.context.decoder
+
+    def onInstanceChange(self, changes):
+        # The context rebuilds the whole CCG of the new instance (see ProblemContext.onInstanceChange): the
+        # messages restart from zero on it, the variables keep their values until the next decoding
+        self._bindContext()
 
     def onStart(self, agt):
         #agt.setRandomAssignment()
@@ -62,13 +72,15 @@ class CCGCentralized(Algorithm):
                 m -= np.min(m) # m -= np.mean(m)
 
                 # Add noise to help stabilizing convergence
-                m += self.prng.normal(scale=1, size=len(m))
+                m += self.rng.normal(1.0, len(m))
 
                 # Damping
                 if self.damping > 0:
                     m = self.damping * self.msgs[u][v] + (1-self.damping) * m
 
                 self.num_messages_sent += 1
+                if self.comm is not None:
+                    self.comm.record(self.ccg_owner[u], self.ccg_owner[v], m.nbytes)
                 self.msgs[u][v] = m
 
     def onCycleEnd(self, agt):
@@ -77,14 +89,23 @@ class CCGCentralized(Algorithm):
 
         ccg = self.ccg
         weights = nx.get_node_attributes(ccg, 'weight')
-        vertex_cover = []
+        index = self.ccg_index.index
+        cover = self.context.ccg_cover_mask.copy()
         for u in ccg.nodes():
-            sum_msgs = np.sum(self.msgs[t][u] for t in ccg.neighbors(u))
+            sum_msgs = sum((self.msgs[t][u] for t in ccg.neighbors(u)), np.zeros(2))
             if sum_msgs[0] > sum_msgs[1] + weights[u]:
-                vertex_cover.append(u)
+                cover[index[u]] = True
 
-        for var in self.variables:
-            set_var_value(var, vertex_cover, self.var_ccg_nodes[var.name], self.prng)
+        self.decoder.assign(cover, self.prng)
 
     def onTermination(self, agt):
         pass
+
+    def getState(self):
+        state = super(CCGCentralized, self).getState()
+        state['msgs'] = copy.deepcopy(self.msgs)
+        return state
+
+    def setState(self, state):
+        super(CCGCentralized, self).setState(state)
+        self.msgs = copy.deepcopy(state['msgs'])
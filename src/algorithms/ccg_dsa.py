@@ -2,51 +2,62 @@ import numpy as np
 import networkx as nx
 
 from algorithms.algorithm import Algorithm
-from utils.ccg_utils import transform_dcop_instance_to_ccg, set_var_value
+from core.problem_context import ProblemContext
+from utils.comm_profiler import VALUE_NBYTES
 
 class CCGDsa(Algorithm):
-    def __init__(self, name, dcop_instance, args={'max_iter':10, 'type': 'A', 'p': 0.7}, ccg=None, seed=1234):
-        super(CCGDsa, self).__init__(name, dcop_instance, args, seed)
+    def __init__(self, name, dcop_instance, args={'max_iter':10, 'type': 'A', 'p': 0.7}, ccg=None, seed=1234,
+                 context=None):
+        if ccg is not None and context is None:
+            context = ProblemContext(dcop_instance, ccg=ccg)
+        super(CCGDsa, self).__init__(name, dcop_instance, args, seed, context)
         self.dsa_type = args['type']
         self.dsa_p    = args['p']
+        self._bindContext()
 
-        if ccg is not None:
-            self.ccg = ccg
-        else:
-            self.ccg = transform_dcop_instance_to_ccg(dcop_instance)
-        self.root = min([aname for aname in dcop_instance.agents])
+    def _bindContext(self):
+        self.ccg = self.context.ccg
+        self.root = min([aname for aname in self.instance.agents])
+        self.ccg_owner = self.context.ccg_owner
         self.view = {u: 0 for u in self.ccg.nodes()}
         self.values = {u: 0 for u in self.ccg.nodes()}
-        self.variables = dcop_instance.variables.values()
-        self.var_ccg_nodes = {vname : [(u, data['rank']) for u, data in self.ccg.nodes(data=True)
-                                                         if ('variable' in data and data['variable'] == vname)]
-                                for vname in dcop_instance.variables}
+        self.variables = self.instance.variables.values()
+        self.var_ccg_nodes = self.context.var_ccg_nodes
+        self.ccg_ids = self.context.ccg_index.ids(self.ccg.nodes())
+        self.decoder = self.context.decoder
 
+    def onInstanceChange(self, changes):
+        # The context rebuilds the CCG of the new instance: the values of its decision nodes are set from the
+        # values of the variables
+        self._bindContext()
+        self._encodeAssignment()
 
     def onStart(self, agt):
         # First Iteration: Set random assignment
         agt.setRandomAssignment()
         if agt.name is self.root:
-            for var in self.variables:
-                v_val = var.value
-                # Set associated node to 0 and all others to 1
-                vc = []
-                for (u, r) in self.var_ccg_nodes[var.name]:
-                    if v_val == 0:
+            self._encodeAssignment()
+
+    def _encodeAssignment(self):
+        for var in self.variables:
+            v_val = var.value
+            # Set associated node to 0 and all others to 1
+            vc = []
+            for (u, r) in self.var_ccg_nodes[var.name]:
+                if v_val == 0:
+                    self.values[u] = 1
+                    vc.append(u)
+                else:
+                    if r == v_val:
+                        self.values[u] = 0
+                    else:
                         self.values[u] = 1
                         vc.append(u)
-                    else:
-                        if r == v_val:
-                            self.values[u] = 0
-                        else:
-                            self.values[u] = 1
-                            vc.append(u)
-                #set_var_value(var, vc, self.var_ccg_nodes[var.name], self.prng)
 
-            non_dec =[u for u, data in self.ccg.nodes(data=True) if 'variable' not in data]
+        non_dec =[u for u, data in self.ccg.nodes(data=True) if 'variable' not in data]
 
-            for u in non_dec:
-                self.values[u] = self.prng.randint(low=0, high=1)
+        for u in non_dec:
+            self.values[u] = self.prng.randint(low=0, high=1)
 
     def onCycleStart(self, agt):
         pass
@@ -73,6 +84,8 @@ class CCGDsa(Algorithm):
             for v in ccg.neighbors(u):
                 self.view[v] = self.values[v]
                 self.num_messages_sent += 1
+                if self.comm is not None:
+                    self.comm.record(self.ccg_owner[v], self.ccg_owner[u], VALUE_NBYTES)
 
             # Get best value:
             curr_cost = evaluate(u, self.values[u], ccg, self.view, weights)
@@ -85,7 +98,7 @@ class CCGDsa(Algorithm):
             Delta = curr_cost - np.min(best_new_cost)
             if Delta > 0 or (Delta == 0 and self.dsa_type == 'C'):
                 # Select new values with probability p
-                if self.prng.binomial(n=1, p=self.dsa_p):
+                if self.rng.binomial(self.dsa_p):
                     self.values[u] = best_assignment
 
     def onCycleEnd(self, agt):
@@ -93,7 +106,18 @@ class CCGDsa(Algorithm):
             return
 
         ccg = self.ccg
-        vertex_cover = [u for u in ccg.nodes() if self.values[u] == 1]
-        #print('L= ', len(vertex_cover))
-        for var in self.variables:
-            set_var_value(var, vertex_cover, self.var_ccg_nodes[var.name], self.prng)
+        cover = self.context.ccg_cover_mask.copy()
+        cover[self.ccg_ids] = np.fromiter((self.values[u] == 1 for u in ccg.nodes()), dtype=bool,
+                                          count=len(self.ccg_ids))
+        self.decoder.assign(cover, self.prng)
+
+    def getState(self):
+        state = super(CCGDsa, self).getState()
+        state['view'] = dict(self.view)
+        state['values'] = dict(self.values)
+        return state
+
+    def setState(self, state):
+        super(CCGDsa, self).setState(state)
+        self.view = dict(state['view'])
+        self.values = dict(state['values'])
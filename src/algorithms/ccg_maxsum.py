@@ -21,6 +21,7 @@ Schema:
 """
 from io import StringIO
 from operator import mul
+import copy
 from tempfile import NamedTemporaryFile
 import itertools
 import subprocess
@@ -34,32 +35,78 @@ from core.agent import Agent
 from core.constraint import Constraint
 from core.dcop_instance import DCOPInstance
 from utils.utils import takeMin, insertInTuple
-from utils.ccg_utils import transform_dcop_instance_to_ccg, make_gadgets, set_var_value
+from core.problem_context import ProblemContext
+from utils.ccg_utils import set_var_value
 
 
 class CCGMaxSum(Algorithm):
-    def __init__(self, name, dcop_instance, args={'max_iter':10, 'damping':0}, ccg=None, seed=1234):
-        super(CCGMaxSum, self).__init__(name, dcop_instance, args, seed)
+    def __init__(self, name, dcop_instance, args={'max_iter':10, 'damping':0}, ccg=None, seed=1234,
+                 context=None):
+        if ccg is not None and context is None:
+            context = ProblemContext(dcop_instance, ccg=ccg)
+        super(CCGMaxSum, self).__init__(name, dcop_instance, args, seed, context)
         self.damping = args['damping']
-
-        if ccg is not None:
-            self.ccg = ccg
-        else:
-            self.ccg = transform_dcop_instance_to_ccg(dcop_instance)
-        self.msgs = {u: {v: np.asarray([0,0]) for v in self.ccg.neighbors(u)} for u in self.ccg.nodes()}
-        self.agt_ccg = make_gadgets(self.ccg, dcop_instance)
+        self._bindContext()
+
+    def _bindContext(self):
+        self.ccg = self.context.ccg
+        self.ccg_index = self.context.ccg_index
+        # Messages over the directed edges of the CCG: edge k of ccg.edges() holds its message u -> v in row 2k
+        # and v -> u in row 2k + 1, hence the reverse of entry e is e ^ 1
+        self.edge_id = {}
+        for k, (u, v) in enumerate(self.ccg.edges()):
+            self.edge_id[u, v], self.edge_id[v, u] = 2 * k, 2 * k + 1
+        self.msgs = np.zeros((len(self.edge_id), 2))
+        self.agt_ccg = self.context.gadgets
         self.agt_ccg_nodes = {}
-
-        self.var_ccg_nodes = {vname : [(u, data['rank']) for u, data in self.ccg.nodes(data=True)
-                                                         if ('variable' in data and data['variable'] == vname)]
-                                for vname in dcop_instance.variables}
-
-
-    def onStart(self, agt):
-        #agt.setRandomAssignment()
+        self.agt_sends = {}
+        self.agt_gadget = {}
+        self.ccg_owner = self.context.ccg_owner
+        self.var_ccg_nodes = self.context.var_ccg_nodes
+        # Vertex cover mask over the full CCG: each agent writes the entries of its gadget nodes, the nodes fixed
+        # by the context (e.g., in components solved exactly) are decided already
+        self.cover = self.context.ccg_cover_mask.copy()
+        self.agt_decoder = {}
+
+    def _bindAgent(self, agt):
         ccg = self.agt_ccg[agt.name]
         self.agt_ccg_nodes[agt.name] = [u for u, data in ccg.nodes(data=True)
                                         if 'owner' in data and data['owner'] == agt.name]
+        self._indexAgent(agt.name)
+
+        if agt.name not in self.agt_decoder:
+            self.agt_decoder[agt.name] = self.context.decoder.subset(agt.variables)
+
+    def _indexAgent(self, aname):
+        """
+        Indexes the messages of the gadget of agent :param aname: for each owned node, its weight, the entries
+        of its outgoing messages (in gadget neighbor order) and the owners of their recipients; for all the
+        gadget nodes, their ids, weights and the CSR rows of their incoming messages.
+        """
+        ccg, index, weights = self.agt_ccg[aname], self.ccg_index.index, self.ccg_index.weights
+        sends = []
+        for u in self.agt_ccg_nodes[aname]:
+            nbrs = list(ccg.neighbors(u))
+            out = np.fromiter((self.edge_id[u, v] for v in nbrs), dtype=np.int64, count=len(nbrs))
+            sends.append((weights[index[u]], out, [self.ccg_owner[v] for v in nbrs]))
+        self.agt_sends[aname] = sends
+
+        nodes = self.ccg_index.ids(ccg.nodes())
+        deg = np.fromiter((ccg.degree(u) for u in ccg.nodes()), dtype=np.int64, count=len(nodes))
+        incoming = np.fromiter((self.edge_id[t, u] for u in ccg.nodes() for t in ccg.neighbors(u)),
+                               dtype=np.int64, count=int(deg.sum()))
+        self.agt_gadget[aname] = (nodes, weights[nodes], np.repeat(np.arange(len(nodes)), deg), incoming)
+
+    def onInstanceChange(self, changes):
+        # The context rebuilds the whole CCG of the new instance (see ProblemContext.onInstanceChange): the
+        # messages restart from zero on it, the variables keep their values until the next decoding
+        self._bindContext()
+        for agt in self.instance.agents.values():
+            self._bindAgent(agt)
+
+    def onStart(self, agt):
+        #agt.setRandomAssignment()
+        self._bindAgent(agt)
 
         for var in agt.variables:
             v_val = var.value
@@ -74,48 +121,56 @@ class CCGMaxSum(Algorithm):
         pass
 
     def onCurrentCycle(self, agt):
-        ccg = self.agt_ccg[agt.name]
-        weights = nx.get_node_attributes(ccg, 'weight')
-
-        for u in self.agt_ccg_nodes[agt.name]:
-            # sum all messages from u's neighbors to itself
-            sum_msgs = np.sum(self.msgs[t][u] for t in ccg.neighbors(u))
+        msgs = self.msgs
+        for w, out, recipients in self.agt_sends[agt.name]:
+            # sum all messages from u's neighbors to itself, then the sums without each recipient v
+            incoming = msgs[out ^ 1]
+            sum_without_v = incoming.sum(axis=0) - incoming
+            m = np.column_stack((w + sum_without_v[:, 1], np.minimum(sum_without_v[:, 0], sum_without_v[:, 1] + w)))
 
-            # Send messages to neighbors
-            for v in ccg.neighbors(u):
-                sum_without_v = sum_msgs - self.msgs[v][u]
-                m  = np.asarray([weights[u] + sum_without_v[1],
-                                 min(sum_without_v[0], sum_without_v[1] + weights[u])])
+            # Normalize values
+            m -= m.min(axis=1, keepdims=True)
 
-                # Normalize values
-                m -= np.min(m) # m -= np.mean(m)
+            # Damping
+            if self.damping > 0:
+                m = self.damping * msgs[out] + (1-self.damping) * m
 
-                # Damping
-                if self.damping > 0:
-                    m = self.damping * self.msgs[u][v] + (1-self.damping) * m
+            # Add noise to help stabilizing convergence
+            m += self.rng.normal(0.01, m.shape)
 
-                # Add noise to help stabilizing convergence
-                m += self.prng.normal(scale=0.01, size=len(m))
-
-                self.num_messages_sent += 1
-                self.msgs[u][v] = m
+            self.num_messages_sent += len(out)
+            if self.comm is not None:
+                for v_owner in recipients:
+                    self.comm.record(agt.name, v_owner, m[0].nbytes)
+            msgs[out] = m
 
     def onCycleEnd(self, agt):
-        ccg = self.agt_ccg[agt.name]
-        weights = nx.get_node_attributes(ccg, 'weight')
-        type = nx.get_node_attributes(ccg, 'type')
+        nodes, weights, rows, incoming = self.agt_gadget[agt.name]
+        # sum all messages from each node's neighbors to itself (CSR reduction over the gadget rows)
+        msgs = self.msgs[incoming]
+        sum_0 = np.bincount(rows, weights=msgs[:, 0], minlength=len(nodes))
+        sum_1 = np.bincount(rows, weights=msgs[:, 1], minlength=len(nodes))
+        self.cover[nodes] = sum_0 > sum_1 + weights
 
-        vertex_cover = []
-        for u in ccg.nodes():
-            sum_msgs = np.sum(self.msgs[t][u] for t in ccg.neighbors(u))
-
-            if sum_msgs[0] > sum_msgs[1] + weights[u]:
-                vertex_cover.append(u)
-            # if weights[u] < sum_msgs:
-            #     vertex_cover.append(u)
-
-        for var in agt.variables:
-            set_var_value(var, vertex_cover, self.var_ccg_nodes[var.name], self.prng)
+        self.agt_decoder[agt.name].assign(self.cover, self.prng)
 
     def onTermination(self, agt):
         pass
+
+    def getState(self):
+        state = super(CCGMaxSum, self).getState()
+        state['msgs'] = self.msgs.copy()
+        state['agt_ccg_nodes'] = copy.deepcopy(self.agt_ccg_nodes)
+        state['cover'] = self.cover.copy()
+        return state
+
+    def setState(self, state):
+        super(CCGMaxSum, self).setState(state)
+        self.msgs = state['msgs'].copy()
+        self.agt_ccg_nodes = copy.deepcopy(state['agt_ccg_nodes'])
+        for aname in self.agt_ccg_nodes:
+            self._indexAgent(aname)
+        self.cover = state['cover'].copy()
+        for agt in self.instance.agents.values():
+            if agt.name not in self.agt_decoder:
+                self.agt_decoder[agt.name] = self.context.decoder.subset(agt.variables)
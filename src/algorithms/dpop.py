@@ -0,0 +1,296 @@
+import numpy as np
+
+from algorithms.algorithm import Algorithm
+
+# Bytes per entry of the UTIL tables
+ENTRY_NBYTES = np.dtype(float).itemsize
+
+
+class Dpop(Algorithm):
+    """
+    DPOP: exact inference on a DFS pseudo-tree of the constraint graph (the variables are the nodes of the
+    pseudo-tree; the messages between variables of different agents are the ones exchanged by the agents).
+    UTIL phase (bottom-up): each variable joins the cost tables of the constraints it is the deepest variable of
+    with the UTIL messages of its children, as NumPy broadcast sums over its separator and itself, and sends the
+    min-projection of the join on its separator to its parent. VALUE phase (top-down): each variable takes the
+    value minimizing the join given the values of its separator.
+
+    args['memory_limit'] bounds (in bytes) the size of the joins, hence of the UTIL tables. A variable whose
+    child joins would exceed it becomes the root of a cluster (as in MB-DPOP): it chooses a cycle-cutset among
+    the separators of the oversized joins below it, the cluster is solved once per assignment of the cutset (the
+    joins are conditioned on it) and the cluster root keeps the best cutset assignment per separator assignment.
+
+    The sizes of the UTIL messages (self.util_msgs) and the peak memory of the stored and in-flight tables
+    (self.peak_memory) are reported by getReport().
+    """
+    def __init__(self, name, dcop_instance, args={'max_iter': 1, 'memory_limit': None}, seed=1234, context=None):
+        super(Dpop, self).__init__(name, dcop_instance, args, seed, context)
+        self.memory_limit = args.get('memory_limit')
+        self.root = min([aname for aname in dcop_instance.agents])
+        self.solved = False
+        self._buildPseudoTree()
+        assert self.memory_limit is None or self.memory_limit >= ENTRY_NBYTES * max(self.dom, default=1), \
+            'The memory limit must hold at least the table of one variable'
+
+    def _buildPseudoTree(self):
+        ci = self.context.compiled
+        self.n = ci.n_vars
+        self.dom = ci.dom_size.tolist()
+        nbrs = [ci.adj_idx[ci.adj_ptr[i]:ci.adj_ptr[i + 1]].tolist() for i in range(self.n)]
+        degree = [len(nb) for nb in nbrs]
+
+        # DFS from the variable of maximum degree of each component, visiting the neighbors by decreasing degree
+        self.parent = [-1] * self.n
+        self.depth = [0] * self.n
+        self.children = [[] for _ in range(self.n)]
+        self.tin, self.tout = [0] * self.n, [0] * self.n
+        self.roots, order = [], []
+        visited = [False] * self.n
+        clock = 0
+        for r in sorted(range(self.n), key=lambda i: (-degree[i], i)):
+            if visited[r]:
+                continue
+            self.roots.append(r)
+            visited[r] = True
+            self.tin[r] = clock
+            clock += 1
+            order.append(r)
+            stack = [(r, iter(sorted(nbrs[r], key=lambda i: (-degree[i], i))))]
+            while stack:
+                u, it = stack[-1]
+                for v in it:
+                    if not visited[v]:
+                        visited[v] = True
+                        self.parent[v], self.depth[v] = u, self.depth[u] + 1
+                        self.children[u].append(v)
+                        self.tin[v] = clock
+                        clock += 1
+                        order.append(v)
+                        stack.append((v, iter(sorted(nbrs[v], key=lambda i: (-degree[i], i)))))
+                        break
+                else:
+                    self.tout[u] = clock
+                    stack.pop()
+
+        # Separators (the ancestors connected to the subtree of a variable), sorted by depth
+        sep = [set() for _ in range(self.n)]
+        for u in reversed(order):
+            sep[u].update(v for v in nbrs[u] if self.depth[v] < self.depth[u])
+            for c in self.children[u]:
+                sep[u].update(sep[c])
+            sep[u].discard(u)
+        self.sep = [sorted(s, key=lambda v: self.depth[v]) for s in sep]
+        self.sep_set = sep
+
+        # Each constraint is joined by the deepest variable of its scope
+        self.own = [[] for _ in range(self.n)]
+        for g in ci.groups:
+            for row, cid in enumerate(g.con_ids):
+                con = self.instance.constraints[ci.con_names[cid]]
+                scope = g.scopes[row].tolist()
+                self.own[max(scope, key=lambda v: self.depth[v])].append((scope, con.table.toDense()))
+
+    def onInstanceChange(self, changes):
+        # The pseudo-tree is rebuilt and the instance solved again by the next iteration
+        self.root = min([aname for aname in self.instance.agents])
+        self._buildPseudoTree()
+        self.solved = False
+
+    def reset(self, newseed):
+        super(Dpop, self).reset(newseed)
+        self.solved = False
+
+    def terminationCondition(self):
+        return self.solved or super(Dpop, self).terminationCondition()
+
+    def _track(self, nbytes):
+        """Accounts :param nbytes of tables allocated (or freed, if negative)"""
+        self._live += nbytes
+        self.peak_memory = max(self.peak_memory, self._live)
+
+    def _store(self, x, entry, key, msg):
+        """Stores the tables of :param x (for the VALUE phase) and its last UTIL message :param msg"""
+        nbytes = sum(t.nbytes for t in entry if isinstance(t, np.ndarray)) + msg[1].nbytes
+        self._track(nbytes - self._stored.get(x, 0))
+        self._stored[x] = nbytes
+        self.node_info[x] = entry
+        self._memo[x] = (key, msg)
+
+    def _joinSize(self, x, fixed):
+        size = ENTRY_NBYTES
+        for v in self.sep[x] + [x]:
+            if v not in fixed:
+                size *= self.dom[v]
+        return size
+
+    def _fits(self, x, fixed):
+        return self.memory_limit is None or self._joinSize(x, fixed) <= self.memory_limit
+
+    def _inSubtree(self, v, x):
+        return self.tin[x] <= self.tin[v] < self.tout[x]
+
+    def _align(self, tvars, table, target):
+        """:return: :param table (over :param tvars) with its axes ordered and broadcastable as :param target"""
+        pos = {v: i for i, v in enumerate(target)}
+        table = np.transpose(table, np.argsort([pos[v] for v in tvars]))
+        shape = [1] * len(target)
+        for v in tvars:
+            shape[pos[v]] = self.dom[v]
+        return table.reshape(shape)
+
+    def _join(self, x, fixed, msgs):
+        """:return: (J, table): the join of the constraints of :param x and :param msgs over J (conditioned)"""
+        J = [v for v in self.sep[x] + [x] if v not in fixed]
+        table = np.zeros([self.dom[v] for v in J])
+        self._track(table.nbytes)
+        for scope, con_table in self.own[x]:
+            idx = tuple(fixed[v] if v in fixed else slice(None) for v in scope)
+            table += self._align([v for v in scope if v not in fixed], con_table[idx], J)
+        for mvars, m in msgs:
+            table += self._align(mvars, m, J)
+        return J, table
+
+    def _send(self, x, mvars, m):
+        if self.parent[x] >= 0:
+            self.num_messages_sent += 1
+            self.util_msgs.append((x, self.parent[x], m.size))
+            if self.comm is not None:
+                self.comm.record(self._agent(x), self._agent(self.parent[x]), m.nbytes)
+        return mvars, m
+
+    def _agent(self, x):
+        return self.instance.variables[self.context.compiled.var_names[x]].controlled_by.name
+
+    def _cutset(self, x, fixed):
+        """
+        :return: The cycle-cutset of the cluster rooted in :param x: the variables to condition on so that the
+        joins of the oversized descendants of x (reached through oversized children) fit the memory limit,
+        chosen greedily by number of oversized joins they belong to, then by depth.
+        """
+        region, stack = [], [c for c in self.children[x] if not self._fits(c, fixed)]
+        while stack:
+            h = stack.pop()
+            region.append(h)
+            stack.extend(c for c in self.children[h] if not self._fits(c, fixed))
+        cond, cutset = dict(fixed), []
+        while True:
+            over = [h for h in region if not self._fits(h, cond)]
+            if not over:
+                return cutset
+            counts = {}
+            for h in over:
+                for v in self.sep[h] + [h]:
+                    if v not in cond:
+                        counts[v] = counts.get(v, 0) + 1
+            v = min(counts, key=lambda u: (-counts[u], self.depth[u], u))
+            cutset.append(v)
+            cond[v] = 0
+
+    def _util(self, x, fixed):
+        """
+        :param fixed: Dictionary mapping the conditioned variables to their value indexes.
+        :return: The UTIL message (variables, table) of :param x given :param fixed.
+        The last message of each variable is kept: it is sent again only if the conditioned variables of its
+        separator or subtree changed (e.g., not for the subtrees of a cluster independent of its cutset).
+        """
+        key = tuple((v, d) for v, d in sorted(fixed.items()) if v in self.sep_set[x] or self._inSubtree(v, x))
+        if x in self._memo and self._memo[x][0] == key:
+            return self._memo[x][1]
+        if all(self._fits(c, fixed) for c in self.children[x]):
+            msgs = [self._util(c, fixed) for c in self.children[x]]
+            J, table = self._join(x, fixed, msgs)
+            if x in fixed:
+                entry, m = ('fixed',), table
+            else:
+                m, arg = table.min(axis=-1), table.argmin(axis=-1)
+                J = J[:-1]
+                entry = ('plain', J, arg)
+            self._track(-table.nbytes)
+            msg = self._send(x, J, m)
+            self._store(x, entry, key, msg)
+            return msg
+
+        cutset = self._cutset(x, fixed)
+        dims = [self.dom[v] for v in cutset]
+        dep = [c for c in self.children[x]
+               if any(v in self.sep[c] or self._inSubtree(v, c) for v in cutset)]
+        indep = [self._util(c, fixed) for c in self.children[x] if c not in dep]
+        S = [v for v in self.sep[x] if v not in fixed]
+        out = np.full([self.dom[v] for v in S], np.inf)
+        best_a = np.zeros(out.shape, dtype=np.int64)
+        best_x = np.zeros(out.shape, dtype=np.int64)
+        self._track(out.nbytes + best_a.nbytes + best_x.nbytes)
+        for k, a in enumerate(np.ndindex(*dims)):
+            cond = dict(fixed)
+            cond.update(zip(cutset, a))
+            msgs = [self._util(c, cond) for c in dep]
+            J, table = self._join(x, cond, msgs + indep)
+            if x in cond:
+                val, arg = table, np.full(table.shape, cond[x], dtype=np.int64)
+            else:
+                val, arg = table.min(axis=-1), table.argmin(axis=-1)
+            self._track(-table.nbytes)
+            idx = tuple(cond[v] if v in cond else slice(None) for v in S)
+            better = val < out[idx]
+            out[idx] = np.where(better, val, out[idx])
+            best_a[idx] = np.where(better, k, best_a[idx])
+            best_x[idx] = np.where(better, arg, best_x[idx])
+        self._track(-out.nbytes - best_a.nbytes - best_x.nbytes)
+        msg = self._send(x, S, out)
+        self._store(x, ('cluster', S, cutset, dims, dep, best_a, best_x), key, msg)
+        return msg
+
+    def _value(self, x, fixed, sol):
+        """Assigns :param x and its descendants in :param sol, its separator being assigned"""
+        info = self.node_info[x]
+        if info[0] == 'plain':
+            sol[x] = int(info[2][tuple(sol[v] for v in info[1])])
+        elif info[0] == 'cluster':
+            _, S, cutset, dims, dep, best_a, best_x = info
+            idx = tuple(sol[v] for v in S)
+            a = np.unravel_index(best_a[idx], dims)
+            cond = dict(fixed)
+            cond.update(zip(cutset, (int(d) for d in a)))
+            sol.update((v, cond[v]) for v in cutset)
+            sol[x] = int(best_x[idx])
+            # Recomputes the tables of the cluster for the chosen assignment of the cutset
+            for c in dep:
+                self._util(c, cond)
+            for c in self.children[x]:
+                self.num_messages_sent += 1
+                self._value(c, cond if c in dep else fixed, sol)
+            return
+        for c in self.children[x]:
+            self.num_messages_sent += 1
+            self._value(c, fixed, sol)
+
+    def solve(self):
+        self.util_msgs = []
+        self.node_info = {}
+        self._stored = {}
+        self._memo = {}
+        self._live, self.peak_memory = 0, 0
+        self.optimal_cost = 0.0
+        sol = {}
+        for r in self.roots:
+            _, m = self._util(r, {})
+            self.optimal_cost += float(m)
+        for r in self.roots:
+            self._value(r, {}, sol)
+        return np.asarray([sol[i] for i in range(self.n)], dtype=np.int64)
+
+    def onCurrentCycle(self, agt):
+        if agt.name != self.root or self.solved:
+            return
+        self.context.setAssignment(self.solve())
+        self.solved = True
+
+    def onCycleEnd(self, agt):
+        pass
+
+    def getReport(self):
+        if not self.solved:
+            return {}
+        return {'util_msg_sizes': np.asarray([s for _, _, s in self.util_msgs], dtype=np.int64),
+                'peak_memory': self.peak_memory,
+                'optimal_cost': self.optimal_cost}
@@ -0,0 +1,35 @@
+import numpy as np
+
+from algorithms.vec_algorithm import VecAlgorithm
+
+
+class VecDsa(VecAlgorithm):
+    """
+    Synchronous DSA on the compiled instance, vectorized over variables and replicas.
+    Each variable is a decision unit: every iteration all variables compute their best response to the current
+    values of their neighbors and move to it (with probability p) if it improves (type A) or does not
+    worsen (type C) their local cost.
+    """
+    def __init__(self, name, dcop_instance, args={'max_iter': 10, 'type': 'A', 'p': 0.7, 'n_replicas': 1},
+                 seed=1234, context=None):
+        super(VecDsa, self).__init__(name, dcop_instance, args, seed, context)
+        self.dsa_type = args['type']
+        self.dsa_p = args['p']
+
+    def onBatchCycle(self):
+        X = self.X
+        L = self.compiled.localCosts(X)
+        curr_cost = np.take_along_axis(L, X[:, :, None], axis=2)[:, :, 0]
+        best_assignment = np.argmin(L, axis=2)
+        best_new_cost = np.take_along_axis(L, best_assignment[:, :, None], axis=2)[:, :, 0]
+
+        # We want to minimize so we want that new cost < currCost
+        Delta = curr_cost - best_new_cost
+        move = Delta > 0
+        if self.dsa_type == 'C':
+            move |= Delta == 0
+        # Select new values with probability p
+        move &= self.random(self.compiled.n_vars) < self.dsa_p
+        self.X = np.where(move, best_assignment, X)
+
+        self.num_messages_sent += self.compiled.n_agent_links
@@ -1,24 +1,31 @@
 import numpy as np
-import networkx as nx
-from gurobipy import *
 
 from algorithms.algorithm import Algorithm
-from utils.ccg_utils import transform_dcop_instance_to_ccg, set_var_value
+from utils.mwvc import MWVCProblem
 
 class LPSolver(Algorithm):
-    def __init__(self, name, dcop_instance, args={'max_iter:': 1, 'relax':False}, seed=1234):
-        super(LPSolver, self).__init__(name, dcop_instance, args, seed)
+    def __init__(self, name, dcop_instance, args={'max_iter:': 1, 'relax':False}, seed=1234, context=None):
+        super(LPSolver, self).__init__(name, dcop_instance, args, seed, context)
 
         self.relax = args['relax']
-        self.ccg = transform_dcop_instance_to_ccg(dcop_instance)
-        self.root = min([aname for aname in dcop_instance.agents])
+        # LP solver: 'highs' (SciPy, open source) or 'gurobi'
+        self.backend = args.get('backend', 'highs')
+        self._bindContext()
+
+    def _bindContext(self):
+        self.ccg = self.context.ccg
+        self.root = min([aname for aname in self.instance.agents])
 
         self.values = {u: 0 for u in self.ccg.nodes()}
-        self.variables = dcop_instance.variables.values()
-        self.var_ccg_nodes = {vname : [(u, data['rank']) for u, data in self.ccg.nodes(data=True)
-                                                         if ('variable' in data and data['variable'] == vname)]
-                                for vname in dcop_instance.variables}
+        self.variables = self.instance.variables.values()
+        self.var_ccg_nodes = self.context.var_ccg_nodes
+        self.ccg_ids = self.context.ccg_index.ids(self.ccg.nodes())
+        self.decoder = self.context.decoder
+
 
+    def onInstanceChange(self, changes):
+        # The context rebuilds the CCG of the new instance, solved again by the next iteration
+        self._bindContext()
 
     def onStart(self, agt):
         # First Iteration: Set random assignment
@@ -35,48 +42,21 @@ class LPSolver(Algorithm):
         if agt.name is not self.root:
             return
 
-        ccg = self.ccg
-        weights = nx.get_node_attributes(ccg, 'weight')
-
-        N = ccg.number_of_nodes()
-        model = Model()
-        if self.relax:
-            X = model.addVars(ccg.nodes(), lb=[0]*N, ub=[1]*N, vtype=GRB.CONTINUOUS)
-        else:
-            X = model.addVars(ccg.nodes(), vtype=GRB.BINARY)
-
-        # Constraints: (for any adjiecent vertices)
-        for u, v in ccg.edges():
-            model.addConstr(X[u] + X[v] >= 1)
-
-        obj = None
-        for u in ccg.nodes():
-            obj += weights[u] * X[u]
-
-        self.gurobiSolve(model, obj)
-
-        for u in ccg.nodes():
-            self.values[u] = X[u].x
+        problem = MWVCProblem(self.ccg)
+        x = problem.solve(relax=self.relax, backend=self.backend)
+        self.values = dict(zip(problem.nodes, x.tolist()))
 
+        N = problem.n_nodes
         print('0 count:', list(self.values.values()).count(0), '/', N)
         print('1 count:', list(self.values.values()).count(1), '/', N)
 
 
-    def gurobiSolve(self, model, obj):
-        model.setObjective(obj)
-        model.setParam('OutputFlag', False)
-        model.setParam('OptimalityTol', 1e-6)
-        model.optimize()
-        if model.status != 2 and model.status != 13:
-            print('Gurobi status:', model.status)
-        return model.status
-
-
     def onCycleEnd(self, agt):
         if agt.name != self.root:
             return
 
         ccg = self.ccg
-        vertex_cover = [u for u in ccg.nodes() if self.values[u] >= 0.5]
-        for var in self.variables:
-            set_var_value(var, vertex_cover, self.var_ccg_nodes[var.name], self.prng)
+        cover = self.context.ccg_cover_mask.copy()
+        cover[self.ccg_ids] = np.fromiter((self.values[u] >= 0.5 for u in ccg.nodes()), dtype=bool,
+                                          count=len(self.ccg_ids))
+        self.decoder.assign(cover, self.prng)
@@ -1,28 +1,50 @@
+import copy
 import numpy as np
-import itertools
 from algorithms.algorithm import Algorithm
-from utils.utils import takeMin, insertInTuple
+
+# Constraints with at most this fraction of tuples of non-default cost have their function messages computed
+# from their sparse table
+SPARSE_DENSITY = 0.1
+
 
 class MaxSum(Algorithm):
-    def __init__(self, name, dcop_instance, args={'max_iter':10, 'damping': 0}, seed=1234):
-        super(MaxSum, self).__init__(name, dcop_instance, args, seed)
+    def __init__(self, name, dcop_instance, args={'max_iter':10, 'damping': 0}, seed=1234, context=None):
+        super(MaxSum, self).__init__(name, dcop_instance, args, seed, context)
         self.damping = args['damping']
+        # If True, the noise added to each variable-to-function message is drawn once per edge rather than at
+        # every iteration, so that the messages can settle (and the function messages be served from cache).
+        # This trades exploration for speed: the final cost can be worse than with per-iteration noise.
+        self.fixed_noise = args.get('fixed_noise', False)
+        # A variable-to-function message changing by at most msg_tol is not considered changed by the caches
+        # of the function nodes
+        self.msg_tol = args.get('msg_tol', 0)
+        # With fresh noise every iteration and no tolerance every message changes every iteration: the function
+        # messages are then recomputed without tracking the versions of the incoming messages
+        self.memoize = self.fixed_noise or self.msg_tol > 0
 
         self.msg_from_var_to_con = { vname: {} for vname in dcop_instance.variables }
         self.msg_from_con_to_var = { cname: {} for cname in dcop_instance.constraints }
+        # Version counters of the variable-to-function messages, increased whenever a message changes
+        self.msg_version = { vname: {} for vname in dcop_instance.variables }
+        self.noise = { vname: {} for vname in dcop_instance.variables }
 
         self.vnodes = {vname: MaxSum.VariableNode(dcop_instance.variables[vname]) for vname in dcop_instance.variables}
         self.fnodes = {cname: MaxSum.FactorNode(dcop_instance.constraints[cname]) for cname in dcop_instance.constraints}
+        # The agent controlling (i.e., hosting the factor node of) each constraint
+        self.con_owner = {con.name: agt.name for agt in dcop_instance.agents.values()
+                          for con in agt.controlled_constraints}
 
     def onStart(self, agt):
         # Initialize messages
         for var in agt.variables:
             for con in var.constraints:
                 self.msg_from_var_to_con[var.name][con.name] = np.zeros(len(var.domain))
+                self.msg_version[var.name][con.name] = 0
 
         for con in agt.controlled_constraints:
             for var in con.scope:
                 self.msg_from_con_to_var[con.name][var.name] = np.zeros(len(var.domain))
+            self.fnodes[con.name].clearCache()
 
         # First Iteration: Set random assignment
         #agt.setRandomAssignment()
@@ -40,8 +62,7 @@ class MaxSum(Algorithm):
 
         # Send messages (functions to variable)
         for c in agt.controlled_constraints:
-            for var in c.scope:
-                self.fnodes[c.name].sendMsgConToVar(var, self)
+            self.fnodes[c.name].sendMsgsConToVars(self)
 
     def onCycleEnd(self, agt):
         # Select best value from all the variables controlled by this agent:
@@ -52,6 +73,56 @@ class MaxSum(Algorithm):
     def onTermination(self, agt):
         pass
 
+    def onInstanceChange(self, changes):
+        # Messages on the edges which still exist are kept, those on new edges start from zero; the factor nodes
+        # of the new or changed constraints are rebuilt
+        instance = self.instance
+        changed = {name for kind, name in changes if kind in ('add_constraint', 'set_values')}
+        self.vnodes = {vname: MaxSum.VariableNode(var) for vname, var in instance.variables.items()}
+        self.fnodes = {cname: self.fnodes[cname] if cname in self.fnodes and cname not in changed
+                       else MaxSum.FactorNode(con) for cname, con in instance.constraints.items()}
+        added = {name for kind, name in changes if kind == 'add_constraint'}
+        msg_from_var_to_con, msg_version, noise = {}, {}, {}
+        for vname, var in instance.variables.items():
+            msg_from_var_to_con[vname], msg_version[vname], noise[vname] = {}, {}, {}
+            for con in var.constraints:
+                kept = con.name not in added and con.name in self.msg_from_var_to_con.get(vname, {})
+                msg_from_var_to_con[vname][con.name] = self.msg_from_var_to_con[vname][con.name] if kept \
+                    else np.zeros(len(var.domain))
+                msg_version[vname][con.name] = self.msg_version[vname][con.name] if kept else 0
+                if kept and con.name in self.noise[vname]:
+                    noise[vname][con.name] = self.noise[vname][con.name]
+        msg_from_con_to_var = {}
+        for cname, con in instance.constraints.items():
+            old = {} if cname in added else self.msg_from_con_to_var.get(cname, {})
+            msg_from_con_to_var[cname] = {var.name: old.get(var.name, np.zeros(len(var.domain))) for var in con.scope}
+        self.msg_from_var_to_con, self.msg_version, self.noise = msg_from_var_to_con, msg_version, noise
+        self.msg_from_con_to_var = msg_from_con_to_var
+        self.con_owner = {con.name: agt.name for agt in instance.agents.values()
+                          for con in agt.controlled_constraints}
+
+    def reset(self, newseed):
+        super(MaxSum, self).reset(newseed)
+        self.noise = { vname: {} for vname in self.instance.variables }
+
+    def getState(self):
+        state = super(MaxSum, self).getState()
+        state['msg_from_var_to_con'] = copy.deepcopy(self.msg_from_var_to_con)
+        state['msg_from_con_to_var'] = copy.deepcopy(self.msg_from_con_to_var)
+        state['msg_version'] = copy.deepcopy(self.msg_version)
+        state['noise'] = copy.deepcopy(self.noise)
+        state['fnode_caches'] = {cname: (f.cache_key, f.cache) for cname, f in self.fnodes.items()}
+        return state
+
+    def setState(self, state):
+        super(MaxSum, self).setState(state)
+        self.msg_from_var_to_con = copy.deepcopy(state['msg_from_var_to_con'])
+        self.msg_from_con_to_var = copy.deepcopy(state['msg_from_con_to_var'])
+        self.msg_version = copy.deepcopy(state['msg_version'])
+        self.noise = copy.deepcopy(state['noise'])
+        for cname, (key, cache) in state['fnode_caches'].items():
+            self.fnodes[cname].cache_key, self.fnodes[cname].cache = key, cache
+
 
     class VariableNode:
         def __init__(self, var):
@@ -74,52 +145,87 @@ class MaxSum(Algorithm):
             table_var_to_con -= np.min(table_var_to_con)
             #table_var_to_con -= np.mean(table_var_to_con)
             # Add noise to help stabilizing convergence
-            table_var_to_con += np.abs(Mailer.prng.normal(scale=20.0, size=len(table_var_to_con)))
+            if Mailer.fixed_noise:
+                noise = Mailer.noise[self.var.name].get(con.name)
+                if noise is None:
+                    noise = np.abs(Mailer.rng.normal(20.0, len(table_var_to_con)))
+                    Mailer.noise[self.var.name][con.name] = noise
+                table_var_to_con += noise
+            else:
+                table_var_to_con += np.abs(Mailer.rng.normal(20.0, len(table_var_to_con)))
             # Send message to constraint
             Mailer.num_messages_sent += 1
+            if Mailer.comm is not None:
+                Mailer.comm.record(self.var.controlled_by.name, Mailer.con_owner[con.name], table_var_to_con.nbytes)
             if Mailer.damping > 0:
                 table_var_to_con = Mailer.damping * Mailer.msg_from_var_to_con[self.var.name][con.name] \
                                    + (1-Mailer.damping) * table_var_to_con
 
+            prev = Mailer.msg_from_var_to_con[self.var.name][con.name]
+            if Mailer.memoize and np.max(np.abs(table_var_to_con - prev)) > Mailer.msg_tol:
+                Mailer.msg_version[self.var.name][con.name] += 1
             Mailer.msg_from_var_to_con[self.var.name][con.name] = table_var_to_con
 
 
     class FactorNode:
         def __init__(self, con):
             self.con = con
-
-            self.projected_assignments = {}
-            for var in con.scope:
-                var_idx = con.scope.index(var)
-                domains = [v.domain for v in con.scope if v != var]
-                domains.insert(var_idx, [0])
-                self.projected_assignments[var_idx] = itertools.product(*domains)
-
-
-        def sendMsgConToVar(self, var, Mailer):
+            # Cost table of the constraint, indexed by the value indexes of its scope: the sparse table if few
+            # tuples have a non-default cost (then self.table is None), the dense one otherwise
+            self.sparse = con.table if con.table.density <= SPARSE_DENSITY else None
+            self.table = con.table.toDense() if self.sparse is None else None
+            # Outgoing messages computed for the versions cache_key of the incoming messages
+            self.cache_key = None
+            self.cache = None
+
+        def clearCache(self):
+            self.cache_key = None
+            self.cache = None
+
+        def computeMsgs(self, Mailer):
+            """
+            Computes the messages to all the variables of the scope in one pass: the sum S of the cost table and
+            of the incoming messages is shared, and the message to x is the min of S over the other variables
+            minus the message from x (which only depends on the value of x).
+            :return: The list of the messages, in scope order.
+            """
+            scope = self.con.scope
+            incoming = [Mailer.msg_from_var_to_con[var.name][self.con.name] for var in scope]
+            if self.sparse is not None:
+                return self.sparse.minMarginals(incoming)
+            S = self.table
+            for i, q in enumerate(incoming):
+                shape = [1] * len(scope)
+                shape[i] = -1
+                S = S + q.reshape(shape)
+            msgs = []
+            for i, q in enumerate(incoming):
+                axes = tuple(j for j in range(len(scope)) if j != i)
+                msgs.append(np.min(S, axis=axes) - q if axes else S - q)
+            return msgs
+
+        def sendMsgsConToVars(self, Mailer):
             '''
             A message sent from a function-node F to a variable-node x in iteration i includes
             for each possible value d in the domain of x,
             the minimal cost of any combination of assignments to the variables involved in F
-            apart from x and the assignment of value d to variable x.
+            apart from x and the assignment of value d to variable x, plus the messages received from those
+            variables.
             The size of the message F -> x : dom(x)
+            If Mailer.memoize, the messages are recomputed only when some incoming message changed since they
+            were last computed.
             '''
-            var_idx = self.con.scope.index(var)
-
-            #############
-            domains = [v.domain for v in self.con.scope if v != var]
-            domains.insert(var_idx, [0])
-            #############
-
-            table_con_to_var = np.zeros(len(var.domain))
-
-            for i, d in enumerate(var.domain):
-                min_cost = np.inf
-                for combo in itertools.product(*domains): #self.projected_assignments[var_idx]:
-                    combo_d = insertInTuple(combo, var_idx, d)
-                    min_cost, _ = takeMin(self.con.evaluateTuple(combo_d), min_cost)
-                table_con_to_var[i] = min_cost
-
-            # Todo: need To update the iteration! (otherwise it will invalidate this message)
-            Mailer.num_messages_sent += 1
-            Mailer.msg_from_con_to_var[self.con.name][var.name] = table_con_to_var
+            if not Mailer.memoize:
+                self.cache = self.computeMsgs(Mailer)
+            else:
+                key = tuple(Mailer.msg_version[var.name][self.con.name] for var in self.con.scope)
+                if key != self.cache_key:
+                    self.cache = self.computeMsgs(Mailer)
+                    self.cache_key = key
+
+            for var, table_con_to_var in zip(self.con.scope, self.cache):
+                Mailer.num_messages_sent += 1
+                if Mailer.comm is not None:
+                    Mailer.comm.record(Mailer.con_owner[self.con.name], var.controlled_by.name,
+                                       table_con_to_var.nbytes)
+                Mailer.msg_from_con_to_var[self.con.name][var.name] = table_con_to_var
@@ -0,0 +1,92 @@
+import numpy as np
+
+from algorithms.vec_algorithm import VecAlgorithm
+from utils.utils import minOverAxes
+
+
+class VecMaxSum(VecAlgorithm):
+    """
+    Synchronous (min-sum) Max-Sum on the compiled instance, vectorized over factor-graph edges and replicas.
+    Messages are (K, n_edges, d) arrays; entries of values outside a variable domain are kept to 0.
+    """
+    def __init__(self, name, dcop_instance, args={'max_iter': 10, 'damping': 0, 'n_replicas': 1},
+                 seed=1234, context=None):
+        super(VecMaxSum, self).__init__(name, dcop_instance, args, seed, context)
+        self.damping = args['damping']
+        self.msg_from_var_to_con = None
+        self.msg_from_con_to_var = None
+
+    def onBatchStart(self):
+        # Initialize messages
+        if self.msg_from_var_to_con is None:
+            shape = (self.n_replicas, self.compiled.n_edges, self.compiled.max_dom)
+            self.msg_from_var_to_con = np.zeros(shape)
+            self.msg_from_con_to_var = np.zeros(shape)
+
+    def onInstanceChange(self, changes):
+        super(VecMaxSum, self).onInstanceChange(changes)
+        if self.msg_from_var_to_con is not None:
+            self.msg_from_var_to_con = self._remapMessages(self.msg_from_var_to_con)
+            self.msg_from_con_to_var = self._remapMessages(self.msg_from_con_to_var)
+
+    def _remapMessages(self, M):
+        """The messages :param M on the edges of the instance before a change, moved to the edges after it"""
+        ci = self.compiled
+        out = np.zeros((M.shape[0], ci.n_edges, ci.max_dom))
+        keep = np.flatnonzero(ci.edge_remap >= 0)
+        d = min(M.shape[2], ci.max_dom)
+        out[:, keep, :d] = M[:, ci.edge_remap[keep], :d]
+        return np.where(ci.edge_mask[None, :, :], out, 0)
+
+    def reset(self, newseed):
+        super(VecMaxSum, self).reset(newseed)
+        self.msg_from_var_to_con = None
+        self.msg_from_con_to_var = None
+
+    def getState(self):
+        state = super(VecMaxSum, self).getState()
+        state['msg_from_var_to_con'] = self.msg_from_var_to_con
+        state['msg_from_con_to_var'] = self.msg_from_con_to_var
+        return state
+
+    def setState(self, state):
+        super(VecMaxSum, self).setState(state)
+        self.msg_from_var_to_con = state['msg_from_var_to_con']
+        self.msg_from_con_to_var = state['msg_from_con_to_var']
+
+    def onBatchCycle(self):
+        ci = self.compiled
+        mask = ci.edge_mask[None, :, :]
+
+        # Send messages (variables to functions): sum of the messages received from all other functions
+        r = self.msg_from_con_to_var
+        q = ci.sumEdgesToVars(r)[:, ci.edge_var] - r
+        # Normalize values
+        q -= np.min(np.where(mask, q, np.inf), axis=2, keepdims=True)
+        # Add noise to help stabilizing convergence
+        q += np.abs(self.normal(20.0, (ci.n_edges, ci.max_dom)))
+        q = np.where(mask, q, 0)
+        if self.damping > 0:
+            q = self.damping * self.msg_from_var_to_con + (1 - self.damping) * q
+        self.msg_from_var_to_con = q
+
+        # Send messages (functions to variables)
+        r = np.empty_like(q)
+        for g in ci.groups:
+            K, C = q.shape[0], len(g)
+            S = np.broadcast_to(g.tables, (K,) + g.tables.shape).copy()
+            for j in range(g.arity):
+                shape = [K, C] + [1] * g.arity
+                shape[2 + j] = ci.max_dom
+                S += q[:, g.edgeSlice(j)].reshape(shape)
+            for j in range(g.arity):
+                axes = tuple(2 + i for i in range(g.arity) if i != j)
+                min_S = minOverAxes(S, axes)
+                r[:, g.edgeSlice(j)] = min_S - q[:, g.edgeSlice(j)]
+        self.msg_from_con_to_var = np.where(mask, r, 0)
+        self.num_messages_sent += 2 * ci.n_edges
+
+        # Select best value from all the variables
+        beliefs = ci.sumEdgesToVars(self.msg_from_con_to_var)
+        beliefs[:, ~ci.dom_mask] = np.inf
+        self.X = np.argmin(beliefs, axis=2)
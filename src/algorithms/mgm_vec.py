@@ -0,0 +1,186 @@
+import numpy as np
+
+from algorithms.vec_algorithm import VecAlgorithm
+
+
+class VecMgm(VecAlgorithm):
+    """
+    MGM (Maximum Gain Message) on the compiled instance, vectorized over variables and replicas.
+    Each variable is a decision unit: every iteration all variables compute the gain of their best response to
+    the current values of their neighbors, and those whose gain is positive and larger than the gains of all
+    their neighbors move. Equal gains are broken in favor of the lowest agent index (then variable index), so
+    that no two neighbors move in the same iteration and the cost never increases.
+    MGM being deterministic, replicas started from the same assignment would follow the same trajectory: the
+    first replica starts from the instance assignment, the others from a random assignment drawn from their
+    own random stream.
+    """
+    def __init__(self, name, dcop_instance, args={'max_iter': 10, 'n_replicas': 1}, seed=1234, context=None):
+        super(VecMgm, self).__init__(name, dcop_instance, args, seed, context)
+        self._compileStructures()
+
+    def _compileStructures(self):
+        ci = self.compiled
+        # Tie-breaking priority of each variable (lower wins)
+        self.rank = np.lexsort((np.arange(ci.n_vars), ci.var_agent)).argsort()
+
+    def onInstanceChange(self, changes):
+        super(VecMgm, self).onInstanceChange(changes)
+        self._compileStructures()
+
+    def onBatchStart(self):
+        if self.n_replicas > 1:
+            dom = self.compiled.dom_size
+            U = np.stack([rng.uniform(len(dom)) for rng in self.rngs[1:]])
+            self.X[1:] = np.minimum((U * dom).astype(np.int64), dom - 1)
+
+    def unilateralGains(self, X):
+        """
+        :return: (L, gain, best): the local costs (see CompiledInstance.localCosts) of the assignments
+        :param X, and the gain and value index of the best response of each variable.
+        """
+        L = self.compiled.localCosts(X)
+        curr = np.take_along_axis(L, X[:, :, None], axis=2)[:, :, 0]
+        best = np.argmin(L, axis=2)
+        best_cost = np.take_along_axis(L, best[:, :, None], axis=2)[:, :, 0]
+        with np.errstate(invalid='ignore'):
+            gain = np.where(curr > best_cost, curr - best_cost, 0.0)
+        return L, gain, best
+
+    def winners(self, gain, ignore=None):
+        """
+        :param ignore: An optional (K, n_adj) mask of the adjacency entries not compared.
+        :return: The (K, n) mask of the variables whose gain is positive and beats the gains of their neighbors.
+        """
+        ci = self.compiled
+        Gu, Gv = gain[:, ci.adj_row], gain[:, ci.adj_idx]
+        beats = (Gu > Gv) | (Gu == Gv) & (self.rank[ci.adj_row] < self.rank[ci.adj_idx])
+        if ignore is not None:
+            beats |= ignore
+        return ci.reduceNeighbors(beats, np.logical_and, True) & (gain > 0)
+
+    def onBatchCycle(self):
+        X = self.X
+        _, gain, best = self.unilateralGains(X)
+        self.X = np.where(self.winners(gain), best, X)
+        # Value and gain messages
+        self.num_messages_sent += 2 * self.compiled.n_agent_links
+
+
+class VecMgm2(VecMgm):
+    """
+    MGM-2 on the compiled instance, vectorized over variables and replicas: MGM where pairs of neighbors can
+    also move together. Every iteration each variable becomes an offerer with probability args['q'] and offers
+    a joint move to a random neighbor; a variable which is not an offerer accepts its best offer if the joint
+    gain exceeds the unilateral gains of both. The accepted pairs compete with their neighbors (except the
+    partner) with the joint gain, and move only if both partners win.
+    With hard constraints, the joint moves to a value infeasible with the current value of the partner are not
+    considered.
+    """
+    def __init__(self, name, dcop_instance, args={'max_iter': 10, 'q': 0.5, 'n_replicas': 1}, seed=1234,
+                 context=None):
+        super(VecMgm2, self).__init__(name, dcop_instance, args, seed, context)
+        self.q = args.get('q', 0.5)
+
+    def _compileStructures(self):
+        super(VecMgm2, self)._compileStructures()
+        ci = self.compiled
+        n_adj = len(ci.adj_idx)
+        # For each constraint group and ordered pair of scope positions (i, j): the group rows sorted by the
+        # adjacency entry of their (i-th, j-th) variables, with the CSR pointers over the adjacency entries
+        self.pair_rows = []
+        for g in ci.groups:
+            for i in range(g.arity):
+                for j in range(g.arity):
+                    if i != j:
+                        e = ci.adjacencyEntry(g.scopes[:, i], g.scopes[:, j])
+                        ptr = np.zeros(n_adj + 1, dtype=np.int64)
+                        np.cumsum(np.bincount(e, minlength=n_adj), out=ptr[1:])
+                        self.pair_rows.append((g, i, j, ptr, np.argsort(e, kind='stable')))
+
+    def sharedCosts(self, X, k, e):
+        """
+        :param k, e: The replicas and the adjacency entries (u, v) of m pairs of neighbors.
+        :return: The (m, d, d) array of the costs of the constraints involving both u and v, for every values of
+        u and v, the other variables being fixed as in :param X.
+        """
+        d = self.compiled.max_dom
+        S = np.zeros((len(e), d, d))
+        vals = np.arange(d)
+        for g, i, j, ptr, order in self.pair_rows:
+            counts = ptr[e + 1] - ptr[e]
+            total = int(counts.sum())
+            if total == 0:
+                continue
+            pair = np.repeat(np.arange(len(e)), counts)
+            offset = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            rows = order[np.repeat(ptr[e], counts) + offset]
+            idx = []
+            for p in range(g.arity):
+                if p == i:
+                    idx.append(vals[None, :, None])
+                elif p == j:
+                    idx.append(vals[None, None, :])
+                else:
+                    idx.append(X[k[pair], g.scopes[rows, p]][:, None, None])
+            np.add.at(S, pair, g.tables[(rows[:, None, None],) + tuple(idx)])
+        return S
+
+    def onBatchCycle(self):
+        ci = self.compiled
+        X = self.X
+        K, n = X.shape
+        d = ci.max_dom
+        L, gain, best = self.unilateralGains(X)
+
+        # Offers: each offerer picks a random neighbor, which must not be an offerer itself
+        deg = np.diff(ci.adj_ptr)
+        offerer = (self.random(n) < self.q) & (deg > 0)
+        pick = ci.adj_ptr[:-1] + np.minimum((self.random(n) * deg).astype(np.int64), np.maximum(deg - 1, 0))
+        k, u = np.nonzero(offerer)
+        e = pick[k, u]
+        v = ci.adj_idx[e]
+        keep = ~offerer[k, v]
+        k, u, v, e = k[keep], u[keep], v[keep], e[keep]
+        m = len(k)
+
+        # Joint gains: the local costs of u and v count their shared constraints once
+        S = self.sharedCosts(X, k, e)
+        r = np.arange(m)
+        xu, xv = X[k, u], X[k, v]
+        Lu, Lv = L[k, u], L[k, v]
+        with np.errstate(invalid='ignore'):
+            new = (Lu - S[r, :, xv])[:, :, None] + (Lv - S[r, xu, :])[:, None, :] + S
+            new[np.isnan(new)] = np.inf
+            curr = Lu[r, xu] + Lv[r, xv] - S[r, xu, xv]
+            flat = new.reshape(m, d * d)
+            joint = np.argmin(flat, axis=1)
+            best_new = flat[r, joint]
+            pair_gain = np.where(curr > best_new, curr - best_new, 0.0)
+
+        # Each receiver accepts its best offer (ties to the offerer of lowest rank), if it beats both
+        # unilateral gains
+        order = np.lexsort((self.rank[u], -pair_gain, v, k))
+        first = np.ones(m, dtype=bool)
+        first[1:] = (k[order][1:] != k[order][:-1]) | (v[order][1:] != v[order][:-1])
+        accepted = np.zeros(m, dtype=bool)
+        accepted[order[first]] = True
+        accepted &= pair_gain > np.maximum(gain[k, u], gain[k, v])
+
+        partner = np.full((K, n), -1, dtype=np.int64)
+        G = gain.copy()
+        ka, ua, va = k[accepted], u[accepted], v[accepted]
+        partner[ka, ua], partner[ka, va] = va, ua
+        G[ka, ua] = G[ka, va] = pair_gain[accepted]
+
+        win = self.winners(G, ignore=ci.adj_idx[None, :] == partner[:, ci.adj_row])
+        newX = X.copy()
+        alone = win & (partner < 0)
+        newX[alone] = best[alone]
+        go = win[ka, ua] & win[ka, va]
+        a, b = np.divmod(joint[accepted][go], d)
+        newX[ka[go], ua[go]] = a
+        newX[ka[go], va[go]] = b
+        self.X = newX
+
+        # Value, offer, response, gain and go messages
+        self.num_messages_sent += 2 * ci.n_agent_links + 2 * m + 2 * len(ka)
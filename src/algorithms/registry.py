@@ -0,0 +1,99 @@
+'''
+Registry of the available algorithms. Algorithm modules are imported only when an algorithm is
+instantiated, so that optional dependencies (e.g., gurobipy for the LP solver) are only needed when used.
+'''
+import importlib
+
+# name -> (module, class, default arguments)
+ALGORITHMS = {
+    'dsa':          ('algorithms.dsa', 'Dsa', {'type': 'A', 'p': 0.001}),
+    'dsa-vec':      ('algorithms.dsa_vec', 'VecDsa', {'type': 'A', 'p': 0.001, 'n_replicas': 1}),
+    'maxsum':       ('algorithms.max_sum', 'MaxSum', {'damping': 0.7, 'fixed_noise': False, 'msg_tol': 0}),
+    'maxsum-residual': ('algorithms.residual_max_sum', 'ResidualMaxSum', {'damping': 0.7, 'budget': None,
+                                                                          'tol': 1e-6}),
+    'maxsum-vec':   ('algorithms.max_sum_vec', 'VecMaxSum', {'damping': 0.7, 'n_replicas': 1}),
+    'mgm':          ('algorithms.mgm_vec', 'VecMgm', {'n_replicas': 1}),
+    'mgm2':         ('algorithms.mgm_vec', 'VecMgm2', {'q': 0.5, 'n_replicas': 1}),
+    'ccg-maxsum':   ('algorithms.ccg_maxsum', 'CCGMaxSum', {'damping': 0.7}),
+    'ccg-maxsum-c': ('algorithms.ccg_centralized', 'CCGCentralized', {'damping': 0.7}),
+    'ccg-dsa':      ('algorithms.ccg_dsa', 'CCGDsa', {'type': 'C', 'p': 0.7}),
+    'rand':         ('algorithms.rand', 'Rand', {'max_iter': 1}),
+    'lp':           ('algorithms.lp_solver', 'LPSolver', {'max_iter': 1, 'relax': True, 'backend': 'highs'}),
+    'dpop':         ('algorithms.dpop', 'Dpop', {'max_iter': 1, 'memory_limit': None}),
+}
+
+# Arguments of single-shot algorithms which the caller cannot override (e.g., the number of iterations passed
+# to every algorithm of a run)
+FIXED = {
+    'rand': {'max_iter': 1},
+    'lp':   {'max_iter': 1},
+    'dpop': {'max_iter': 1},
+}
+
+# Hybrid modes: the stages are run in turn, each for a fraction of the iterations, starting from the
+# assignment left by the previous stage.
+PIPELINES = {
+    'dsa&ccg-maxsum':   [('dsa', {'type': 'C', 'p': 0.7}), ('ccg-maxsum', {'damping': 0.7})],
+    'dsa&ccg-maxsum-c': [('dsa', {'type': 'C', 'p': 0.7}), ('ccg-maxsum-c', {'damping': 0.9})],
+    'dsa&ccg-dsa':      [('dsa', {'type': 'C', 'p': 0.7}), ('ccg-dsa', {'type': 'C', 'p': 0.7})],
+    'dsa&rand':         [('dsa', {'type': 'C', 'p': 0.7}), ('rand', {'max_iter': 1})],
+}
+
+# Modes run entirely by the external wcsp executable (name -> kernelize)
+EXTERNAL = {
+    'ccg-maxsum+': False,
+    'ccg-maxsum+k': True,
+}
+
+
+def register(name, module, cls, defaults=None, fixed=None):
+    """
+    Registers (or overrides) an algorithm implemented by class :param cls of module :param module.
+    :param fixed: The arguments which override those of the caller (see FIXED).
+    """
+    ALGORITHMS[name] = (module, cls, dict(defaults or {}))
+    FIXED.pop(name, None)
+    if fixed:
+        FIXED[name] = dict(fixed)
+
+
+def names():
+    return list(ALGORITHMS) + list(PIPELINES) + list(EXTERNAL)
+
+
+def get_class(name):
+    module, cls, _ = ALGORITHMS[name]
+    return getattr(importlib.import_module(module), cls)
+
+
+def make_algorithm(name, dcop_instance, params=None, seed=1234, context=None):
+    """
+    Instantiates the algorithm :param name with its default arguments updated with :param params, then with
+    its fixed arguments (see FIXED)
+    """
+    if name not in ALGORITHMS:
+        raise ValueError('Unknown algorithm ' + str(name) + '. Available: ' + ', '.join(names()))
+    args = dict(ALGORITHMS[name][2])
+    args.update(params or {})
+    args.update(FIXED.get(name, {}))
+    return get_class(name)(name, dcop_instance, args, seed=seed, context=context)
+
+
+def make_pipeline(name, dcop_instance, params=None, seed=1234, context=None):
+    """
+    :return: The list of algorithms (stages) to run and the number of times the stages are repeated.
+    A single algorithm is a pipeline of one stage run once for params['max_iter'] iterations.
+    """
+    params = dict(params or {})
+    iterations = params.get('max_iter', 500)
+    if name not in PIPELINES:
+        return [make_algorithm(name, dcop_instance, params, seed, context)], 1
+
+    r = max(1, iterations / 50)
+    stages = []
+    for stage, stage_args in PIPELINES[name]:
+        args = dict(params)
+        args['max_iter'] = r
+        args.update(stage_args)
+        stages.append(make_algorithm(stage, dcop_instance, args, seed, context))
+    return stages, int(iterations / (2 * r))
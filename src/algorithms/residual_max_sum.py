@@ -0,0 +1,196 @@
+import heapq
+import numpy as np
+
+from algorithms.max_sum import MaxSum
+
+
+class ResidualMaxSum(MaxSum):
+    """
+    Residual (priority-scheduled) Max-Sum: instead of recomputing every message each iteration, the pending
+    messages are kept in a priority queue keyed by their residual (the max-norm of the difference with the
+    message last sent) and, each iteration, only the args['budget'] messages with the largest residual are
+    sent. Sending a message recomputes the messages depending on it: a variable-to-function message x -> F
+    changes the messages F -> y (y != x), a function-to-variable message F -> x changes the messages x -> G
+    (G != F) and the belief of x. Messages with a residual below args['tol'] are not sent, hence the settled
+    parts of the factor graph cost nothing.
+    Unlike MaxSum, the noise added to the variable-to-function messages is drawn once per edge, so that the
+    residuals vanish when the messages converge.
+    """
+    def __init__(self, name, dcop_instance, args={'max_iter': 10, 'damping': 0, 'budget': None, 'tol': 1e-6},
+                 seed=1234, context=None):
+        super(ResidualMaxSum, self).__init__(name, dcop_instance, args, seed, context)
+        self.root = min([aname for aname in dcop_instance.agents])
+        self.tol = args.get('tol', 1e-6)
+        self.budget_arg = args.get('budget')
+        self._buildEdges()
+        self._initMessages()
+
+    def _buildEdges(self):
+        dcop_instance = self.instance
+        # Edges of the factor graph: edge e connects the variable edge_var[e] and the constraint edge_con[e]
+        self.edge_var, self.edge_con, self.edge_pos = [], [], []
+        self.con_edges, self.var_edges = {}, {vname: [] for vname in dcop_instance.variables}
+        for con in dcop_instance.constraints.values():
+            self.con_edges[con.name] = []
+            for pos, var in enumerate(con.scope):
+                e = len(self.edge_var)
+                self.edge_var.append(var)
+                self.edge_con.append(con)
+                self.edge_pos.append(pos)
+                self.con_edges[con.name].append(e)
+                self.var_edges[var.name].append(e)
+        self.n_edges = len(self.edge_var)
+        # Messages sent per iteration (default: one per edge, i.e., half the messages of a MaxSum iteration)
+        self.budget = self.budget_arg or max(1, self.n_edges)
+
+        # For each edge e: the cost table of its constraint with the axis of its variable moved first, and the
+        # other edges of the constraint with the shape their messages are broadcast to along that table
+        self.edge_table, self.edge_others = [], []
+        for con in dcop_instance.constraints.values():
+            table = self.fnodes[con.name].table
+            if table is None:
+                table = con.table.toDense()
+            for e in self.con_edges[con.name]:
+                pos = self.edge_pos[e]
+                self.edge_table.append(np.moveaxis(table, pos, 0))
+                others = []
+                for e2 in self.con_edges[con.name]:
+                    if e2 != e:
+                        shape = [1] * table.ndim
+                        shape[self.edge_pos[e2] + (self.edge_pos[e2] < pos)] = -1
+                        others.append((e2, tuple(shape)))
+                self.edge_others.append(others)
+
+    def _initMessages(self):
+        # Message key k < n_edges: variable-to-function message on edge k; otherwise function-to-variable
+        # message on edge k - n_edges
+        self.msgs = [np.zeros(len(self.edge_var[k % self.n_edges].domain)) for k in range(2 * self.n_edges)]
+        self.pending = [None] * (2 * self.n_edges)
+        self.version = np.zeros(2 * self.n_edges, dtype=np.int64)
+        self.queue = []
+        self.belief = {vname: np.zeros(len(var.domain)) for vname, var in self.instance.variables.items()}
+        self.edge_noise = None
+
+    def onInstanceChange(self, changes):
+        super(ResidualMaxSum, self).onInstanceChange(changes)
+        # Messages (and noises) on the edges which still exist are kept, then all the messages are recomputed
+        # and requeued by residual
+        added = {name for kind, name in changes if kind == 'add_constraint'}
+        old_edges = {(self.edge_con[e].name, self.edge_pos[e]): e for e in range(self.n_edges)
+                     if self.edge_con[e].name not in added}
+        old_n, old_msgs, old_noise = self.n_edges, self.msgs, self.edge_noise
+        self.root = min([aname for aname in self.instance.agents])
+        self._buildEdges()
+        self._initMessages()
+        remap = [old_edges.get((self.edge_con[e].name, self.edge_pos[e]), -1) for e in range(self.n_edges)]
+        for e, o in enumerate(remap):
+            if o >= 0:
+                self.msgs[e], self.msgs[self.n_edges + e] = old_msgs[o], old_msgs[old_n + o]
+                self.belief[self.edge_var[e].name] += self.msgs[self.n_edges + e]
+        if old_noise is not None:
+            self.edge_noise = [old_noise[o] if o >= 0 else
+                               np.abs(self.rng.normal(20.0, len(self.edge_var[e].domain)))
+                               for e, o in enumerate(remap)]
+            for k in range(2 * self.n_edges):
+                self._update(k)
+
+    def reset(self, newseed):
+        super(ResidualMaxSum, self).reset(newseed)
+        self._initMessages()
+
+    def onStart(self, agt):
+        agt.state.copyAgtAssignmentToState()
+        if agt.name != self.root:
+            return
+        if self.edge_noise is None:
+            self.edge_noise = [np.abs(self.rng.normal(20.0, len(self.edge_var[e].domain))) for e in range(self.n_edges)]
+        for k in range(2 * self.n_edges):
+            self._update(k)
+
+    def _compute(self, k):
+        """:return: The message of key :param k computed from the messages currently sent"""
+        if k < self.n_edges:
+            # Variable x to function F: the belief of x without the message from F
+            m = self.belief[self.edge_var[k].name] - self.msgs[self.n_edges + k]
+            m -= m.min()
+            m += self.edge_noise[k]
+        else:
+            # Function F to variable x: min over the other variables of F + their messages to F
+            e = k - self.n_edges
+            table = self.edge_table[e]
+            for e2, shape in self.edge_others[e]:
+                table = table + self.msgs[e2].reshape(shape)
+            m = table.reshape(len(table), -1).min(axis=1)
+            m -= m.min()
+        if self.damping > 0:
+            m = self.damping * self.msgs[k] + (1 - self.damping) * m
+        return m
+
+    def _update(self, k):
+        """Recomputes the pending message of key :param k and (re)queues it by residual"""
+        m = self._compute(k)
+        self.version[k] += 1
+        residual = np.abs(m - self.msgs[k]).max() if len(m) > 0 else 0
+        if residual > self.tol:
+            self.pending[k] = m
+            heapq.heappush(self.queue, (-residual, k, self.version[k]))
+        else:
+            self.pending[k] = None
+
+    def _send(self, k):
+        m, self.pending[k] = self.pending[k], None
+        self.version[k] += 1
+        e = k % self.n_edges
+        var, con = self.edge_var[e], self.edge_con[e]
+        self.num_messages_sent += 1
+        if k < self.n_edges:
+            if self.comm is not None:
+                self.comm.record(var.controlled_by.name, self.con_owner[con.name], m.nbytes)
+            self.msgs[k] = m
+            for e2 in self.con_edges[con.name]:
+                if e2 != e:
+                    self._update(self.n_edges + e2)
+        else:
+            if self.comm is not None:
+                self.comm.record(self.con_owner[con.name], var.controlled_by.name, m.nbytes)
+            self.belief[var.name] += m - self.msgs[k]
+            self.msgs[k] = m
+            for e2 in self.var_edges[var.name]:
+                if e2 != e:
+                    self._update(e2)
+        if self.damping > 0:
+            # A damped message moves only partway to its target, requeue the rest
+            self._update(k)
+
+    def onCurrentCycle(self, agt):
+        if agt.name != self.root:
+            return
+        sent = 0
+        while self.queue and sent < self.budget:
+            _, k, version = heapq.heappop(self.queue)
+            if version == self.version[k]:
+                self._send(k)
+                sent += 1
+
+    def onCycleEnd(self, agt):
+        for v in agt.variables:
+            v.setAssignment(v.domain[int(np.argmin(self.belief[v.name]))])
+
+    def getState(self):
+        state = super(ResidualMaxSum, self).getState()
+        state.update({'msgs': [m.copy() for m in self.msgs],
+                      'pending': [None if m is None else m.copy() for m in self.pending],
+                      'version': self.version.copy(),
+                      'queue': list(self.queue),
+                      'belief': {vname: b.copy() for vname, b in self.belief.items()},
+                      'edge_noise': self.edge_noise})
+        return state
+
+    def setState(self, state):
+        super(ResidualMaxSum, self).setState(state)
+        self.msgs = [m.copy() for m in state['msgs']]
+        self.pending = [None if m is None else m.copy() for m in state['pending']]
+        self.version = state['version'].copy()
+        self.queue = list(state['queue'])
+        self.belief = {vname: b.copy() for vname, b in state['belief'].items()}
+        self.edge_noise = state['edge_noise']
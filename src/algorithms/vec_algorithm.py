@@ -0,0 +1,129 @@
+import time
+import numpy as np
+
+from algorithms.algorithm import Algorithm
+from utils.random_stream import RandomStream
+
+
+class VecAlgorithm(Algorithm):
+    """
+    Base class of the algorithms running on the compiled (array) representation of the instance.
+    The algorithm state carries a leading replica axis: K = args['n_replicas'] independent runs, seeded with
+    seed, seed+1, ..., seed+K-1, are executed simultaneously on the same compiled instance.
+    Each replica draws its random numbers from its own generator, hence replica k evolves exactly as a
+    single-replica run seeded with seed+k.
+    """
+    def __init__(self, name, dcop_instance, args, seed=1234, context=None):
+        super(VecAlgorithm, self).__init__(name, dcop_instance, args, seed, context)
+        self.compiled = self.context.compiled
+        self.n_replicas = args.get('n_replicas', 1)
+        self._setSeeds(seed)
+        # Value indexes of the current assignment of each replica: (K, n)
+        self.X = None
+
+    def _setSeeds(self, seed):
+        self.seed = seed
+        self.seeds = [seed + k for k in range(self.n_replicas)]
+        self.rngs = [RandomStream(s) for s in self.seeds]
+
+    def reset(self, newseed):
+        super(VecAlgorithm, self).reset(newseed)
+        self._setSeeds(newseed)
+        self.X = None
+
+    def random(self, shape):
+        """:return: A (K,) + shape array of uniform samples in [0, 1), row k drawn from the k-th replica"""
+        return np.stack([rng.uniform(shape) for rng in self.rngs])
+
+    def normal(self, scale, shape):
+        """:return: A (K,) + shape array of normal samples, row k drawn from the k-th replica"""
+        return np.stack([rng.normal(scale, shape) for rng in self.rngs])
+
+    def getAssignment(self):
+        """:return: The assignment of the replica with the lowest current cost"""
+        if self.X is None:
+            return self.compiled.getAssignment()
+        return self.X[np.argmin(self.compiled.cost(self.X))].copy()
+
+    def warmStart(self, source):
+        x = source.getAssignment() if isinstance(source, Algorithm) else np.asarray(source)
+        super(VecAlgorithm, self).warmStart(x)
+        # During a run, all replicas continue from the new assignment (otherwise the run starts from it)
+        if self.X is not None:
+            self.X = np.tile(x, (self.n_replicas, 1))
+
+    def onInstanceChange(self, changes):
+        # The compiled instance is updated in place: the replicas keep the values of the remaining variables,
+        # the new variables take their instance value
+        if self.X is not None:
+            ci = self.compiled
+            X = np.tile(ci.getAssignment(), (self.n_replicas, 1))
+            keep = np.flatnonzero(ci.var_remap >= 0)
+            X[:, keep] = self.X[:, ci.var_remap[keep]]
+            self.X = X
+
+    def getState(self):
+        state = super(VecAlgorithm, self).getState()
+        state['X'] = None if self.X is None else self.X.copy()
+        state['seeds'] = list(self.seeds)
+        state['rngs'] = [rng.getState() for rng in self.rngs]
+        return state
+
+    def setState(self, state):
+        super(VecAlgorithm, self).setState(state)
+        self.X = None if state['X'] is None else state['X'].copy()
+        self._setSeeds(state['seeds'][0])
+        for rng, s in zip(self.rngs, state['rngs']):
+            rng.setState(s)
+
+    def run(self, interactive=True, pbar=None, chain=False, resume=False, checkpointer=None):
+        if resume:
+            off_time = self.curr_runtime
+        else:
+            if len(self.stats.iter_stats) > 0:
+                self.curr_iteration = self.stats.iter_stats[-1]['iteration'] + 1
+                self.num_messages_sent = self.stats.iter_stats[-1]['messages']
+                self.curr_iterations_limit = self.curr_iteration + self.iterations_limit - 1
+            off_time = 0 if self.curr_iteration == 0 else self.stats.iter_stats[-1]['time']
+
+        start_time = time.time()
+        if not resume:
+            # All replicas start from the current instance assignment
+            self.X = np.tile(self.compiled.getAssignment(), (self.n_replicas, 1))
+            self.onBatchStart()
+
+            self.curr_runtime = time.time() - start_time + off_time
+            self._updateStats(interactive)
+
+        while not self.terminationCondition():
+            self.runIteration()
+            self.curr_runtime = time.time() - start_time + off_time
+            self._updateStats(interactive)
+            if checkpointer is not None:
+                checkpointer.step(self)
+            if pbar is not None:
+                pbar.update(1)
+            if self.monitor is not None and self.monitor.step(self):
+                self.interrupted = True
+                break
+
+        # Write the assignment of the best replica back into the instance
+        self.compiled.setAssignment(self.getAssignment())
+        self.status = 'Finished'
+
+    def runIteration(self):
+        self.curr_iteration += 1
+        self.onBatchCycle()
+        if self.comm is not None:
+            self.comm.endIteration(self.curr_iteration)
+
+    def _updateStats(self, interactive):
+        self.curr_costs = self.compiled.cost(self.X)
+        self.curr_cost = np.min(self.curr_costs)
+        self.stats.updateBatchIterStats(self, self.curr_costs, interactive=interactive)
+
+    def onBatchStart(self):
+        pass
+
+    def onBatchCycle(self):
+        pass
@@ -0,0 +1,103 @@
+'''
+Library entry point: runs an algorithm (or a pipeline of algorithms) on a DCOP instance and returns the
+statistics of the run as arrays. Algorithms are imported lazily through algorithms.registry.
+'''
+import time
+
+from algorithms import registry
+from core.problem_context import ProblemContext
+from utils import checkpoint
+from utils.stats_collector import StatsCollector
+
+
+def run(dcop_instance, algorithm, params=None, seed=1234, context=None, interactive=False, pbar=None, comm=None,
+        sink=None, monitor=None):
+    """
+    Runs :param algorithm on :param dcop_instance.
+    :param algorithm: One of registry.names() (e.g., 'dsa', 'maxsum', 'dsa&ccg-maxsum', 'ccg-maxsum+').
+    :param params: The algorithm arguments, overriding the registry defaults (e.g., {'max_iter': 500}).
+    params['exact_component_size'] and params['kernelize'] are used to build the context when :param context
+    is None. If params['checkpoint'] is set, the state of the run is saved to that file every
+    params['checkpoint_every'] iterations; params['resume'] is a checkpoint file the run is resumed from.
+    If params['time_limit'] is set, the run is stopped that many seconds after the call (at the end of the
+    iteration running at the deadline), or after params['max_iter'] iterations if earlier.
+    :param context: A ProblemContext of the instance, to share derived structures (e.g., the CCG) across runs.
+    :param pbar: An optional progress bar (anything with an update(n) method).
+    :param comm: An optional CommProfiler attached to all the algorithms of the run.
+    :param sink: An optional ResultSink (see utils.result_sink) the iteration records are streamed to. Only the
+    last record is then kept in memory, hence the returned arrays hold the last record only. When resuming, the
+    sink should be opened in append mode (see result_sink.open_sink): it is truncated to the records streamed
+    until the checkpoint.
+    :param monitor: An optional monitor attached to all the algorithms of the run (see Algorithm.attachMonitor):
+    the run stops when it returns True.
+    :return: A dictionary of arrays: 'alg', 'iter', 'msgs', 'time', 'cost' (anytime), 'replica' and 'seed'
+    for batched algorithms, 'assignment', the value indexes of the final assignment, and 'best_assignment'
+    and 'best_cost', the best assignment found during the run and its cost.
+    """
+    params = dict(params or {})
+    StatsCollector.reset()
+    if sink is not None:
+        StatsCollector.attachSink(sink)
+    try:
+        return _run(dcop_instance, algorithm, params, seed, context, interactive, pbar, comm, monitor)
+    finally:
+        if sink is not None:
+            StatsCollector.detachSink()
+
+
+def _run(dcop_instance, algorithm, params, seed, context, interactive, pbar, comm, monitor):
+    if algorithm in registry.EXTERNAL:
+        from utils.ccg_utils import run_ccg_maxsum_plus
+        for itr, cost, msgs, runtime in run_ccg_maxsum_plus(dcop_instance, kernelize=registry.EXTERNAL[algorithm]):
+            StatsCollector.addIterStats(algorithm, itr, cost, msgs, runtime)
+        return StatsCollector.getArraySummary()
+
+    deadline = None
+    if params.get('time_limit') is not None:
+        deadline = time.time() + params['time_limit']
+
+    if context is None:
+        context = ProblemContext(dcop_instance, exact_component_size=params.get('exact_component_size', 0),
+                                 kernelize=params.get('kernelize', False))
+    stages, n_rep = registry.make_pipeline(algorithm, dcop_instance, params, seed, context)
+    for alg in stages:
+        if comm is not None:
+            alg.attachCommProfiler(comm)
+        if monitor is not None:
+            alg.attachMonitor(monitor)
+        alg.reset(seed)
+        alg.setDeadline(deadline)
+
+    checkpointer = None
+    if params.get('checkpoint') is not None:
+        checkpointer = checkpoint.Checkpointer(params['checkpoint'], params.get('checkpoint_every', 100), stages, algorithm)
+    resume = params.get('resume')
+    start = (0, 0)
+    if resume is not None:
+        state = checkpoint.load(resume)
+        assert state['algorithm'] == algorithm, 'The checkpoint is of a run of ' + str(state['algorithm'])
+        checkpoint.restore(state, stages)
+        if StatsCollector.sink is not None:
+            # Drops the records streamed after the checkpoint (the sink is opened in append mode to resume)
+            StatsCollector.sink.truncate(state['stats'].get('sink_records') or 0)
+        start = (state['round'], state['stage'])
+        if pbar is not None:
+            pbar.update(stages[state['stage']].curr_iteration)
+
+    for i in range(start[0], n_rep):
+        for j, alg in enumerate(stages):
+            if (i, j) < start or deadline is not None and time.time() >= deadline \
+                    or any(s.interrupted for s in stages):
+                continue
+            if checkpointer is not None:
+                checkpointer.round, checkpointer.stage = i, j
+            alg.run(interactive=interactive, pbar=pbar, chain=j > 0, resume=resume is not None and (i, j) == start,
+                    checkpointer=checkpointer)
+
+    results = StatsCollector.getArraySummary()
+    results['assignment'] = stages[-1].getAssignment()
+    results['best_assignment'] = StatsCollector.best_assignment
+    results['best_cost'] = StatsCollector.best_assignment_cost
+    for alg in stages:
+        results.update(alg.getReport())
+    return results
@@ -13,20 +13,41 @@ class Agent:
         self.controlled_constraints = constraints.copy()
         self.prng = np.random.RandomState(seed)
         self.neighbors = []
+        # Membership indexes of self.neighbors and self.variables, kept in sync by the methods below
+        self._neighbor_set = set()
+        self._var_names = {var.name for var in self.variables}
         self.state = AgentState(name, self, seed)
 
-    def addNeighbor(self, neighbor, con):
-        if neighbor not in self.neighbors:
+    def addNeighbor(self, neighbor, con=None):
+        if neighbor not in self._neighbor_set:
+            self._neighbor_set.add(neighbor)
             self.neighbors.append(neighbor)
             self.state.addNeighborsVariables(neighbor)
 
-            # Initialize controlled constraints: This agent controls the constraint f only if f has in its scope var x
-            # this agent controls x and x is the variable with smallest index among all vars in the scope of f
-            if con in self.controlled_constraints:
-                v_agt = [v.name for v in self.variables]
-                v_con = sorted([v.name for v in con.scope])
-                if v_con[0] not in v_agt:
-                    self.controlled_constraints.remove(con)
+        # Initialize controlled constraints: This agent controls the constraint f only if f has in its scope var x
+        # this agent controls x and x is the variable with smallest index among all vars in the scope of f
+        if con is not None and not self.controls(con) and con in self.controlled_constraints:
+            self.controlled_constraints.remove(con)
+
+    def setNeighbors(self, neighbors):
+        self.neighbors = list(neighbors)
+        self._neighbor_set = set(self.neighbors)
+
+    def addVariable(self, var):
+        self.variables.append(var)
+        self._var_names.add(var.name)
+
+    def removeVariable(self, var):
+        self.variables.remove(var)
+        self._var_names.discard(var.name)
+
+    def controls(self, con):
+        '''True if this agent controls the variable of smallest name in the scope of :param con'''
+        return min(v.name for v in con.scope) in self._var_names
+
+    def updateControlledConstraints(self):
+        '''Sets the controlled constraints to those of self.constraints this agent controls (see controls)'''
+        self.controlled_constraints = [con for con in self.constraints if self.controls(con)]
 
     def setRandomAssignment(self):
         '''Initializes values of all its variables to random values'''
@@ -1,6 +1,6 @@
 '''Every agent has an agent state, which is its local view of the world'''
 import numpy as np
-import itertools
+from core.local_solver import LocalSolver
 
 class AgentState:
     def __init__(self, name, agt, seed=1234):
@@ -16,9 +16,29 @@ class AgentState:
         self.my_vars = [var.name for var in agt.variables]
         # the iterator to all possible assignment for this agent
         self.assignment_it = 0
-        # All possible assignments for the variables of this agent
-        domains = [var.domain for var in agt.variables]
-        self.agt_assignments_list = list(itertools.product(*domains))
+        # The assignments for the variables of this agent are the product of their domains, enumerated (not
+        # materialized) in mixed radix over the domain sizes
+        self.agt_domains = [var.domain for var in agt.variables]
+        self.n_agt_assignments = int(np.prod([len(d) for d in self.agt_domains], dtype=object))
+        # Exact solver of the agent subproblem (built on first use, once the constraints are known)
+        self.local_solver = None
+
+    def refresh(self):
+        '''
+        Updates the state after the variables, constraints or neighbors of the agent changed (see the
+        DCOPInstance methods add_variable, add_constraint, ...): the assignments of the variables no longer
+        known are dropped, those of the new ones are read from the variables, and the local solver is rebuilt
+        on next use.
+        '''
+        agt = self.this_agt
+        known = {var.name: var for a in [agt] + agt.neighbors for var in a.variables}
+        self.variables_assignments = {vname: self.variables_assignments.get(vname, var.value)
+                                      for vname, var in known.items()}
+        self.my_vars = [var.name for var in agt.variables]
+        self.assignment_it = 0
+        self.agt_domains = [var.domain for var in agt.variables]
+        self.n_agt_assignments = int(np.prod([len(d) for d in self.agt_domains], dtype=object))
+        self.local_solver = None
 
     def addNeighborsVariables(self, neighbor):
         for var in neighbor.variables:
@@ -37,7 +57,7 @@ class AgentState:
         If a next assignment for the agent local variables exists, then assign it
         :var self.variables_assignments and return True. Otherwise return False.
         '''
-        if self.assignment_it < len(self.agt_assignments_list):
+        if self.assignment_it < self.n_agt_assignments:
             self.setAssignmentIt(self.assignment_it)
             self.assignment_it += 1
             return True
@@ -47,5 +67,17 @@ class AgentState:
             return False
 
     def setAssignmentIt(self, it):
-        for i, var_name in enumerate(self.my_vars):
-            self.variables_assignments[var_name] = self.agt_assignments_list[it][i]
\ No newline at end of file
+        for var_name, domain in reversed(list(zip(self.my_vars, self.agt_domains))):
+            it, d = divmod(it, len(domain))
+            self.variables_assignments[var_name] = domain[d]
+
+    def bestLocalAssignment(self):
+        '''
+        Optimizes the agent local variables, the values of its neighbors being those in
+        :var self.variables_assignments (see core.local_solver.LocalSolver).
+        Returns the pair (cost, {var_name: value}) of the best assignment found.
+        '''
+        if self.local_solver is None:
+            self.local_solver = LocalSolver(self.this_agt)
+        cost, values = self.local_solver.solve(self.variables_assignments)
+        return cost, dict(zip(self.my_vars, values))
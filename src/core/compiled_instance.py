@@ -0,0 +1,272 @@
+'''Array (compiled) representation of a DCOP instance used by the vectorized algorithms'''
+import functools
+import numpy as np
+
+
+class ConstraintGroup:
+    """
+    All the constraints of the same arity, stacked in a single cost tensor of shape (C, d, ..., d), where d is
+    the maximum domain size of the instance. Entries associated to values outside a variable domain are +inf.
+    """
+    def __init__(self, arity, con_ids, scopes, tables):
+        """
+        :param tables: The cost tensor, or a function returning it: the (dense) tensor is then built on first use,
+        e.g., not at all if only the variables and the edges of the compiled instance are used.
+        """
+        self.arity = arity
+        self.con_ids = np.asarray(con_ids, dtype=np.int64)
+        self.scopes = np.asarray(scopes, dtype=np.int64).reshape(len(con_ids), arity)
+        self._tables = tables
+        self._pos_tables = None
+        self.rows = np.arange(len(con_ids))
+        # Offset of the group edges in the edge arrays (set by the CompiledInstance)
+        self.edge_offset = 0
+
+    @property
+    def tables(self):
+        if callable(self._tables):
+            self._tables = self._tables()
+        return self._tables
+
+    @property
+    def pos_tables(self):
+        """pos_tables[j] has the axis of the j-th scope variable as last axis"""
+        if self._pos_tables is None:
+            self._pos_tables = [np.moveaxis(self.tables, 1 + j, -1) for j in range(self.arity)]
+        return self._pos_tables
+
+    def __len__(self):
+        return len(self.con_ids)
+
+    def edgeSlice(self, j):
+        """The slice of the edges connecting the constraints of this group to their j-th scope variable"""
+        C = len(self.con_ids)
+        return slice(self.edge_offset + j * C, self.edge_offset + (j + 1) * C)
+
+    def evaluate(self, X):
+        """
+        :param X: A (K, n) array of value indexes (one row per assignment).
+        :return: A (K, C) array with the cost of each constraint of the group.
+        """
+        idx = tuple(X[:, self.scopes[:, j]] for j in range(self.arity))
+        return self.tables[(self.rows,) + idx]
+
+    def projectedCosts(self, X, j):
+        """
+        :return: A (K, C, d) array with the costs of each constraint for every value of its j-th scope
+        variable when the other variables in its scope are fixed as in :param X.
+        """
+        idx = tuple(X[:, self.scopes[:, i]] for i in range(self.arity) if i != j)
+        if not idx:
+            return np.broadcast_to(self.tables, (X.shape[0],) + self.tables.shape)
+        return self.pos_tables[j][(self.rows,) + idx]
+
+
+class CompiledInstance:
+    """
+    Compiles a DCOPInstance into integer indexed arrays: variables are indexed by their position in
+    instance.variables and values by their position in the variable domain.
+    The (constraint, scope variable) pairs are the edges of the factor graph: the edges of a group are stored
+    contiguously, position major.
+    """
+    def __init__(self, dcop_instance):
+        self.instance = dcop_instance
+        self.compile()
+
+    def update(self, changes):
+        """
+        Recompiles the instance in place after :param changes (see DCOPInstance.addListener), so that the objects
+        holding the compiled instance see the changes. The rows of the cost tensors (if built) of the constraints
+        whose costs did not change are copied rather than rebuilt from the constraints.
+        Sets var_remap and edge_remap: for each variable (edge), the index of the same variable (edge) before the
+        changes, or -1 if it is new.
+        """
+        added_vars = {name for kind, name in changes if kind == 'add_variable'}
+        added_cons = {name for kind, name in changes if kind == 'add_constraint'}
+        changed_cons = added_cons | {name for kind, name in changes if kind == 'set_values'}
+        old_var_index, old_edges, reuse = self.var_index, {}, {}
+        for g in self.groups:
+            names = [self.con_names[cid] for cid in g.con_ids]
+            for j in range(g.arity):
+                old_edges.update(((cname, j), g.edge_offset + j * len(g) + row) for row, cname in enumerate(names))
+            if not callable(g._tables):
+                reuse.update((cname, (g._tables, row)) for row, cname in enumerate(names)
+                             if cname not in changed_cons)
+
+        self.compile(reuse)
+        self.var_remap = np.asarray([-1 if vname in added_vars else old_var_index.get(vname, -1)
+                                     for vname in self.var_names], dtype=np.int64)
+        self.edge_remap = np.full(self.n_edges, -1, dtype=np.int64)
+        for g in self.groups:
+            for row, cid in enumerate(g.con_ids):
+                cname = self.con_names[cid]
+                if cname not in added_cons:
+                    for j in range(g.arity):
+                        self.edge_remap[g.edge_offset + j * len(g) + row] = old_edges.get((cname, j), -1)
+
+    def compile(self, reuse=None):
+        """
+        :param reuse: Optional dictionary mapping constraint names to (tensor, row) pairs: the row of the
+        tensor is copied as the cost table of the constraint, if the tensor has the right shape.
+        """
+        instance = self.instance
+        self.var_names = list(instance.variables)
+        self.var_index = {vname: i for i, vname in enumerate(self.var_names)}
+        self.n_vars = len(self.var_names)
+        self.domains = [instance.variables[vname].domain for vname in self.var_names]
+        self.dom_size = np.asarray([len(d) for d in self.domains], dtype=np.int64)
+        self.max_dom = int(self.dom_size.max()) if self.n_vars > 0 else 0
+        self.dom_mask = np.arange(self.max_dom)[None, :] < self.dom_size[:, None]
+        self._val_index = [None if list(d) == list(range(len(d))) else {val: i for i, val in enumerate(d)}
+                           for d in self.domains]
+
+        self.agent_names = list(instance.agents)
+        agent_index = {aname: i for i, aname in enumerate(self.agent_names)}
+        self.var_agent = np.asarray([agent_index[instance.variables[vname].controlled_by.name]
+                                     for vname in self.var_names], dtype=np.int64)
+        # Number of agent-to-agent links (each link carries one message per DSA iteration)
+        self.n_agent_links = sum(len(agt.neighbors) for agt in instance.agents.values())
+
+        self.con_names = list(instance.constraints)
+        by_arity = {}
+        for cid, cname in enumerate(self.con_names):
+            by_arity.setdefault(len(instance.constraints[cname].scope), []).append(cid)
+
+        self.groups = []
+        for arity in sorted(by_arity):
+            con_ids = by_arity[arity]
+            scopes = [[self.var_index[v.name] for v in instance.constraints[self.con_names[cid]].scope]
+                      for cid in con_ids]
+            tables = functools.partial(self._buildTables, arity, con_ids, scopes, reuse)
+            if reuse and any(self.con_names[cid] in reuse for cid in con_ids):
+                # Build the tensor now, rather than keeping the reused tensors alive until first use
+                tables = tables()
+            self.groups.append(ConstraintGroup(arity, con_ids, scopes, tables))
+
+        self._compileEdges()
+        self._compileAdjacency()
+
+    def _buildTables(self, arity, con_ids, scopes, reuse=None):
+        tables = np.full((len(con_ids),) + (self.max_dom,) * arity, np.inf)
+        for row, cid in enumerate(con_ids):
+            src = reuse.get(self.con_names[cid]) if reuse else None
+            if src is not None and src[0].shape[1:] == tables.shape[1:]:
+                tables[row] = src[0][src[1]]
+            else:
+                self._fillTable(tables[row], self.instance.constraints[self.con_names[cid]], scopes[row])
+        return tables
+
+    def _fillTable(self, table, con, scope):
+        region = tuple(slice(0, self.dom_size[i]) for i in scope)
+        table[region] = con.table.toDense()
+
+    def _compileEdges(self):
+        edge_var, edge_con = [], []
+        offset = 0
+        for g in self.groups:
+            g.edge_offset = offset
+            for j in range(g.arity):
+                edge_var.append(g.scopes[:, j])
+                edge_con.append(g.con_ids)
+            offset += g.arity * len(g)
+        self.n_edges = offset
+        self.edge_var = np.concatenate(edge_var) if edge_var else np.zeros(0, dtype=np.int64)
+        self.edge_con = np.concatenate(edge_con) if edge_con else np.zeros(0, dtype=np.int64)
+        self.edge_mask = self.dom_mask[self.edge_var]
+
+        # Edges sorted by variable, to sum edge quantities into variable quantities with np.add.reduceat
+        self._ev_order = np.argsort(self.edge_var, kind='stable')
+        counts = np.bincount(self.edge_var, minlength=self.n_vars)
+        self._ev_nonempty = np.flatnonzero(counts)
+        self._ev_starts = (np.cumsum(counts) - counts)[self._ev_nonempty]
+
+    def _compileAdjacency(self):
+        """CSR adjacency of the constraint graph (two variables are neighbors if they share a constraint)"""
+        pairs = set()
+        for g in self.groups:
+            for i in range(g.arity):
+                for j in range(g.arity):
+                    if i != j:
+                        pairs.update(zip(g.scopes[:, i].tolist(), g.scopes[:, j].tolist()))
+        pairs = np.asarray(sorted(pairs), dtype=np.int64).reshape(-1, 2)
+        self.adj_row = pairs[:, 0].copy()
+        self.adj_idx = pairs[:, 1].copy()
+        self.adj_ptr = np.zeros(self.n_vars + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pairs[:, 0], minlength=self.n_vars), out=self.adj_ptr[1:])
+        self._adj_nonempty = np.flatnonzero(np.diff(self.adj_ptr))
+
+    def adjacencyEntry(self, u, v):
+        """:return: The indexes in adj_idx of the neighbors :param v of the variables :param u (arrays)"""
+        keys = self.adj_row * self.n_vars + self.adj_idx
+        return np.searchsorted(keys, np.asarray(u) * self.n_vars + np.asarray(v))
+
+    def reduceNeighbors(self, A, ufunc, identity):
+        """
+        :param A: A (K, n_adj) array of quantities on the adjacency entries (i.e., on the (u, v) neighbor pairs).
+        :return: The (K, n) array reducing by :param ufunc (e.g., np.maximum) the entries of each variable, or
+        :param identity for the variables without neighbors.
+        """
+        out = np.full((A.shape[0], self.n_vars), identity, dtype=A.dtype)
+        if len(self._adj_nonempty) > 0:
+            out[:, self._adj_nonempty] = ufunc.reduceat(A, self.adj_ptr[self._adj_nonempty], axis=1)
+        return out
+
+    def valueIndex(self, i, val):
+        return val if self._val_index[i] is None else self._val_index[i][val]
+
+    def sumEdgesToVars(self, E):
+        """
+        :param E: A (K, n_edges, ...) array of edge quantities.
+        :return: A (K, n_vars, ...) array where each variable entry sums the entries of its edges.
+        """
+        out = np.zeros((E.shape[0], self.n_vars) + E.shape[2:])
+        if self.n_edges > 0:
+            out[:, self._ev_nonempty] = np.add.reduceat(E[:, self._ev_order], self._ev_starts, axis=1)
+        return out
+
+    def cost(self, X):
+        """
+        :param X: A (K, n) array of value indexes.
+        :return: The (K,) array of the total cost of each assignment.
+        """
+        X = np.atleast_2d(X)
+        costs = np.zeros(X.shape[0])
+        for g in self.groups:
+            costs += g.evaluate(X).sum(axis=1)
+        return costs
+
+    def constraintCosts(self, X):
+        """
+        :param X: A (K, n) array of value indexes.
+        :return: The (K, m) array of the cost of each constraint (in the order of con_names) in each assignment.
+        """
+        X = np.atleast_2d(X)
+        C = np.empty((X.shape[0], len(self.con_names)))
+        for g in self.groups:
+            C[:, g.con_ids] = g.evaluate(X)
+        return C
+
+    def localCosts(self, X):
+        """
+        :param X: A (K, n) array of value indexes.
+        :return: A (K, n, d) array with, for each variable and value, the cost of the constraints involving
+        the variable when all other variables are fixed as in :param X (+inf for values outside the domain).
+        """
+        K = X.shape[0]
+        E = np.empty((K, self.n_edges, self.max_dom))
+        for g in self.groups:
+            for j in range(g.arity):
+                E[:, g.edgeSlice(j)] = g.projectedCosts(X, j)
+        L = self.sumEdgesToVars(E)
+        L[:, ~self.dom_mask] = np.inf
+        return L
+
+    def getAssignment(self):
+        """:return: The (n,) array of value indexes of the current instance assignment"""
+        return np.asarray([self.valueIndex(i, self.instance.variables[vname].value)
+                           for i, vname in enumerate(self.var_names)], dtype=np.int64)
+
+    def setAssignment(self, x):
+        """Sets the instance variables to the values indexed by :param x"""
+        for i, vname in enumerate(self.var_names):
+            self.instance.variables[vname].setAssignment(self.domains[i][x[i]])
@@ -1,20 +1,67 @@
 import numpy as np
 from core.variable import Variable
+from core.cost_table import SparseCostTable
 
 class Constraint:
-    def __init__(self, name, scope=[], values={}, default_value = 0, type='extensional', seed=1234):
+    def __init__(self, name, scope=[], values={}, default_value = 0, type='extensional', seed=1234, table=None):
+        """
+        The costs are stored in a SparseCostTable over the value indexes of the scope: :param table if given
+        (its default cost is then the default cost of the constraint), otherwise the table of :param values, a
+        dictionary mapping tuples of values (in scope order) to costs, the tuples not in it having cost
+        :param default_value.
+        """
         self.name = name
         self.scope = scope.copy()
         self.type = type
-        self.values = values.copy()
-        self.default_value = default_value
-        self.prng = np.random.RandomState(seed)
+        self._seed = seed
+        self._prng = None
+        self.setTable(table if table is not None else
+                       SparseCostTable.fromValues([var.domain for var in self.scope], values, default_value))
+
+    @property
+    def prng(self):
+        """The random generator of the constraint (created on first use)"""
+        if self._prng is None:
+            self._prng = np.random.RandomState(self._seed)
+        return self._prng
 
     def init(self, scope: list, values: dict, default_value = 0, type='extensional'):
         self.scope = scope
-        self.values = values
         self.type = type
-        self.default_value = default_value
+        self.setTable(SparseCostTable.fromValues([var.domain for var in scope], values, default_value))
+
+    def setTable(self, table):
+        """Replaces the costs of the constraint by :param table, a SparseCostTable over the scope"""
+        self._table = table
+        self.default_value = table.default
+        self._values = None
+        # Value -> value index of each scope variable, and the strides of the flat indexes (see evaluateTuple)
+        self._val_index = [{val: i for i, val in enumerate(var.domain)} for var in self.scope]
+        self._strides = [int(np.prod(table.dom_sizes[i + 1:], dtype=np.int64)) for i in range(table.arity)]
+
+    @property
+    def table(self):
+        """The SparseCostTable of the constraint over the value indexes of its scope"""
+        return self._table
+
+    @property
+    def values(self):
+        """
+        Dictionary mapping the tuples of values (in scope order) whose cost differs from default_value to their
+        cost, derived from the table (built on first use)
+        """
+        if self._values is None:
+            domains = [var.domain for var in self.scope]
+            self._values = {tuple(d[i] for d, i in zip(domains, t)): c
+                            for t, c in zip(self._table.tuples.tolist(), self._table.costs.tolist())}
+        return self._values
+
+    def sparsify(self, default_value=None):
+        """
+        Drops the tuples of default cost from the table. If :param default_value is given it becomes the default
+        cost, otherwise the most frequent cost (counting the tuples of default cost not stored) does.
+        """
+        self.setTable(self._table.withDefault(default_value))
 
     def evaluate(self, var_vals=None):
         '''takes in input a tuple of values of the type:
@@ -27,18 +74,27 @@ class Constraint:
         eval_tuple = tuple([var_vals[var.name] for var in self.scope])
         return self.evaluateTuple(eval_tuple)
 
+    def evaluate_many(self, X):
+        '''Batched evaluation: :param X is a (N, arity) array of value indexes, its columns follow the scope order.
+           Returns the (N,) array of costs.
+        '''
+        return self.table.evaluateMany(X)
+
     def evaluateTuple(self, eval_tuple):
         '''Evaluates a tuple of values already ordreded as expected'''
-        if eval_tuple in self.values:
-            return self.values[eval_tuple]
-        else:
-            return self.default_value
+        flat = 0
+        for val_index, stride, val in zip(self._val_index, self._strides, eval_tuple):
+            i = val_index.get(val)
+            if i is None:
+                # A value out of the domain (e.g., of a variable not assigned yet)
+                return self.default_value
+            flat += i * stride
+        return self._table.cost(flat)
 
 
     def evaluateCurrentAssignment(self):
         '''evaluate constraint with current variable assignment'''
-        eval_tuple = tuple([var.value for var in self.scope])
-        return self.values[eval_tuple] if eval_tuple in self.values else self.default_value
+        return self.evaluateTuple([var.value for var in self.scope])
 
     def __str__(self):
         s = 'constraint: ' + str(self.name) + '\t'
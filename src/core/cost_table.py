@@ -0,0 +1,228 @@
+'''Sparse cost tables: only the tuples whose cost differs from the default cost of the constraint are stored'''
+import heapq
+from bisect import bisect_left
+import numpy as np
+
+
+class SparseCostTable:
+    """
+    Cost table of a constraint over the value indexes of its scope. A tuple is identified by its flat (row major)
+    index; the explicit tuples (those whose cost differs from the default cost) are stored in increasing order of
+    flat index, with their costs in an aligned array. If the default cost is +inf (hard constraint) the explicit
+    tuples are the feasible ones.
+    """
+    def __init__(self, dom_sizes, index, costs, default):
+        self.dom_sizes = tuple(int(d) for d in dom_sizes)
+        self.arity = len(self.dom_sizes)
+        self.size = int(np.prod(self.dom_sizes, dtype=np.int64))
+        self.default = float(default)
+        order = np.argsort(index, kind='stable')
+        self.index = np.asarray(index, dtype=np.int64)[order]
+        self.costs = np.asarray(costs, dtype=float)[order]
+        self._tuples = None
+        self._by_value = {}
+        # Python lists of index and costs, for the scalar lookups (see cost)
+        self._lists = None
+
+    @staticmethod
+    def fromCosts(dom_sizes, costs, default=None):
+        """
+        :return: The table of the costs of all the tuples :param costs (flat, in row major order), without its
+        tuples of cost :param default. If default is None, the most frequent cost is the default cost.
+        """
+        costs = np.asarray(costs, dtype=float).ravel()
+        if default is None:
+            vals, counts = np.unique(costs, return_counts=True)
+            default = vals[np.argmax(counts)] if len(vals) > 0 else 0
+        index = np.flatnonzero(costs != default)
+        return SparseCostTable(dom_sizes, index, costs[index], default)
+
+    @staticmethod
+    def fromValues(domains, values, default):
+        """
+        :return: The table over :param domains (the lists of values of the scope variables) of :param values, a
+        dictionary mapping tuples of values to costs, the tuples not in it having cost :param default.
+        """
+        dom_sizes = [len(d) for d in domains]
+        val_index = [{val: i for i, val in enumerate(d)} for d in domains]
+        values = [(t, c) for t, c in values.items() if c != default]
+        T = np.asarray([[val_index[i][v] for i, v in enumerate(t)] for t, _ in values], dtype=np.int64)
+        T = T.reshape(len(values), len(dom_sizes))
+        index = np.ravel_multi_index(tuple(T.T), dom_sizes) if len(values) > 0 else np.zeros(0, dtype=np.int64)
+        return SparseCostTable(dom_sizes, index, [c for _, c in values], default)
+
+    @property
+    def nnz(self):
+        return len(self.index)
+
+    @property
+    def density(self):
+        return self.nnz / self.size if self.size > 0 else 0.0
+
+    @property
+    def nbytes(self):
+        return self.index.nbytes + self.costs.nbytes
+
+    @property
+    def hard(self):
+        return self.default == np.inf
+
+    @property
+    def tuples(self):
+        """The (nnz, arity) array of the value indexes of the explicit tuples"""
+        if self._tuples is None:
+            self._tuples = np.stack(np.unravel_index(self.index, self.dom_sizes), axis=1).reshape(self.nnz, self.arity)
+        return self._tuples
+
+    def byValue(self, pos):
+        """
+        Index of the explicit tuples by the value of their :param pos-th variable (for hard constraints, the
+        feasible-tuple index).
+        :return: (ptr, rows): the explicit tuples whose pos-th variable takes value index d are the rows
+        rows[ptr[d]:ptr[d+1]] of self.tuples.
+        """
+        if pos not in self._by_value:
+            col = self.tuples[:, pos]
+            rows = np.argsort(col, kind='stable')
+            ptr = np.zeros(self.dom_sizes[pos] + 1, dtype=np.int64)
+            np.cumsum(np.bincount(col, minlength=self.dom_sizes[pos]), out=ptr[1:])
+            self._by_value[pos] = (ptr, rows)
+        return self._by_value[pos]
+
+    def feasible(self, pos, d):
+        """:return: The value indexes of the explicit tuples of finite cost whose :param pos-th variable is d"""
+        ptr, rows = self.byValue(pos)
+        rows = rows[ptr[d]:ptr[d + 1]]
+        return self.tuples[rows[np.isfinite(self.costs[rows])]]
+
+    def lookup(self, flat):
+        """:return: The costs of the tuples of flat indexes :param flat (an array)"""
+        flat = np.asarray(flat, dtype=np.int64)
+        if self.nnz == 0:
+            return np.full(flat.shape, self.default)
+        pos = np.minimum(np.searchsorted(self.index, flat), self.nnz - 1)
+        return np.where(self.index[pos] == flat, self.costs[pos], self.default)
+
+    def cost(self, flat):
+        """:return: The cost of the tuple of flat index :param flat (an int), without numpy overhead"""
+        if self._lists is None:
+            self._lists = (self.index.tolist(), self.costs.tolist())
+        index, costs = self._lists
+        k = bisect_left(index, flat)
+        return costs[k] if k < len(index) and index[k] == flat else self.default
+
+    def evaluate(self, idx):
+        """:return: The cost of the tuple of value indexes :param idx"""
+        return float(self.lookup(np.ravel_multi_index(tuple(idx), self.dom_sizes)))
+
+    def evaluateMany(self, idx):
+        """:return: The costs of the rows of :param idx, a (N, arity) array of value indexes"""
+        idx = np.asarray(idx, dtype=np.int64).reshape(-1, self.arity)
+        if self.arity == 0:
+            return np.full(len(idx), self.lookup(0))
+        return self.lookup(np.ravel_multi_index(tuple(idx.T), self.dom_sizes))
+
+    def bestResponse(self, idx, pos):
+        """
+        :return: The array of the costs of each value index of the :param pos-th variable, when the other
+        variables take the value indexes in :param idx.
+        """
+        idx = list(idx)
+        idx[pos] = 0
+        stride = int(np.prod(self.dom_sizes[pos + 1:], dtype=np.int64))
+        base = np.ravel_multi_index(tuple(idx), self.dom_sizes)
+        return self.lookup(base + stride * np.arange(self.dom_sizes[pos]))
+
+    def condition(self, fixed):
+        """
+        :param fixed: Dictionary mapping scope positions to value indexes.
+        :return: The dense table over the other scope positions (in scope order), the fixed ones being set.
+        """
+        free = [i for i in range(self.arity) if i not in fixed]
+        if len(fixed) == 0:
+            return self.toDense()
+        mask = np.ones(self.nnz, dtype=bool)
+        for i, d in fixed.items():
+            mask &= self.tuples[:, i] == d
+        table = np.full(tuple(self.dom_sizes[i] for i in free), self.default)
+        table[tuple(self.tuples[mask][:, free].T)] = self.costs[mask]
+        return table
+
+    def minMarginals(self, msgs):
+        """
+        Min-marginals of the table plus the messages :param msgs (one array per scope variable): the j-th
+        returned array holds, for each value d of the j-th variable, the minimum over the other variables of
+        cost + the sum of their messages, with the j-th variable set to d.
+        The explicit tuples are scanned once; the tuples of default cost are accounted for without enumerating
+        them, from the sorted messages (see _minExcluding).
+        """
+        T = self.tuples
+        S = self.costs.copy()
+        for i, q in enumerate(msgs):
+            S += q[T[:, i]]
+
+        out = []
+        for pos in range(self.arity):
+            m = np.full(self.dom_sizes[pos], np.inf)
+            np.minimum.at(m, T[:, pos], S - msgs[pos][T[:, pos]])
+            n_others = self.size // self.dom_sizes[pos]
+            if self.default < np.inf:
+                others = [i for i in range(self.arity) if i != pos]
+                ptr, rows = self.byValue(pos)
+                counts = np.diff(ptr)
+                free = self.default + sum(np.min(msgs[i]) for i in others)
+                for d in np.flatnonzero(counts < n_others):
+                    if counts[d] == 0:
+                        m[d] = min(m[d], free)
+                    else:
+                        explicit = set(map(tuple, T[rows[ptr[d]:ptr[d + 1]]][:, others].tolist()))
+                        m[d] = min(m[d], self.default + _minExcluding([msgs[i] for i in others], explicit))
+            out.append(m)
+        return out
+
+    def withDefault(self, default=None):
+        """
+        :return: The same costs with default cost :param default (by default, the most frequent cost, counting
+        the tuples of default cost)
+        """
+        if default is None:
+            vals, counts = np.unique(self.costs, return_counts=True)
+            n_default = self.size - self.nnz
+            if len(vals) == 0 or n_default >= counts.max():
+                return self
+            default = vals[np.argmax(counts)]
+        if default == self.default:
+            return self
+        if self.nnz == self.size:
+            keep = self.costs != default
+            return SparseCostTable(self.dom_sizes, self.index[keep], self.costs[keep], default)
+        return SparseCostTable.fromCosts(self.dom_sizes, self.toDense(), default)
+
+    def toDense(self):
+        """:return: The dense table, of shape self.dom_sizes"""
+        table = np.full(self.size, self.default)
+        table[self.index] = self.costs
+        return table.reshape(self.dom_sizes)
+
+
+def _minExcluding(msgs, excluded):
+    """
+    :return: The minimum over the tuples t not in :param excluded of sum_i msgs[i][t_i], found by enumerating
+    the tuples by increasing sum (at most len(excluded) + 1 of them).
+    """
+    orders = [np.argsort(q, kind='stable') for q in msgs]
+    sorted_msgs = [q[o].tolist() for q, o in zip(msgs, orders)]
+    start = (0,) * len(msgs)
+    heap = [(sum(q[0] for q in sorted_msgs), start)]
+    seen = {start}
+    while heap:
+        cost, ranks = heapq.heappop(heap)
+        if tuple(int(o[r]) for o, r in zip(orders, ranks)) not in excluded:
+            return cost
+        for i, r in enumerate(ranks):
+            if r + 1 < len(sorted_msgs[i]):
+                nxt = ranks[:i] + (r + 1,) + ranks[i + 1:]
+                if nxt not in seen:
+                    seen.add(nxt)
+                    heapq.heappush(heap, (sum(q[k] for q, k in zip(sorted_msgs, nxt)), nxt))
+    return np.inf
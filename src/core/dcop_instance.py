@@ -1,24 +1,41 @@
+import contextlib
 import json
 import os
 import pathlib
+import weakref
 import networkx as nx
 import numpy as np
-from itertools import product, permutations, combinations
+from itertools import permutations, combinations
 from functools import reduce
 import operator
-from tqdm import tqdm
 
 from core.variable import Variable
 from core.constraint import Constraint
+from core.cost_table import SparseCostTable
 from core.agent import Agent
+from core.compiled_instance import CompiledInstance
+
+# Number of (assignment, constraint) cost entries evaluated at once by cost_many
+COST_CHUNK_ENTRIES = 1 << 22
 
 class DCOPInstance:
-    def __init__(self, seed=1234, filepath=None):
+    def __init__(self, seed=1234, filepath=None, sparse=False):
+        """
+        :param sparse: If True, the default cost of each constraint is its most frequent cost (see
+        Constraint.sparsify), as soon as it is read or generated; otherwise it is 0. The constraints store only
+        their tuples of non-default cost.
+        """
         self.data = None
+        self.sparse = sparse
         self.prng = np.random.RandomState(seed)
         self.agents = {}
         self.variables = {}
         self.constraints = {}
+        self._compiled = None
+        # Objects notified of the changes of the instance (see addListener)
+        self._listeners = weakref.WeakSet()
+        self._pending_changes = []
+        self._batch_depth = 0
         if filepath is not None:
             filename, extension = os.path.splitext(filepath)
             if extension == '.json':
@@ -33,6 +50,212 @@ class DCOPInstance:
     def cost(self):
         return np.sum(self.constraints[con].evaluate() for con in self.constraints)
 
+    @property
+    def compiled(self):
+        """The CompiledInstance of the instance (built on first use)"""
+        if self._compiled is None:
+            self._compiled = CompiledInstance(self)
+        return self._compiled
+
+    def cost_many(self, X, per_constraint=False, chunk_size=None):
+        """
+        Batched evaluation of the assignments in :param X, a (N, n_vars) array of value indexes whose columns
+        follow the order of self.variables.
+        The constraints are evaluated by fancy indexing into the cost tensors of the compiled instance, or, for a
+        sparse instance, into the sparse tables of the constraints (see Constraint.evaluate_many). The rows are
+        evaluated in chunks of :param chunk_size rows (by default, so that a chunk holds COST_CHUNK_ENTRIES
+        constraint costs) to bound the memory used.
+        :return: The (N,) array of the total costs or, if :param per_constraint, the pair (total costs, (N, m)
+        array of the cost of each constraint, in the order of self.constraints).
+        """
+        X = np.atleast_2d(np.asarray(X, dtype=np.int64))
+        assert X.shape[1] == len(self.variables), 'Expected one column per variable'
+        n_cons = len(self.constraints)
+        if chunk_size is None:
+            chunk_size = max(1, COST_CHUNK_ENTRIES // max(1, n_cons))
+        if self.sparse:
+            var_index = {vname: i for i, vname in enumerate(self.variables)}
+            scopes = [[var_index[v.name] for v in con.scope] for con in self.constraints.values()]
+
+        costs = np.zeros(X.shape[0])
+        con_costs = np.empty((X.shape[0], n_cons)) if per_constraint else None
+        for start in range(0, X.shape[0], chunk_size):
+            chunk = X[start:start + chunk_size]
+            if self.sparse:
+                C = np.empty((len(chunk), n_cons))
+                for k, con in enumerate(self.constraints.values()):
+                    C[:, k] = con.evaluate_many(chunk[:, scopes[k]])
+            else:
+                C = self.compiled.constraintCosts(chunk)
+            costs[start:start + len(chunk)] = C.sum(axis=1)
+            if per_constraint:
+                con_costs[start:start + len(chunk)] = C
+        return (costs, con_costs) if per_constraint else costs
+
+    def sparsify(self):
+        """Drops the tuples of default cost of all the constraints (see Constraint.sparsify)"""
+        for con in self.constraints.values():
+            con.sparsify()
+
+    def addListener(self, listener):
+        """
+        Registers :param listener (held by weak reference): its method onInstanceChange(changes) is called after
+        every change made with the methods below, or once after a batch of changes (see batch()). changes is the
+        list of the (kind, name) pairs of the changes, where kind is one of 'add_variable', 'remove_variable',
+        'add_agent', 'remove_agent', 'add_constraint', 'remove_constraint' and 'set_values'.
+        The compiled instance (if built) is updated before the listeners are called.
+        """
+        self._listeners.add(listener)
+
+    def removeListener(self, listener):
+        self._listeners.discard(listener)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Groups the changes made in the block: the compiled instance and the listeners are updated once, when
+        the block exits.
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self._flushChanges()
+
+    def _changed(self, kind, name):
+        self._pending_changes.append((kind, name))
+        if self._batch_depth == 0:
+            self._flushChanges()
+
+    def _flushChanges(self):
+        changes, self._pending_changes = self._pending_changes, []
+        if not changes:
+            return
+        if self._compiled is not None:
+            self._compiled.update(changes)
+        for listener in list(self._listeners):
+            listener.onInstanceChange(changes)
+
+    def add_agent(self, name):
+        """Adds the agent :param name, without variables"""
+        assert name not in self.agents, 'Agent ' + str(name) + ' exists'
+        self.agents[name] = Agent(name, variables=[], constraints=[])
+        self._changed('add_agent', name)
+        return self.agents[name]
+
+    def remove_agent(self, name):
+        """Removes the agent :param name, its variables and the constraints involving them"""
+        agt = self.agents[name]
+        with self.batch():
+            for var in list(agt.variables):
+                self.remove_variable(var.name)
+            del self.agents[name]
+            self._changed('remove_agent', name)
+
+    def add_variable(self, name, domain, agent):
+        """
+        Adds the variable :param name, of domain :param domain and controlled by the agent :param agent (added if
+        it does not exist), initially assigned to the first value of its domain.
+        """
+        assert name not in self.variables, 'Variable ' + str(name) + ' exists'
+        var = Variable(name=name, domain=list(domain), type='decision')
+        var.setAssignment(var.domain[0])
+        with self.batch():
+            if agent not in self.agents:
+                self.add_agent(agent)
+            agt = self.agents[agent]
+            agt.addVariable(var)
+            var.setOwner(agt)
+            self.variables[name] = var
+            for a in [agt] + agt.neighbors:
+                a.state.refresh()
+            self._changed('add_variable', name)
+        return var
+
+    def remove_variable(self, name):
+        """Removes the variable :param name and the constraints involving it"""
+        var = self.variables[name]
+        with self.batch():
+            for con in list(var.constraints):
+                self.remove_constraint(con.name)
+            agt = var.controlled_by
+            agt.removeVariable(var)
+            del self.variables[name]
+            for a in [agt] + agt.neighbors:
+                a.state.refresh()
+            self._changed('remove_variable', name)
+
+    def add_constraint(self, name, scope, values, default_value=0):
+        """
+        Adds the constraint :param name over the variables named in :param scope, with the costs :param values
+        (a dictionary mapping tuples of values, in scope order, to costs) and :param default_value for the tuples
+        not in it. :param values can also be the array of the costs of all the tuples, in the order of the product
+        of the domains. The agents of the scope become neighbors.
+        """
+        assert name not in self.constraints, 'Constraint ' + str(name) + ' exists'
+        scope = [self.variables[vname] for vname in scope]
+        con = Constraint(name, scope=scope, table=self._makeTable(scope, values, default_value))
+        self.constraints[name] = con
+        for var in con.scope:
+            var.addConstraint(con)
+        agents = list(dict.fromkeys(var.controlled_by for var in con.scope))
+        for agt in agents:
+            agt.constraints.append(con)
+        self._connectAgents([con])
+        for agt in agents:
+            agt.state.refresh()
+        self._changed('add_constraint', name)
+        return con
+
+    def remove_constraint(self, name):
+        """Removes the constraint :param name; agents no longer sharing a constraint stop being neighbors"""
+        con = self.constraints.pop(name)
+        for var in con.scope:
+            var.removeConstraint(con)
+        agents = list(dict.fromkeys(var.controlled_by for var in con.scope))
+        for agt in agents:
+            agt.constraints.remove(con)
+            if con in agt.controlled_constraints:
+                agt.controlled_constraints.remove(con)
+        for agt in agents:
+            # Two agents are neighbors if they control two distinct variables of the scope of a constraint
+            linked = set()
+            for c in agt.constraints:
+                clique = [var.controlled_by for var in c.scope]
+                clique.remove(agt)
+                linked.update(a.name for a in clique)
+            agt.setNeighbors(a for a in agt.neighbors if a.name in linked)
+            agt.state.refresh()
+        self._changed('remove_constraint', name)
+
+    def set_constraint_values(self, name, values, default_value=None):
+        """
+        Replaces the costs of the constraint :param name by :param values (see add_constraint), the default cost
+        by :param default_value if given.
+        """
+        con = self.constraints[name]
+        con.setTable(self._makeTable(con.scope, values, con.default_value if default_value is None
+                                      else default_value))
+        for agt in dict.fromkeys(var.controlled_by for var in con.scope):
+            agt.state.local_solver = None
+        self._changed('set_values', name)
+
+    def _makeTable(self, scope, values, default_value=0):
+        """
+        :return: The SparseCostTable over the variables :param scope of :param values, either a dictionary
+        mapping tuples of values to costs (the other tuples having cost :param default_value) or the array of the
+        costs of all the tuples. The default cost of a sparse instance is the most frequent cost.
+        """
+        domains = [var.domain for var in scope]
+        if isinstance(values, dict):
+            table = SparseCostTable.fromValues(domains, values, default_value)
+            return table.withDefault() if self.sparse else table
+        costs = np.asarray(values, dtype=float)
+        assert costs.size == int(np.prod([len(d) for d in domains], dtype=np.int64)), 'Expected one cost per tuple'
+        return SparseCostTable.fromCosts([len(d) for d in domains], costs, None if self.sparse else default_value)
+
     def _read_json(self, filepath):
         print('Importing file', filepath)
         with open(filepath) as f:
@@ -51,14 +274,8 @@ class DCOPInstance:
             name = con
             scope = data['constraints'][con]['scope']
             costs = data['constraints'][con]['vals']
-            domains = [self.variables[vname].domain for vname in scope]
-            all_tuples = list(product(*domains))
-            assert(len(all_tuples) == len(costs))
-            con_values = {all_tuples[i]: costs[i] for i in range(len(all_tuples))}
-
-            self.constraints[name] = Constraint(name,
-                                                scope=[self.variables[vid] for vid in scope],
-                                                values=con_values)
+            con_scope = [self.variables[vid] for vid in scope]
+            self.constraints[name] = Constraint(name, scope=con_scope, table=self._makeTable(con_scope, costs))
             # add constriant to variables
             for vid in scope:
                 self.variables[vid].addConstraint(self.constraints[name])
@@ -66,11 +283,7 @@ class DCOPInstance:
         for agt in data['agents']:
             name = agt
             var_names = data['agents'][agt]['vars']
-            agt_constraints = []#list(set([c for c in self.variables[vid].constraints for vid in var_names]))
-            for vid in var_names:
-                for c in self.variables[vid].constraints:
-                    if c not in agt_constraints:
-                        agt_constraints.append(c)
+            agt_constraints = list(dict.fromkeys(c for vid in var_names for c in self.variables[vid].constraints))
 
             self.agents[name] = Agent(name,
                                       variables=[self.variables[vid] for vid in var_names],
@@ -79,10 +292,7 @@ class DCOPInstance:
                 self.variables[vid].setOwner(self.agents[name])
 
         # Connect neighbors:
-        for con in self.constraints:
-            clique = [var.controlled_by for var in self.constraints[con].scope]
-            for ai, aj in permutations(clique, 2):
-                ai.addNeighbor(aj, self.constraints[con])
+        self._connectAgents(self.constraints.values())
 
     def generate_from_graph(self, G: nx.Graph, dsize, max_clique_size=np.inf,
                             cost_range=(0, 10), p2=1.0, def_cost=np.infty):
@@ -123,10 +333,22 @@ class DCOPInstance:
             self._create_agents(n)
 
         # Connect neighbors:
-        for con in self.constraints:
-            agt_clique = [var.controlled_by for var in self.constraints[con].scope]
-            for ai, aj in permutations(agt_clique, 2):
-                ai.addNeighbor(aj, self.constraints[con])
+        self._connectAgents(self.constraints.values())
+
+    def _connectAgents(self, constraints):
+        """
+        Makes the agents of the variables in the scope of each of :param constraints neighbors of each other,
+        then sets, in one pass over their constraints, the constraints each of these agents controls (those
+        whose variable of smallest name is one of its variables, see Agent.controls).
+        """
+        agents = {}
+        for con in constraints:
+            clique = [var.controlled_by for var in con.scope]
+            for ai, aj in permutations(clique, 2):
+                ai.addNeighbor(aj)
+            agents.update(dict.fromkeys(clique))
+        for agt in agents:
+            agt.updateControlledConstraints()
 
     def _create_variables(self, n, dsize):
         """
@@ -151,18 +373,18 @@ class DCOPInstance:
         """
         scope = ['v_' + str(ci) for ci in clique]
         domains = [self.variables[vname].domain for vname in scope]
-        all_tuples = product(*domains)
         n = reduce(operator.mul, map(len, domains), 1)
         costs = (self.prng.beta(a=2, b=5, size=n) * cost_range[1]).astype(int)
         #costs = self.prng.randint(low=cost_range[0], high=cost_range[1], size=n).astype(int)
 
         violations = int((1-p2) * n)
+        if violations > 0 and not float(def_cost).is_integer():
+            # e.g., infinite costs for the violated tuples
+            costs = costs.astype(float)
         for i in self.prng.randint(low=0, high=n, size=violations):
             costs[i] = def_cost
-        con_values = {T: costs[i] for i, T in enumerate(all_tuples)}
-        self.constraints[name] = Constraint(name,
-                                            scope=[self.variables[vname] for vname in scope],
-                                            values=con_values)
+        con_scope = [self.variables[vname] for vname in scope]
+        self.constraints[name] = Constraint(name, scope=con_scope, table=self._makeTable(con_scope, costs))
         # add constriant to variables
         for vid in scope:
             self.variables[vid].addConstraint(self.constraints[name])
@@ -200,7 +422,9 @@ class DCOPInstance:
 
         for c in self.constraints:
             con = self.constraints[c]
-            jout['constraints'][c] = {'vals': [int(v) for v in con.values.values()],
+            # All the tuples, in the order of the product of the domains
+            vals = con.table.toDense().ravel().tolist()
+            jout['constraints'][c] = {'vals': [int(v) if np.isfinite(v) else float(v) for v in vals],
                                       'scope': [v.name for v in con.scope]}
 
         print('Writing dcop instance on file', fileout)
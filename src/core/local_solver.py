@@ -0,0 +1,93 @@
+'''Exact optimization of the variables of an agent, the variables of its neighbors being fixed'''
+import numpy as np
+
+
+class LocalSolver:
+    """
+    Depth-first branch and bound over the variables of an agent, in the order of agt.variables and of their
+    domains. Only strictly better assignments replace the incumbent, hence the solver returns the first optimal
+    assignment of the product of the domains (the one found by enumerating it) without enumerating it.
+    Each local constraint is conditioned on the values of the neighbor variables in its scope and charged to the
+    last agent variable of its scope: a partial assignment costs the constraints whose agent variables are all
+    assigned, and the unassigned variables are bounded by the minimum costs of the constraints charged to them.
+    """
+    def __init__(self, agt):
+        self.vars = list(agt.variables)
+        self.n = len(self.vars)
+        agt_pos = {var.name: i for i, var in enumerate(self.vars)}
+        self.val_index = {}
+        self.constraints = list(dict.fromkeys(con for var in self.vars for con in var.constraints))
+        for con in self.constraints:
+            for var in con.scope:
+                if var.name not in self.val_index:
+                    self.val_index[var.name] = {val: i for i, val in enumerate(var.domain)}
+
+        # For each constraint: the scope positions of the neighbor variables, the permutation sorting its agent
+        # variables by their position in self.vars, and the agent variable it is charged to
+        self.fixed_pos, self.perm, self.depth = [], [], []
+        for con in self.constraints:
+            agt_scope = [(agt_pos[var.name], j) for j, var in enumerate(con.scope) if var.name in agt_pos]
+            self.fixed_pos.append([j for j, var in enumerate(con.scope) if var.name not in agt_pos])
+            self.perm.append([k for _, k in sorted((p, k) for k, (p, _) in enumerate(agt_scope))])
+            self.depth.append(max(agt_scope)[0])
+        # Agent variables assigned before each constraint is charged (its other axes)
+        self.prev = [sorted(agt_pos[var.name] for var in con.scope if var.name in agt_pos)[:-1]
+                     for con in self.constraints]
+        self._cache = [(None, None)] * len(self.constraints)
+
+    def _conditioned(self, k, view):
+        """
+        :return: The table of the k-th constraint over its agent variables (sorted by position in self.vars),
+        with its neighbor variables set to their values in :param view.
+        """
+        con = self.constraints[k]
+        key = tuple(self.val_index[con.scope[j].name][view[con.scope[j].name]] for j in self.fixed_pos[k])
+        if self._cache[k][0] != key:
+            table = con.table.condition(dict(zip(self.fixed_pos[k], key)))
+            self._cache[k] = (key, np.transpose(table, self.perm[k]))
+        return self._cache[k][1]
+
+    def solve(self, view):
+        """
+        :param view: Dictionary mapping (at least) the neighbor variables to their values.
+        :return: The pair (cost, values): an optimal assignment of the agent variables (the list of their values,
+        in the order of agt.variables) and its cost. If every assignment has infinite cost, the first one.
+        """
+        unary = [np.zeros(len(var.domain)) for var in self.vars]
+        charged = [[] for _ in range(self.n)]
+        lb = np.zeros(self.n + 1)
+        for k in range(len(self.constraints)):
+            table = self._conditioned(k, view)
+            h = self.depth[k]
+            if table.ndim == 1:
+                unary[h] = unary[h] + table
+            else:
+                charged[h].append((table, self.prev[k]))
+                lb[h] += table.min()
+        for h in range(self.n):
+            lb[h] += unary[h].min()
+        # lb[h]: lower bound of the cost charged to the variables h, h+1, ...
+        lb = np.cumsum(lb[::-1])[::-1]
+
+        x = np.zeros(self.n, dtype=np.int64)
+        best = [np.inf, None]
+
+        def branch(h, g):
+            incr = unary[h]
+            for table, prev in charged[h]:
+                incr = incr + table[tuple(x[prev])]
+            for d in range(len(incr)):
+                cost = g + incr[d]
+                if cost + lb[h + 1] >= best[0]:
+                    continue
+                x[h] = d
+                if h + 1 == self.n:
+                    best[0], best[1] = cost, x.copy()
+                else:
+                    branch(h + 1, cost)
+
+        if self.n > 0:
+            branch(0, 0.0)
+        if best[1] is None:
+            best[1] = np.zeros(self.n, dtype=np.int64)
+        return best[0], [var.domain[d] for var, d in zip(self.vars, best[1])]
@@ -0,0 +1,188 @@
+'''Structures derived from a DCOP instance, shared by all the algorithms run on it'''
+import weakref
+
+from utils.ccg_utils import transform_dcop_instance_to_ccg, partition_ccg_nodes, make_gadgets, CCGIndex, \
+    CCGDecoder
+from utils.mwvc import solve_small_components
+from utils import kernelizer
+
+
+class ProblemContext:
+    """
+    Holds the (lazily built) structures derived from a DCOP instance: the compiled instance, the CCG, the
+    mapping from variables to CCG nodes, the CCG node owners, the agents gadgets and the vertex cover decoder.
+    The algorithms of a pipeline (e.g., dsa&ccg-maxsum) and the runs over different seeds borrow the same
+    context, so each structure is derived at most once.
+    """
+    def __init__(self, dcop_instance, ccg=None, exact_component_size=0, kernelize=False):
+        """
+        :param kernelize: If True, the CCG is kernelized (see utils.kernelizer.kernelize): the nodes fixed by
+        the reduction rules are removed from the CCG the algorithms iterate on and stored in ccg_fixed.
+        :param exact_component_size: The CCG connected components with at most this number of nodes are solved
+        exactly (see utils.mwvc.solve_small_components): they are removed from the CCG the algorithms iterate
+        on and their nodes are fixed in ccg_fixed.
+        """
+        self.instance = dcop_instance
+        self.exact_component_size = exact_component_size
+        self.kernelize = kernelize
+        self._compiled = None
+        self._full_ccg = ccg
+        self._ccg = None
+        self._ccg_fixed = None
+        self._ccg_index = None
+        self._ccg_cover_mask = None
+        self._decoder = None
+        self._var_ccg_nodes = None
+        self._ccg_owner = None
+        self._gadgets = None
+        # Algorithms notified of the changes of the instance, after the context is updated
+        self._listeners = weakref.WeakSet()
+        dcop_instance.addListener(self)
+
+    def addListener(self, listener):
+        """Registers :param listener (held by weak reference), see onInstanceChange"""
+        self._listeners.add(listener)
+
+    def onInstanceChange(self, changes):
+        """
+        Called by the instance after :param changes (see DCOPInstance.addListener), once the compiled instance
+        has updated itself. The CCG is built by an external program from the whole instance, hence the CCG and
+        the structures derived from it are dropped and rebuilt on first use; if only agents without variables
+        changed, only the partition of the CCG nodes among the agents is. The registered algorithms are then
+        notified (see Algorithm.onInstanceChange).
+
+        The CCG is not updated per constraint: the CCGs the external program builds for single-constraint
+        instances cannot be merged on their variable nodes into the CCG of the instance. Each of them has its
+        zero-weight nodes removed (with their edges), although a variable node may have weight zero in one
+        constraint and not in another, and lacks the cliques of the variables partly absent from it.
+        """
+        if any(kind not in ('add_agent', 'remove_agent') for kind, _ in changes):
+            self._full_ccg = None
+            self._ccg = None
+            self._ccg_fixed = None
+            self._ccg_index = None
+            self._ccg_cover_mask = None
+            self._decoder = None
+            self._var_ccg_nodes = None
+        self._ccg_owner = None
+        self._gadgets = None
+        for listener in list(self._listeners):
+            listener.onInstanceChange(changes)
+
+    def prepare(self, ccg=True):
+        """
+        Builds the structures now rather than on first use, e.g., before forking worker processes, which then
+        share them. :param ccg: Whether to build the CCG-derived structures as well.
+        """
+        self.compiled
+        if ccg:
+            self.gadgets
+            self.decoder
+            self.ccg_cover_mask
+
+    @property
+    def compiled(self):
+        if self._compiled is None:
+            self._compiled = self.instance.compiled
+        return self._compiled
+
+    @property
+    def full_ccg(self):
+        """The CCG of the instance"""
+        if self._full_ccg is None:
+            self._full_ccg = transform_dcop_instance_to_ccg(self.instance)
+        return self._full_ccg
+
+    @property
+    def ccg(self):
+        """The CCG the algorithms iterate on: the full CCG without the nodes fixed in ccg_fixed"""
+        if self._ccg is None:
+            self._reduceCCG()
+        return self._ccg
+
+    @property
+    def ccg_fixed(self):
+        """Dictionary mapping the CCG nodes removed from ccg to their value (1 if in the vertex cover)"""
+        if self._ccg_fixed is None:
+            self._reduceCCG()
+        return self._ccg_fixed
+
+    @property
+    def ccg_index(self):
+        """The integer indexing of the nodes of the full CCG (see utils.ccg_utils.CCGIndex)"""
+        if self._ccg_index is None:
+            self._ccg_index = CCGIndex(self.full_ccg, self.instance)
+        return self._ccg_index
+
+    @property
+    def ccg_cover_mask(self):
+        """The boolean mask (over ccg_index) of the fixed CCG nodes in the vertex cover"""
+        if self._ccg_cover_mask is None:
+            self._ccg_cover_mask = self.ccg_index.mask(u for u, x in self.ccg_fixed.items() if x == 1)
+        return self._ccg_cover_mask
+
+    @property
+    def decoder(self):
+        """Decoder of the vertex covers (masks over ccg_index) into the values of all the variables"""
+        if self._decoder is None:
+            self._decoder = CCGDecoder(self.instance.variables.values(), self.var_ccg_nodes, self.ccg_index)
+        return self._decoder
+
+    def _reduceCCG(self):
+        G, fixed = self.full_ccg, {}
+        if self.kernelize:
+            G, values = kernelizer.kernelize(G)
+            fixed.update(values)
+        if self.exact_component_size > 0:
+            G, values = solve_small_components(G, self.exact_component_size)
+            fixed.update(values)
+        self._ccg, self._ccg_fixed = G, fixed
+        if fixed:
+            print('CCG nodes fixed:', len(fixed), '/', self.full_ccg.number_of_nodes(),
+                  ' variables resolved:', len(self.resolvedVariables()), '/', len(self.instance.variables))
+
+    def resolvedVariables(self):
+        """
+        :return: A dictionary mapping the variables whose CCG nodes are all fixed to their value, when the
+        fixed nodes determine it (at most one of the nodes is out of the vertex cover)
+        """
+        resolved = {}
+        for vname, nodes in self.var_ccg_nodes.items():
+            if not all(u in self.ccg_fixed for u, _ in nodes):
+                continue
+            ranks = [r for u, r in nodes if self.ccg_fixed[u] == 0]
+            if len(nodes) == 1:
+                resolved[vname] = self.ccg_fixed[nodes[0][0]]
+            elif len(ranks) <= 1:
+                resolved[vname] = ranks[0] if ranks else 0
+        return resolved
+
+    @property
+    def var_ccg_nodes(self):
+        """For each variable, the list of (CCG node, rank) pairs associated to it"""
+        if self._var_ccg_nodes is None:
+            self._var_ccg_nodes = {vname: [] for vname in self.instance.variables}
+            for u, data in self.full_ccg.nodes(data=True):
+                if 'variable' in data:
+                    self._var_ccg_nodes[data['variable']].append((u, data['rank']))
+        return self._var_ccg_nodes
+
+    @property
+    def ccg_owner(self):
+        if self._ccg_owner is None:
+            self._ccg_owner = partition_ccg_nodes(self.ccg, self.instance)
+        return self._ccg_owner
+
+    @property
+    def gadgets(self):
+        if self._gadgets is None:
+            self._gadgets = make_gadgets(self.ccg, self.instance, self.ccg_owner)
+        return self._gadgets
+
+    def getAssignment(self):
+        """:return: The array of value indexes of the current instance assignment"""
+        return self.compiled.getAssignment()
+
+    def setAssignment(self, x):
+        """Sets the instance variables to the value indexes in :param x"""
+        self.compiled.setAssignment(x)
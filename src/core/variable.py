@@ -7,17 +7,32 @@ class Variable:
         self.type = type
         self.domain = domain.copy()
         self.constraints = []
+        # Names of self.constraints, for constant time membership tests
+        self._constraint_names = set()
         self.controlled_by = None
-        self.prng = np.random.RandomState(seed)
+        self._seed = seed
+        self._prng = None
+
+    @property
+    def prng(self):
+        """The random generator of the variable (created on first use)"""
+        if self._prng is None:
+            self._prng = np.random.RandomState(self._seed)
+        return self._prng
 
     def init(self, domain, type='decision'):
         self.domain = domain
         self.type = type
 
     def addConstraint(self, constraint):
-        if constraint.name not in [c.name for c in self.constraints]:
+        if constraint.name not in self._constraint_names:
+            self._constraint_names.add(constraint.name)
             self.constraints.append(constraint)
 
+    def removeConstraint(self, constraint):
+        self.constraints = [c for c in self.constraints if c.name != constraint.name]
+        self._constraint_names.discard(constraint.name)
+
     def setOwner(self, agent):
         self.controlled_by = agent
 
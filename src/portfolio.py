@@ -0,0 +1,152 @@
+'''
+Algorithm portfolio: several algorithm configurations run concurrently, each in a worker process, on the same
+DCOP instance. The instance and its context (compiled instance, CCG) are built once and inherited by the
+forked workers, which share their memory pages copy-on-write. The workers share the best cost and assignment
+found so far and are all stopped at a time limit or once a target cost is reached.
+'''
+import multiprocessing
+import queue
+import time
+import traceback
+import numpy as np
+
+import api
+from algorithms import registry
+from core.problem_context import ProblemContext
+from utils.stats_collector import StatsCollector
+
+
+class SharedIncumbent:
+    """The best cost and assignment found by the workers of a portfolio, in shared memory"""
+    def __init__(self, n_vars, ctx):
+        self.lock = ctx.Lock()
+        self.cost = ctx.RawValue('d', np.inf)
+        # The index of the configuration which found the incumbent
+        self.owner = ctx.RawValue('i', -1)
+        self.assignment = ctx.RawArray('q', n_vars)
+        self.stop = ctx.Event()
+
+    def offer(self, cost, x, k):
+        """Replaces the incumbent with the assignment :param x of cost :param cost if it is better"""
+        if cost < self.cost.value:
+            with self.lock:
+                if cost < self.cost.value:
+                    np.frombuffer(self.assignment, dtype=np.int64)[:] = x
+                    self.cost.value = cost
+                    self.owner.value = k
+
+    def get(self):
+        """:return: The cost and a copy of the assignment of the incumbent"""
+        with self.lock:
+            return self.cost.value, np.frombuffer(self.assignment, dtype=np.int64).copy()
+
+
+class PortfolioMonitor:
+    """
+    Attached to the algorithms run by a worker (see Algorithm.attachMonitor): at the end of each iteration it
+    publishes the best assignment of the worker if it improves on the incumbent, and stops the run once the
+    portfolio is stopped, the deadline is past or the target cost is reached.
+    If :param restart_every > 0, every restart_every iterations the worker is warm started from the incumbent
+    when it is better than anything the worker found (see Algorithm.warmStart). Only the algorithms searching
+    from the current assignment (dsa, dsa-vec, mgm, mgm2) continue from the incumbent: the message-passing
+    algorithms (maxsum, maxsum-residual, maxsum-vec, ccg-maxsum, ccg-maxsum-c) and ccg-dsa decode their
+    assignment from their messages (or CCG node values) at the end of each iteration, hence ignore restarts.
+    """
+    def __init__(self, incumbent, k, deadline=None, target_cost=None, restart_every=0):
+        self.incumbent = incumbent
+        self.k = k
+        self.deadline = deadline
+        self.target_cost = target_cost
+        self.restart_every = restart_every
+
+    def step(self, alg):
+        cost = StatsCollector.best_assignment_cost
+        if cost < self.incumbent.cost.value:
+            self.incumbent.offer(cost, StatsCollector.best_assignment, self.k)
+        elif self.restart_every > 0 and alg.curr_iteration % self.restart_every == 0 \
+                and self.incumbent.cost.value < cost:
+            _, x = self.incumbent.get()
+            alg.warmStart(x)
+
+        if self.target_cost is not None and self.incumbent.cost.value <= self.target_cost \
+                or self.deadline is not None and time.time() >= self.deadline:
+            self.incumbent.stop.set()
+        return self.incumbent.stop.is_set()
+
+
+def _worker(k, dcop_instance, context, algorithm, params, seed, incumbent, monitor, results):
+    try:
+        res = api.run(dcop_instance, algorithm, params, seed=seed, context=context, monitor=monitor)
+        if res.get('best_assignment') is not None:
+            incumbent.offer(res['best_cost'], res['best_assignment'], k)
+        results.put((k, res, None))
+    except Exception:
+        results.put((k, None, traceback.format_exc()))
+
+
+def _needsCCG(algorithm):
+    stages = [s for s, _ in registry.PIPELINES[algorithm]] if algorithm in registry.PIPELINES else [algorithm]
+    return any(s.startswith('ccg') or s == 'lp' for s in stages)
+
+
+def run_portfolio(dcop_instance, configs, params=None, seed=1234, context=None, time_limit=None, target_cost=None,
+                  restart_every=0):
+    """
+    Runs the algorithm configurations :param configs concurrently on :param dcop_instance, one worker process
+    each (forked, hence POSIX only).
+    :param configs: A list of algorithm names or (algorithm, params) pairs, as taken by api.run. Configuration
+    k is run with seed :param seed + k.
+    :param params: The parameters common to all the configurations (e.g., {'max_iter': 500}), overridden by
+    the parameters of each configuration.
+    :param time_limit: All the workers are stopped after this number of seconds.
+    :param target_cost: All the workers are stopped once an assignment of cost at most target_cost is found.
+    :param restart_every: See PortfolioMonitor.
+    :return: A dictionary with 'best_cost', 'best_assignment' and 'best_config' (the index of the configuration
+    which found it), 'results', the list of the results of api.run for each configuration (None if it
+    failed), and 'errors', the list of the tracebacks of the failed configurations (None if it did not).
+    """
+    configs = [(c, {}) if isinstance(c, str) else c for c in configs]
+    configs = [(algorithm, dict(params or {}, **config_params)) for algorithm, config_params in configs]
+    if context is None:
+        context = ProblemContext(dcop_instance)
+    context.prepare(ccg=any(_needsCCG(algorithm) for algorithm, _ in configs))
+
+    ctx = multiprocessing.get_context('fork')
+    incumbent = SharedIncumbent(len(dcop_instance.variables), ctx)
+    deadline = None if time_limit is None else time.time() + time_limit
+    results = ctx.Queue()
+    workers = []
+    for k, (algorithm, params) in enumerate(configs):
+        if deadline is not None:
+            params['time_limit'] = deadline - time.time()
+        monitor = PortfolioMonitor(incumbent, k, deadline, target_cost, restart_every)
+        p = ctx.Process(target=_worker, args=(k, dcop_instance, context, algorithm, params, seed + k, incumbent,
+                                              monitor, results), daemon=True)
+        p.start()
+        workers.append(p)
+
+    out = [None] * len(configs)
+    errors = [None] * len(configs)
+    pending = set(range(len(configs)))
+    exited = set()
+    while pending:
+        try:
+            k, res, err = results.get(timeout=1)
+            out[k], errors[k] = res, err
+            pending.discard(k)
+        except queue.Empty:
+            # A worker which exited before the last timeout without reporting (e.g., killed when out of memory)
+            # has failed
+            for k in exited & pending:
+                errors[k] = 'Worker exited with code ' + str(workers[k].exitcode)
+                pending.discard(k)
+            exited = set(k for k in pending if not workers[k].is_alive())
+    for p in workers:
+        p.join()
+
+    best_cost, best_assignment = incumbent.get()
+    return {'best_cost': best_cost,
+            'best_assignment': best_assignment if incumbent.owner.value >= 0 else None,
+            'best_config': incumbent.owner.value,
+            'results': out,
+            'errors': errors}
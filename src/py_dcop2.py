@@ -1,62 +1,106 @@
 from core.dcop_instance import DCOPInstance
-from algorithms.dsa import Dsa
-from algorithms.max_sum import MaxSum
-from algorithms.ccg_maxsum import CCGMaxSum
-from algorithms.ccg_centralized import CCGCentralized
-from algorithms.ccg_dsa import CCGDsa
-from algorithms.rand import Rand
-from algorithms.lp_solver import LPSolver
-from utils.ccg_utils import dcop_instance_to_dimacs, CCG_EXECUTABLE_PATH
-from tempfile import NamedTemporaryFile
-
-from utils.stats_collector import StatsCollector
+from core.problem_context import ProblemContext
 from core.dcop_generator import DCOPGenerator
+from algorithms import registry
+from utils.stats_collector import StatsCollector
 from math import sqrt
 import argparse
 import pathlib
-from tqdm import tqdm
-import pandas as pd
 import os
-from io import StringIO
-from tempfile import NamedTemporaryFile
-import subprocess
-import sys
-import re
+import api
 
 
 DATA_PATH = '/Users/ferdinandofioretto/Repos/dcop-ccg/data/'
 NEXPERIMEMTS = 1
 
-parser = argparse.ArgumentParser( prog='py-dcop', formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-parser.add_argument('--algorithm', dest='algorithm', type=str,
-                    default=None,
-                    help='one of [dsa|maxsum|ccg-maxsum|ccg-maxsum-c|ccg-dsa|'
-                                'dsa&ccg-maxsum|dsa&ccg-maxsum-c|dsa&ccg-dsa]')
-parser.add_argument('--iterations', dest='iterations', type=int,
-                    default=500,
-                    help='number of iterations')
-parser.add_argument('--seed', dest='seed', type=int,
-                    default=1234,
-                    help='a seed number')
-parser.add_argument('--nagents', dest='nagents', type=int,
-                    default=100,
-                    help='the number of agents')
-parser.add_argument('--domsize', dest='domsize', type=int,
-                    default=3,
-                    help='the domain size')
-parser.add_argument('--graph', dest='graph', type=str,
-                    default=None,
-                    help='one of [rand-sparse | rand-dense | sf | grid]')
-parser.add_argument('--filein', dest='filein', type=str,
-                    default=None,
-                    help='path and file for outputs')
-parser.add_argument('--fileout', dest='fileout', type=str,
-                    help='path and file for outputs')
-args = parser.parse_args()
-
-
-
-if __name__ == '__main__':
+def parse_args():
+    parser = argparse.ArgumentParser( prog='py-dcop', formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--algorithm', dest='algorithm', type=str,
+                        default=None,
+                        help='one of [' + '|'.join(registry.names()) + ']')
+    parser.add_argument('--iterations', dest='iterations', type=int,
+                        default=500,
+                        help='number of iterations')
+    parser.add_argument('--time-limit', dest='time_limit', type=float,
+                        default=None,
+                        help='wall-clock time limit of each run in seconds (the run also stops after --iterations)')
+    parser.add_argument('--portfolio', dest='portfolio', type=str,
+                        default=None,
+                        help='comma separated algorithms run concurrently (e.g., dsa,maxsum,ccg-maxsum), sharing '
+                             'the best solution found')
+    parser.add_argument('--target-cost', dest='target_cost', type=float,
+                        default=None,
+                        help='the portfolio is stopped once a solution of at most this cost is found')
+    parser.add_argument('--restart-every', dest='restart_every', type=int,
+                        default=0,
+                        help='number of iterations between two warm restarts of the portfolio algorithms from the '
+                             'best solution found (0 to disable)')
+    parser.add_argument('--seed', dest='seed', type=int,
+                        default=1234,
+                        help='a seed number')
+    parser.add_argument('--replicas', dest='replicas', type=int,
+                        default=1,
+                        help='number of seeds run simultaneously by the vectorized algorithms (dsa-vec, maxsum-vec)')
+    parser.add_argument('--lp-backend', dest='lp_backend', type=str,
+                        default='highs',
+                        help='the LP solver used by lp: one of [highs | gurobi]')
+    parser.add_argument('--maxsum-fixed-noise', dest='maxsum_fixed_noise', action='store_true',
+                        help='maxsum draws the noise of its messages once per edge rather than every iteration, so '
+                             'that the messages settle and the function messages are reused (faster iterations, '
+                             'but less exploration: the final cost can be worse)')
+    parser.add_argument('--maxsum-msg-tol', dest='maxsum_msg_tol', type=float,
+                        default=0,
+                        help='maxsum reuses the function messages of a constraint while its incoming messages '
+                             'changed by at most this amount (0: only when unchanged)')
+    parser.add_argument('--dpop-memory', dest='dpop_memory', type=float,
+                        default=None,
+                        help='memory limit (in MB) of the UTIL tables of dpop, above which it conditions on a '
+                             'cycle-cutset (default: no limit)')
+    parser.add_argument('--exact-components', dest='exact_components', type=int,
+                        default=0,
+                        help='the CCG components with at most this number of nodes are solved exactly by the '
+                             'CCG-based algorithms (0 to disable)')
+    parser.add_argument('--kernelize', dest='kernelize', action='store_true',
+                        help='kernelize the CCG before running the CCG-based algorithms')
+    parser.add_argument('--nagents', dest='nagents', type=int,
+                        default=100,
+                        help='the number of agents')
+    parser.add_argument('--domsize', dest='domsize', type=int,
+                        default=3,
+                        help='the domain size')
+    parser.add_argument('--graph', dest='graph', type=str,
+                        default=None,
+                        help='one of [rand-sparse | rand-dense | sf | grid]')
+    parser.add_argument('--filein', dest='filein', type=str,
+                        default=None,
+                        help='path and file for outputs')
+    parser.add_argument('--fileout', dest='fileout', type=str,
+                        help='path and file for outputs')
+    parser.add_argument('--stream-out', dest='stream_out', type=str,
+                        default=None,
+                        help='path and file (.csv, .bin or .parquet) the statistics are streamed to while running')
+    parser.add_argument('--checkpoint', dest='checkpoint', type=str,
+                        default=None,
+                        help='path and file the state of the run is saved to, to resume it with --resume')
+    parser.add_argument('--checkpoint-every', dest='checkpoint_every', type=int,
+                        default=100,
+                        help='number of iterations between two checkpoints')
+    parser.add_argument('--resume', dest='resume', type=str,
+                        default=None,
+                        help='path and file of a checkpoint (saved by --checkpoint) the run is resumed from')
+    parser.add_argument('--sparse', dest='sparse', action='store_true',
+                        default=False,
+                        help='store the constraint tables sparsely (only the tuples whose cost differs from the '
+                             'most frequent one)')
+    parser.add_argument('--comm-profile', dest='comm_profile', type=str,
+                        default=None,
+                        help='path and file prefix for the per-agent and per-link communication profiles')
+    return parser, parser.parse_args()
+
+
+
+def main():
+    parser, args = parse_args()
 
     ## Parse arguments
     nagents = args.nagents
@@ -75,7 +119,7 @@ if __name__ == '__main__':
         assert graph in ['rand-sparse', 'rand-dense', 'sf', 'grid'], parser.print_help()
 
         g_gen = DCOPGenerator(seed=seed)
-        dcop = DCOPInstance(seed=seed)
+        dcop = DCOPInstance(seed=seed, sparse=args.sparse)
 
         p1, p2 = 0.5, 1.0
         if graph == 'rand-sparse':
@@ -91,12 +135,12 @@ if __name__ == '__main__':
         print('graph - nodes: ', graph.number_of_nodes(), ' edges:', graph.number_of_edges())
         dcop.generate_from_graph(G=graph, dsize=domsize, max_clique_size=2, cost_range=(0, 100), p2=p2)
 
-        if algname is None:
+        if algname is None and args.portfolio is None:
             dcop.to_file(fileout)
             exit()
     else:
         #dcop = DCOPInstance(seed=seed, filepath=DATA_PATH+'in/'+filein)
-        dcop = DCOPInstance(seed=seed, filepath=filein)
+        dcop = DCOPInstance(seed=seed, filepath=filein, sparse=args.sparse)
 
     if fileout is not None:
         dirout =os.path.split(fileout)[0]
@@ -105,99 +149,84 @@ if __name__ == '__main__':
     ##########################
     ## Run algorithms
     ##########################
-    if algname is not None:
-        assert algname in ['dsa','maxsum','ccg-maxsum','ccg-maxsum-c','ccg-dsa', 'dsa&ccg-maxsum','dsa&ccg-maxsum-c','dsa&ccg-dsa', 'dsa&rand', 'lp', 'ccg-maxsum+', 'ccg-maxsum+k'], parser.print_help()
-
-        alg1, alg2 = None, None
-        r = max(1, iterations / 50)
-        if algname == 'dsa':
-            alg1 = Dsa('dsa', dcop, {'max_iter': iterations, 'type': 'A', 'p': 0.001}, seed=seed)
-            n_rep = 1
-        elif algname == 'maxsum':
-            alg1 = MaxSum('maxsum', dcop, {'max_iter': iterations, 'damping': 0.7}, seed=seed)
-            n_rep = 1
-        elif algname == 'ccg-maxsum':
-            alg1 = CCGMaxSum('ccg-maxsum', dcop, {'max_iter': iterations, 'damping': 0.7}, seed=seed)
-            n_rep = 1
-        elif algname == 'ccg-maxsum-c':
-            alg1 = CCGCentralized('ccg-maxsum-c', dcop, {'max_iter': iterations, 'damping': 0.7}, seed=seed)
-            n_rep = 1
-        elif algname ==  'ccg-dsa':
-            alg1 = CCGDsa('ccg-dsa', dcop, {'max_iter':iterations, 'type': 'C', 'p': 0.7}, seed=seed)
-            n_rep = 1
-        elif algname == 'dsa&ccg-maxsum':
-            alg1 = Dsa('dsa', dcop, {'max_iter': r, 'type': 'C', 'p': 0.7}, seed=seed)
-            alg2 = CCGMaxSum('ccg-maxsum', dcop, {'max_iter': r, 'damping': 0.7}, seed=seed)
-            n_rep = int(iterations / (2*r))
-        elif algname == 'dsa&ccg-maxsum-c':
-            alg1 = Dsa('dsa', dcop, {'max_iter': r, 'type': 'C', 'p': 0.7}, seed=seed)
-            alg2 = CCGCentralized('ccg-maxsum-c', dcop, {'max_iter': r, 'damping': 0.9}, seed=seed)
-            n_rep = int(iterations / (2*r))
-        elif algname == 'dsa&ccg-dsa':
-            alg1 = Dsa('dsa', dcop, {'max_iter': r, 'type': 'C', 'p': 0.7}, seed=seed)
-            alg2 = CCGDsa('ccg-dsa', dcop, {'max_iter': r, 'type': 'C', 'p': 0.7}, seed=seed)
-            n_rep = int(iterations / (2*r))
-        elif algname == 'dsa&rand':
-            alg1 = Dsa('dsa', dcop, {'max_iter': r, 'type': 'C', 'p': 0.7}, seed=seed)
-            alg2 = Rand('rand', dcop, {'max_iter': 1}, seed=seed)
-            n_rep = int(iterations / (2*r))
-        elif algname == 'lp':
-            alg1 = LPSolver('rand', dcop, {'max_iter': 1, 'relax': True}, seed=seed)
-            n_rep = 1
-        elif algname == 'ccg-maxsum+' or algname == 'ccg-maxsum+k':
-            ifile = dcop_instance_to_dimacs(dcop)
-            # Call the CCG construction program. Change delete to False to view output files
-            with NamedTemporaryFile(mode='w+', encoding='utf-8', delete=False) as f:
-                print(ifile.getvalue(), file=f, flush=True)
-                # print("Running " + ' '.join([CCG_EXECUTABLE_PATH, '-k', '-mm', '-ctmp.out', f.name]), file=sys.stderr)
-                if algname == 'ccg-maxsum+k':
-                    ccg_output = subprocess.check_output([CCG_EXECUTABLE_PATH, '-mm', f.name], encoding='utf-8')
-                else:
-                    ccg_output = subprocess.check_output([CCG_EXECUTABLE_PATH, '-k', '-mm', f.name], encoding='utf-8')
-
-                lines = ccg_output.splitlines()
-                i = 0
-                while not lines[i].startswith('ccg-maxsum-results-start'):
-                    if 'variables resolved' in lines[i]:
-                        print(lines[i])
-                    i += 1
-                i+=1
-                while not lines[i].startswith('ccg-maxsum-results-end'):
-                    itr, cost, msgs, time = re.split(r'\t+', lines[i].rstrip('\t'))
-                    StatsCollector.addIterStats(algname, int(itr), int(cost), int(msgs), float(time))
-                    i += 1
-
-            ##########################
-            ## Statistics
-            ##########################
-            if fileout is not None:
-                filename, extension = os.path.splitext(fileout)
-                StatsCollector.getDataFrameSummary().to_csv(filename + '0' + extension)
-                print(StatsCollector.iter_stats[-1])
+    if args.portfolio is not None:
+        import portfolio
+        configs = args.portfolio.split(',')
+        for name in configs:
+            assert name in registry.names(), parser.print_help()
+
+        context = ProblemContext(dcop, exact_component_size=args.exact_components, kernelize=args.kernelize)
+        params = {'max_iter': iterations, 'n_replicas': args.replicas, 'backend': args.lp_backend,
+                  'fixed_noise': args.maxsum_fixed_noise, 'msg_tol': args.maxsum_msg_tol,
+                  'memory_limit': None if args.dpop_memory is None else int(args.dpop_memory * 2**20)}
+        res = portfolio.run_portfolio(dcop, configs, params, seed=seed + 1, context=context,
+                                      time_limit=args.time_limit, target_cost=args.target_cost,
+                                      restart_every=args.restart_every)
+        print('config\talg\titer\tcost')
+        for k, (name, results) in enumerate(zip(configs, res['results'])):
+            if results is None:
+                print(k, name, 'failed:', res['errors'][k], sep='\t\t')
             else:
-                StatsCollector.printSummary()
-
-            exit()
-
+                print(k, name, results['iter'][-1], results.get('best_cost', min(results['cost'])), sep='\t\t')
+        print('Best cost:', res['best_cost'], '(config ' + str(res['best_config']) + ')')
+
+        if fileout is not None:
+            import pandas as pd
+            frames = [pd.DataFrame({key: results[key] for key in ['alg', 'iter', 'msgs', 'time', 'cost']})
+                      .assign(config=k) for k, results in enumerate(res['results']) if results is not None]
+            pd.concat(frames, ignore_index=True).to_csv(fileout)
+
+    elif algname is not None:
+        assert algname in registry.names(), parser.print_help()
+        from tqdm import tqdm
+        from utils import result_sink
+        result_sink.close_on_signals()
+
+        comm = None
+        if args.comm_profile is not None:
+            from utils.comm_profiler import CommProfiler
+            comm = CommProfiler()
+
+        # The compiled instance and the CCG are derived once and shared by all the runs on dcop
+        context = ProblemContext(dcop, exact_component_size=args.exact_components, kernelize=args.kernelize)
+        params = {'max_iter': iterations, 'n_replicas': args.replicas, 'backend': args.lp_backend,
+                  'fixed_noise': args.maxsum_fixed_noise, 'msg_tol': args.maxsum_msg_tol,
+                  'time_limit': args.time_limit, 'memory_limit': None if args.dpop_memory is None else int(args.dpop_memory * 2**20)}
         for k in range(NEXPERIMEMTS):
             seed += 1
-            alg1.reset(seed)
-            if alg2: alg2.reset(seed)
-
+            sink = None
+            if args.stream_out is not None:
+                filename, extension = os.path.splitext(args.stream_out)
+                sink = result_sink.open_sink(filename + str(k) + extension, append=args.resume is not None)
+            for key in ['checkpoint', 'resume']:
+                if getattr(args, key) is not None:
+                    filename, extension = os.path.splitext(getattr(args, key))
+                    params[key] = filename + str(k) + extension
+            params['checkpoint_every'] = args.checkpoint_every
             with tqdm(total=iterations) as pbar:
-                last_iter, last_msg, last_time = 0, 0, 0
-
-                for i in range(n_rep):
-                    alg1.run(interactive=False, pbar=pbar)
-                    if alg2 is not None:
-                        alg2.run(interactive=False, pbar=pbar, chain=True)
+                results = api.run(dcop, algname, params, seed=seed, context=context, pbar=pbar, comm=comm,
+                                  sink=sink)
+            if 'best_cost' in results:
+                print('Best cost:', results['best_cost'])
 
             ##########################
             ## Statistics
             ##########################
-            if fileout is not None:
+            if sink is not None:
+                sink.close()
+                print(StatsCollector.iter_stats[-1])
+            elif fileout is not None:
                 filename, extension = os.path.splitext(fileout)
                 StatsCollector.getDataFrameSummary().to_csv(filename + str(k) + extension)
                 print(StatsCollector.iter_stats[-1])
             else:
                 StatsCollector.printSummary(print_n_iter=50)
+
+            if comm is not None:
+                comm.toCsv(args.comm_profile + str(k))
+                print('Traffic gini index:', round(comm.giniIndex(), 4))
+                print(comm.getHotspots().head(10))
+
+
+if __name__ == '__main__':
+    main()
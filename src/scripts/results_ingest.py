@@ -0,0 +1,299 @@
+'''
+Ingestion of experiment results into a consolidated (SQLite) results store.
+
+Reads, in parallel:
+    - the CSV files written by py_dcop2 (StatsCollector.getDataFrameSummary), named as the instances,
+      e.g., agt_100_dom_3_1*.csv;
+    - the wcsp / FRODO / DCOP logs (out_<size>_<instance>.out and out_d_<size>_<instance>.out), made of
+      sections starting with one of LOG_SECTIONS and ending at the first line containing 'seconds'.
+Each file is parsed into columns (RESULT_COLUMNS) and stored with its path, modification time and size, so
+that only new or modified files are parsed again on the next run.
+
+Usage:
+    python results_ingest.py --db results.sqlite [--parquet results.parquet] [--max-iter 1000] [--plot] paths...
+'''
+import argparse
+import os
+import re
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+
+RESULT_COLUMNS = ['source', 'size', 'domsize', 'instance', 'alg', 'replica', 'iter', 'time', 'net_load',
+                  'cost', 'best_cost']
+
+# Log section header -> (algorithm, log format, start line offset, end line offset)
+LOG_SECTIONS = {
+    'wcsp with BP on original problem':                 ('max_sum', 'wcsp', 0, 0),
+    'wcsp with BP on CCG problem + Kernelization':      ('ccg_max_sum_k', 'wcsp', 0, -1),
+    'wcsp with BP on CCG problem  (No KERNELIZATION)':  ('ccg_max_sum', 'wcsp', 3, 0),
+    'DCOP on CCG with Kernelization:':                  ('d_ccg_max_sum_k', 'wcsp', 0, -1),
+    'DCOP on CCG NO Kernelization:':                    ('d_ccg_max_sum', 'wcsp', 3, 0),
+    'MaxSum (FRODO)':                                   ('f_maxsum', 'frodo', 1, 0),
+    'DSA (FRODO)':                                      ('f_dsa', 'frodo', 1, 0),
+    'Starting algorithm...':                            ('dd_ccg_max_sum', 'dcop', 0, 0),
+}
+LOG_STOP_KEY = 'seconds'
+# The iterations of the logs are numbered from 2 (1 is the initial iteration, see add_first_iter)
+LOG_FIRST_ITER = 2
+
+_INSTANCE_NAME = re.compile(r'agt_(\d+)_dom_(\d+)_(\d+)')
+_LOG_NAME = re.compile(r'out_(?:d_)?(\d+)_(\d+)')
+
+
+def _columns(source, size, domsize, instance, alg, replica, iters, time, load, cost, best_cost=None):
+    n = len(iters)
+    cost = np.asarray(cost, dtype=float)
+    if best_cost is None:
+        best_cost = np.minimum.accumulate(cost) if n > 0 else cost
+    return {'source': np.full(n, source, dtype=object), 'size': np.full(n, size, dtype=float),
+            'domsize': np.full(n, domsize, dtype=float), 'instance': np.full(n, instance, dtype=float),
+            'alg': np.full(n, alg, dtype=object), 'replica': np.broadcast_to(replica, n).astype(np.int64),
+            'iter': np.asarray(iters, dtype=np.int64), 'time': np.broadcast_to(time, n).astype(float),
+            'net_load': np.broadcast_to(load, n).astype(float), 'cost': cost,
+            'best_cost': np.asarray(best_cost, dtype=float)}
+
+
+def _concat(chunks):
+    if not chunks:
+        return {c: np.zeros(0) for c in RESULT_COLUMNS}
+    return {c: np.concatenate([ch[c] for ch in chunks]) for c in RESULT_COLUMNS}
+
+
+def _fileMeta(path):
+    """:return: The (size, domsize, instance) encoded in the file name (NaN when absent)"""
+    name = os.path.basename(path)
+    m = _INSTANCE_NAME.search(name)
+    if m:
+        return int(m.group(1)), int(m.group(2)), int(m.group(3))
+    m = _LOG_NAME.search(name)
+    if m:
+        return int(m.group(1)), np.nan, int(m.group(2))
+    return np.nan, np.nan, np.nan
+
+
+def read_stats_csv(path):
+    """
+    Reads a CSV file written from StatsCollector.getDataFrameSummary. A file holds one run (per replica);
+    the stages of a pipeline (e.g., dsa&ccg-maxsum) are labeled by their algorithm and the run is labeled by
+    the stage names joined with '&'.
+    """
+    df = pd.read_csv(path, index_col=0)
+    size, domsize, instance = _fileMeta(path)
+    algs = list(dict.fromkeys(df['alg'].astype(str)))
+    replica = df['replica'].to_numpy() if 'replica' in df else np.zeros(len(df), dtype=np.int64)
+    # The anytime cost is cumulative within each replica
+    best_cost = df['cost'].groupby(replica).cummin().to_numpy()
+    return _columns(path, size, domsize, instance, '&'.join(algs), replica, df['iter'].to_numpy(),
+                    df['time'].to_numpy(), df['msgs'].to_numpy(), df['cost'].to_numpy(), best_cost)
+
+
+def _readTable(lines, sep, ncols):
+    """Parses the lines with :param ncols fields separated by :param sep into a DataFrame of strings"""
+    lines = [l for l in lines if len(l.split(sep)) == ncols]
+    if not lines:
+        return pd.DataFrame(columns=range(ncols))
+    return pd.read_csv(StringIO('\n'.join(lines)), sep=r'\s+' if sep is None else sep, header=None, dtype=str)
+
+
+def _numeric(col):
+    return pd.to_numeric(col, errors='coerce').to_numpy(dtype=float)
+
+
+def _readWcspSection(lines):
+    """Lines 'iter cost load' (the iter field is ignored: the lines are numbered from LOG_FIRST_ITER)"""
+    t = _readTable(lines, None, 3)
+    iters = LOG_FIRST_ITER + np.arange(len(t))
+    return iters, np.nan, _numeric(t[2]), _numeric(t[1])
+
+
+def _readDcopSection(lines):
+    """A header line containing 'iter', then lines 'iter,cost,time,load'"""
+    start = next((i for i, l in enumerate(lines) if 'iter' in l), len(lines))
+    t = _readTable(lines[start + 1:], ',', 4)
+    iters = _numeric(t[0]).astype(np.int64) + LOG_FIRST_ITER
+    return iters, _numeric(t[2]), _numeric(t[3]), _numeric(t[1])
+
+
+def _readFrodoSection(lines):
+    """Lines 'time cost ub m1 m2 load', one per iteration, until a cost 'NA' (no solution)"""
+    t = _readTable(lines, None, 6)
+    cost = _numeric(t[1])
+    na = np.flatnonzero(np.isnan(cost))
+    n = na[0] if len(na) > 0 else len(cost)
+    iters = LOG_FIRST_ITER + np.arange(n)
+    return iters, _numeric(t[0])[:n], _numeric(t[5])[:n], cost[:n]
+
+
+_SECTION_READERS = {'wcsp': _readWcspSection, 'dcop': _readDcopSection, 'frodo': _readFrodoSection}
+
+
+def read_log(path):
+    """Reads the algorithm sections of a wcsp / FRODO / DCOP log file"""
+    with open(path) as f:
+        content = [x.strip() for x in f]
+    size, domsize, instance = _fileMeta(path)
+
+    stops = np.asarray([i for i, l in enumerate(content) if LOG_STOP_KEY in l.split()], dtype=np.int64)
+    chunks = []
+    ln_i = 0
+    while ln_i < len(content):
+        if content[ln_i] in LOG_SECTIONS:
+            alg, fmt, start_offset, end_offset = LOG_SECTIONS[content[ln_i]]
+            k = np.searchsorted(stops, ln_i)
+            ln_end = stops[k] if k < len(stops) else len(content)
+            iters, time, load, cost = _SECTION_READERS[fmt](content[ln_i + start_offset + 1:ln_end + end_offset])
+            chunks.append(_columns(path, size, domsize, instance, alg, 0, iters, time, load, cost))
+            ln_i = ln_end
+        ln_i += 1
+    return _concat(chunks)
+
+
+def read_results_file(path):
+    """:return: The columns (dictionary of arrays) of the results in the file at :param path"""
+    if path.endswith('.csv'):
+        return read_stats_csv(path)
+    return read_log(path)
+
+
+def pad_runs(df, max_iter=None):
+    """
+    Forward-fills each run (source, alg, replica) from its first logged iteration up to :param max_iter
+    (excluded; the last iteration of all the runs if None), so that every run has a row for each iteration.
+    """
+    if len(df) == 0:
+        return df
+    keys = ['source', 'alg', 'replica']
+    df = df.sort_values(keys + ['iter'], kind='stable').reset_index(drop=True)
+    run = df.groupby(keys, sort=False).ngroup().to_numpy()
+    iters = df['iter'].to_numpy()
+    if max_iter is None:
+        max_iter = int(iters.max()) + 1
+    # Drop the iterations beyond max_iter, then build the grid of (run, iteration) of each run
+    keep = iters < max_iter
+    df, run, iters = df[keep].reset_index(drop=True), run[keep], iters[keep]
+    starts = np.flatnonzero(np.r_[True, run[1:] != run[:-1]])
+    first = iters[starts]
+    counts = max_iter - first
+    grid_run = np.repeat(run[starts], counts)
+    grid_iter = np.repeat(first - np.cumsum(np.r_[0, counts[:-1]]), counts) + np.arange(counts.sum())
+    # Row of the last logged iteration <= each grid iteration, within the same run
+    span = max_iter + 1
+    rows = np.searchsorted(run * span + iters, grid_run * span + grid_iter, side='right') - 1
+    out = df.iloc[rows].reset_index(drop=True)
+    out['iter'] = grid_iter
+    return out
+
+
+def add_first_iter(df):
+    """Adds to each run the iteration 1 with, as cost, the maximum cost over all the runs of its instance"""
+    runs = df.drop_duplicates(['source', 'alg', 'replica']).copy()
+    max_cost = df.groupby(['size', 'instance'], dropna=False)['cost'].transform('max')
+    runs['cost'] = runs['best_cost'] = max_cost.loc[runs.index].to_numpy()
+    runs['iter'], runs['time'], runs['net_load'] = 1, 0.0, 0.0
+    return pd.concat([runs, df], ignore_index=True)
+
+
+class ResultsStore:
+    """SQLite store of the results: table 'results' (RESULT_COLUMNS) and table 'files' of the ingested files"""
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, mtime REAL, nbytes INTEGER)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS results (source TEXT, size REAL, domsize REAL, '
+                          'instance REAL, alg TEXT, replica INTEGER, iter INTEGER, time REAL, net_load REAL, '
+                          'cost REAL, best_cost REAL)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS results_source ON results (source)')
+
+    def stale(self, paths):
+        """:return: The paths of the files that are new or have changed since their last ingestion"""
+        known = dict((p, (m, n)) for p, m, n in self.conn.execute('SELECT path, mtime, nbytes FROM files'))
+        out = []
+        for p in paths:
+            st = os.stat(p)
+            if known.get(p) != (st.st_mtime, st.st_size):
+                out.append(p)
+        return out
+
+    def update(self, path, columns):
+        """Replaces the results of the file at :param path"""
+        st = os.stat(path)
+        with self.conn:
+            self.conn.execute('DELETE FROM results WHERE source = ?', (path,))
+            rows = zip(*(columns[c].tolist() for c in RESULT_COLUMNS))
+            self.conn.executemany('INSERT INTO results VALUES (' + ','.join('?' * len(RESULT_COLUMNS)) + ')',
+                                  rows)
+            self.conn.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?)', (path, st.st_mtime, st.st_size))
+
+    def load(self, where=None, params=()):
+        """:return: The DataFrame of the stored results (optionally filtered by the SQL condition :param where)"""
+        query = 'SELECT * FROM results' + ('' if where is None else ' WHERE ' + where)
+        return pd.read_sql_query(query, self.conn, params=params)
+
+    def close(self):
+        self.conn.close()
+
+
+def find_results_files(paths):
+    """:return: The results files (.csv, .out) in :param paths (files or directories, searched recursively)"""
+    files = []
+    for p in paths:
+        if os.path.isdir(p):
+            for root, _, names in os.walk(p):
+                files.extend(os.path.join(root, n) for n in sorted(names) if n.endswith(('.csv', '.out')))
+        else:
+            files.append(p)
+    return [os.path.abspath(f) for f in files]
+
+
+def ingest(paths, db_path, workers=None):
+    """
+    Parses (in parallel) the new or modified results files in :param paths and stores them in :param db_path.
+    :return: The number of files ingested.
+    """
+    store = ResultsStore(db_path)
+    files = store.stale(find_results_files(paths))
+    if files:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for path, columns in zip(files, pool.map(read_results_file, files, chunksize=8)):
+                store.update(path, columns)
+    store.close()
+    return len(files)
+
+
+def plot(df):
+    import seaborn as sns
+    import matplotlib.pyplot as plt
+    sns.set_context('notebook', font_scale=1.5, rc={'lines.linewidth': 1.0, 'lines.markersize': 0.5})
+    sns.set_style('whitegrid')
+    f = sns.lineplot(data=df[df.best_cost > 0], x='iter', y='best_cost', hue='alg', estimator=np.mean)
+    f.set(xlabel='Iterations', ylabel='Average Cost')
+    plt.xscale('symlog')
+    plt.show()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='results-ingest', formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('paths', nargs='+', help='results files or directories')
+    parser.add_argument('--db', dest='db', type=str, default='results.sqlite', help='the SQLite results store')
+    parser.add_argument('--workers', dest='workers', type=int, default=None, help='number of parser processes')
+    parser.add_argument('--parquet', dest='parquet', type=str, default=None,
+                        help='also export the (padded) results to this Parquet file (requires pyarrow)')
+    parser.add_argument('--max-iter', dest='max_iter', type=int, default=None,
+                        help='pad every run up to this iteration')
+    parser.add_argument('--plot', dest='plot', action='store_true', help='plot the average anytime cost')
+    args = parser.parse_args()
+
+    n = ingest(args.paths, args.db, args.workers)
+    print('Files ingested:', n)
+
+    if args.parquet is not None or args.plot:
+        store = ResultsStore(args.db)
+        data = add_first_iter(pad_runs(store.load(), args.max_iter))
+        store.close()
+        if args.parquet is not None:
+            data.to_parquet(args.parquet, index=False)
+        if args.plot:
+            plot(data)
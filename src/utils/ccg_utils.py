@@ -1,13 +1,24 @@
 #CCG_EXECUTABLE_PATH = '/home/fioretto/Repos/py_dcop/third_parties/wcsp/build/bin/wcsp'
 CCG_EXECUTABLE_PATH= '/Users/ferdinandofioretto/Repos/dcop-ccg/third_parties/wcsp/build/bin/wcsp'
 
+# If True, the instances are passed to the wcsp executable in binary format (see utils.wcsp_io) rather than DIMACS
+CCG_INPUT_BINARY = False
+# If True, the instances are sent to a persistent wcsp process (see utils.wcsp_worker) rather than to a new
+# process per run, when the executable supports it (builds older than its serve mode do not)
+CCG_PERSISTENT_WORKER = True
+
 from io import StringIO
-from tempfile import NamedTemporaryFile
+import atexit
+import os
+import re
 import subprocess
 import sys
+import threading
 import networkx as nx
 import numpy as np
 from core.dcop_instance import DCOPInstance
+from utils.wcsp_io import dimacs_text, write_dimacs, write_binary, cost_offset
+from utils.wcsp_worker import WcspWorker, WcspPool
 
 def load_dimacs_to_networkx(s):
     """Load a DIMACS graph file into a vertex-weighted networkx Graph.
@@ -35,33 +46,122 @@ def load_dimacs_to_networkx(s):
     return g
 
 def dcop_instance_to_dimacs(instance):
-    variable_ids = dict()
-    for i, (_, v) in enumerate(instance.variables.items()):
-        variable_ids[v.name] = str(i)
+    """:return: A StringIO holding the instance in the DIMACS format read by the wcsp executable"""
+    return StringIO(dimacs_text(instance))
+
+_worker = None
+_worker_lock = threading.Lock()
+# Whether each executable supports the serve mode
+_serves = {}
+
+def supports_serve(executable):
+    """:return: True if the wcsp :param executable has the serve mode (wcsp --serve) used by utils.wcsp_worker"""
+    if executable not in _serves:
+        try:
+            # With no request to serve, the serve mode exits at once with status 0; older builds reject the option
+            status = subprocess.run([executable, '--serve'], stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                    stderr=subprocess.DEVNULL).returncode
+        except OSError:
+            status = None
+        _serves[executable] = status == 0
+        if status not in (0, None):
+            print(executable + ' has no serve mode: a wcsp process is started per run', file=sys.stderr)
+    return _serves[executable]
+
+def _close_worker():
+    if _worker is not None and _worker.owner_pid == os.getpid():
+        _worker.close()
+
+atexit.register(_close_worker)
+
+def run_wcsp(instance, options, binary=None, worker=None):
+    """
+    Runs the wcsp executable with the command line :param options on the instance, which is streamed to its
+    standard input (no temporary file is written).
+    :param binary: Whether to pass the instance in binary format rather than DIMACS (default: CCG_INPUT_BINARY).
+    :param worker: The WcspWorker or WcspPool (see utils.wcsp_worker) running the request. By default, the
+    persistent worker of this process if CCG_PERSISTENT_WORKER and the executable supports it (see
+    supports_serve), else a new wcsp process.
+    :return: The standard output of the run.
+    """
+    global _worker
+    binary = CCG_INPUT_BINARY if binary is None else binary
+    if worker is not None:
+        return worker.run(instance, options, binary)
+    if CCG_PERSISTENT_WORKER and supports_serve(CCG_EXECUTABLE_PATH):
+        with _worker_lock:
+            # A forked process (e.g., a portfolio worker) starts its own worker
+            if _worker is None or _worker.owner_pid != os.getpid() or _worker.executable != CCG_EXECUTABLE_PATH \
+                    or not _worker.alive():
+                if _worker is not None and _worker.owner_pid == os.getpid():
+                    _worker.close()
+                _worker = WcspWorker(CCG_EXECUTABLE_PATH)
+            return _worker.run(instance, options, binary)
+
+    cmd = [CCG_EXECUTABLE_PATH] + (['-f', 'b'] if binary else []) + list(options) + ['/dev/stdin']
+    print("Running " + ' '.join(cmd), file=sys.stderr)
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    try:
+        with proc.stdin:
+            (write_binary if binary else write_dimacs)(instance, proc.stdin)
+    except BrokenPipeError:
+        # The executable exited before reading the whole instance: its exit status reports the error
+        pass
+    output = proc.stdout.read()
+    proc.stdout.close()
+    if proc.wait() != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, output)
+    return output.decode('utf-8')
+
+def parse_maxsum_trace(ccg_output, offset=0.0):
+    """
+    :param ccg_output: The output of a message passing run of the wcsp executable (option -mm).
+    :param offset: The cost added to the reported costs, i.e., the cost_offset of the instance exported.
+    :return: The arrays (iterations, costs, messages, times) of the iteration records of the run. The costs are
+    floats (inf if the assignment violates a hard constraint).
+    """
+    start = ccg_output.index('\n', ccg_output.index('ccg-maxsum-results-start')) + 1
+    end = ccg_output.index('ccg-maxsum-results-end', start)
+    for line in re.findall(r'^.*variables resolved.*$', ccg_output[:start], flags=re.M):
+        print(line)
+    trace = np.array(ccg_output[start:end].split(), dtype=float).reshape(-1, 4)
+    itr, cost, msgs, time = trace.T
+    return itr.astype(np.int64), cost + offset, msgs.astype(np.int64), time
+
+def _maxsumOptions(kernelize):
+    return ['-mm'] if kernelize else ['-k', '-mm']
+
+def run_ccg_maxsum_plus(instance, kernelize=True, worker=None):
+    """
+    Solves the instance with the message passing (Max-Sum) on the CCG implemented by the wcsp executable.
+    :param kernelize: If True, the CCG is kernelized before message passing.
+    :param worker: See run_wcsp.
+    :return: The list of (iteration, cost, messages, time) records of the run.
+    """
+    trace = parse_maxsum_trace(run_wcsp(instance, _maxsumOptions(kernelize), worker=worker), cost_offset(instance))
+    return list(zip(*[col.tolist() for col in trace]))
 
-    # Write input file for the CCG construction program
-    max_domain_size = max(len(v.domain) for _, v in instance.variables.items())
-    input_file = StringIO()
-    print('edges {} {} {} 9999999'.format(
-        len(instance.variables), max_domain_size, len(instance.constraints)),
-          file=input_file)
-    for _, v in instance.variables.items():
-        print(len(v.domain), end=' ', file=input_file)
-    print('', file=input_file)
-
-    for _, c in instance.constraints.items():
-        # constraint signature
-        print(len(c.scope), end=' ', file=input_file)
-        for v in c.scope:
-            print(variable_ids[v.name], end=' ', file=input_file)
-        print(c.default_value, end=' ', file=input_file)
-        print(len(c.values), file=input_file)
-
-        # tuples in the constraint
-        for vs, w in c.values.items():
-            print(' '.join(str(v) for v in vs) + ' ' + str(w), file=input_file)
-
-    return input_file
+def run_ccg_maxsum_plus_many(instances, kernelize=True, pool=None, binary=None):
+    """
+    Solves the instances with run_ccg_maxsum_plus concurrently, on the workers of :param pool (by default, a
+    WcspPool of one worker per CPU, closed on return, or one wcsp process per instance in turn if the executable
+    has no serve mode).
+    :return: The list of the traces (see parse_maxsum_trace) of the runs, in the order of :param instances.
+    """
+    binary = CCG_INPUT_BINARY if binary is None else binary
+    if pool is None and not supports_serve(CCG_EXECUTABLE_PATH):
+        options = _maxsumOptions(kernelize)
+        return [parse_maxsum_trace(run_wcsp(instance, options, binary), cost_offset(instance))
+                for instance in instances]
+    own_pool = pool is None
+    if own_pool:
+        pool = WcspPool(CCG_EXECUTABLE_PATH, min(len(instances), os.cpu_count() or 1))
+    try:
+        outputs = pool.map(instances, _maxsumOptions(kernelize), binary)
+        return [parse_maxsum_trace(out, cost_offset(instance)) for out, instance in zip(outputs, instances)]
+    finally:
+        if own_pool:
+            pool.close()
 
 def transform_dcop_instance_to_ccg(instance: DCOPInstance) -> nx.Graph:
     """
@@ -81,34 +181,8 @@ def transform_dcop_instance_to_ccg(instance: DCOPInstance) -> nx.Graph:
     for i, (_, v) in enumerate(instance.variables.items()):
         variable_ids[v.name] = str(i)
 
-    # Write input file for the CCG construction program
-    max_domain_size = max(len(v.domain) for _, v in instance.variables.items())
-    input_file = StringIO()
-    print('edges {} {} {} 9999999'.format(
-        len(instance.variables), max_domain_size, len(instance.constraints)),
-          file=input_file)
-    for _, v in instance.variables.items():
-        print(len(v.domain), end=' ', file=input_file)
-    print('', file=input_file)
-
-    for _, c in instance.constraints.items():
-        # constraint signature
-        print(len(c.scope), end=' ', file=input_file)
-        for v in c.scope:
-            print(variable_ids[v.name], end=' ', file=input_file)
-        print(c.default_value, end=' ', file=input_file)
-        print(len(c.values), file=input_file)
-
-        # tuples in the constraint
-        for vs, w in c.values.items():
-            print(' '.join(str(v) for v in vs) + ' ' + str(w), file=input_file)
-
-    # Call the CCG construction program. Change delete to False to view output files
-    with NamedTemporaryFile(mode='w+', encoding='utf-8', delete=False) as f:
-        print(input_file.getvalue(), file=f, flush=True)
-        print("Running " + ' '.join([CCG_EXECUTABLE_PATH, '-k', '-g', f.name]), file=sys.stderr)
-        ccg_output = subprocess.check_output([CCG_EXECUTABLE_PATH, '-k', '-g', f.name],
-                                             encoding='utf-8')
+    # Call the CCG construction program
+    ccg_output = run_wcsp(instance, ['-k', '-g'])
 
     # Construct CCG
     lines = ccg_output.splitlines()
@@ -160,6 +234,9 @@ def transform_dcop_instance_to_ccg(instance: DCOPInstance) -> nx.Graph:
     for nbv, nbv_id in variable_ids.items():
         bvs = non_boolean_mapping[nbv_id]
         for i, bv in enumerate(bvs):
+            # Boolean variables not appearing in any term have no vertex
+            if bv not in boolean_mapping:
+                continue
             ver = boolean_mapping[bv]
             ccg.nodes[ver]['type'] = 'decision'
             ccg.nodes[ver]['variable'] = nbv
@@ -207,29 +284,93 @@ def add_node_from(G_to, G_from, n, agt=None):
         G_to.nodes[n][attr] = G_from.nodes[n][attr]
     G_to.nodes[n]['owner'] = agt
 
-def make_gadgets(G, dcop_instance):
-    # Associates variables to CCG nodes
-    var_to_ccg_nodes = {vname: [] for vname in dcop_instance.variables}
-    for n, d in G.nodes(data=True):
-        if 'variable' in d:
-            var_to_ccg_nodes[d['variable']].append(n)
+class CCGIndex:
+    """
+    Integer indexing of the nodes of a CCG: node i is self.nodes[i]. Holds the node weights, the CSR
+    adjacency (the neighbors of node i are adj_idx[adj_ptr[i]:adj_ptr[i+1]]) and, for the decision nodes,
+    the index of their variable in dcop_instance.variables (-1 for auxiliary nodes) and their rank.
+    """
+    def __init__(self, G, dcop_instance):
+        self.nodes = list(G.nodes())
+        self.index = {u: i for i, u in enumerate(self.nodes)}
+        n = len(self.nodes)
+        self.weights = np.fromiter((G.nodes[u]['weight'] for u in self.nodes), dtype=float, count=n)
+        var_index = {vname: i for i, vname in enumerate(dcop_instance.variables)}
+        self.node_var = np.full(n, -1, dtype=np.int64)
+        self.node_rank = np.zeros(n, dtype=np.int64)
+        for u, d in G.nodes(data=True):
+            if 'variable' in d:
+                self.node_var[self.index[u]] = var_index[d['variable']]
+                self.node_rank[self.index[u]] = d['rank']
+
+        edges = np.fromiter((self.index[x] for e in G.edges() for x in e), dtype=np.int64,
+                            count=2 * G.number_of_edges()).reshape(-1, 2)
+        src = np.concatenate((edges[:, 0], edges[:, 1]))
+        dst = np.concatenate((edges[:, 1], edges[:, 0]))
+        order = np.argsort(src, kind='stable')
+        self.adj_idx = dst[order]
+        self.adj_ptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=self.adj_ptr[1:])
+        self._src = src[order]
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def ids(self, nodes):
+        """:return: The array of the integer ids of :param nodes"""
+        return np.fromiter((self.index[u] for u in nodes), dtype=np.int64)
+
+    def mask(self, nodes):
+        """:return: The boolean mask of :param nodes over the indexed nodes"""
+        m = np.zeros(len(self.nodes), dtype=bool)
+        m[self.ids(nodes)] = True
+        return m
+
+
+def partition_ccg_nodes(G, dcop_instance):
+    """
+    Partitions the CCG nodes among agents: each agent owns the nodes associated to its variables and
+    their (not yet assigned) neighbors.
+    :return: A dictionary mapping each CCG node to the name of the agent owning it.
+    """
+    idx = CCGIndex(G, dcop_instance)
+    agent_names = list(dcop_instance.agents)
+    agent_index = {aname: i for i, aname in enumerate(agent_names)}
+    var_agent = np.asarray([agent_index[var.controlled_by.name] for var in dcop_instance.variables.values()],
+                           dtype=np.int64)
+
+    n = len(idx)
+    INF = np.iinfo(np.int64).max
+    # Decision nodes go to the agent of their variable; the other nodes to the agent of the first
+    # variable (in instance order) with a node adjacent to them
+    first_var = np.where(idx.node_var >= 0, idx.node_var, INF)
+    first_adj = np.full(n, INF, dtype=np.int64)
+    np.minimum.at(first_adj, idx.adj_idx, first_var[idx._src])
+    owner = np.full(n, -1, dtype=np.int64)
+    dec = idx.node_var >= 0
+    owner[dec] = var_agent[idx.node_var[dec]]
+    adj = ~dec & (first_adj < INF)
+    owner[adj] = var_agent[first_adj[adj]]
+
+    # Nodes left (e.g., auxiliary nodes whose decision neighbors have been removed by a reduction) go to
+    # the owner of a neighbor, or to the first agent if their component has no owned node
+    while True:
+        left = owner[idx._src] < 0
+        reach = left & (owner[idx.adj_idx] >= 0)
+        if not reach.any():
+            break
+        owner[idx._src[reach]] = owner[idx.adj_idx[reach]]
+    owner[owner < 0] = agent_index[min(dcop_instance.agents)]
+    return {u: agent_names[a] for u, a in zip(idx.nodes, owner.tolist())}
+
+def make_gadgets(G, dcop_instance, owner=None):
     G_agts = {aname: nx.Graph() for aname in dcop_instance.agents}
 
     ## Partition the nodes among agents:
-    processed_nodes = []
-    for v in dcop_instance.variables:
-        a = dcop_instance.variables[v].controlled_by.name
-        for n in var_to_ccg_nodes[v]:
-            add_node_from(G_agts[a], G, n, a)
-            processed_nodes.append(n)
-
-        for n in var_to_ccg_nodes[v]:
-            ngbs_n = G.neighbors(n)
-            for m in ngbs_n:
-                if m not in processed_nodes:
-                    add_node_from(G_agts[a], G, m, a)
-                    processed_nodes.append(m)
-    assert (G.number_of_nodes() == len(processed_nodes))
+    if owner is None:
+        owner = partition_ccg_nodes(G, dcop_instance)
+    for n, a in owner.items():
+        add_node_from(G_agts[a], G, n, a)
 
     ## Partition edges among agents
     for a in G_agts:
@@ -249,10 +390,12 @@ def make_gadgets(G, dcop_instance):
     # Check all edges have been assigned
     # assert (G.number_of_edges() * 2 == len(processed_edges))
 
-    ##  Add nodes of connecting edges
+    ##  Add nodes of connecting edges (the nodes of other agents, without owner)
     for a in G_agts:
-        for (n1, n2) in G_agts[a].edges():
-            add_node_from(G_agts[a], G, n2)
+        boundary = set(n2 for (n1, n2) in G_agts[a].edges() if owner[n2] != a)
+        boundary.update(n1 for (n1, n2) in G_agts[a].edges() if owner[n1] != a)
+        for n in boundary:
+            add_node_from(G_agts[a], G, n)
     # for v in dcop_instance.variables:
     #     a = dcop_instance.variables[v].controlled_by.name
     #     for (n1, n2) in G_agts[a].edges:
@@ -267,10 +410,9 @@ def set_var_value(var, vc, var_ccg, prng=np.random):
     :param vc: The computed vertex cover, which is a set of nodes.
     """
     if len(var.domain) == 2:  # Boolean variable
-        for u, data in ccg.nodes(data=True):
-            if 'variable' in data and data['variable'] == var.name:
-                assert(data['rank'] == 0)
-                var.setAssignment(1 if u in vc else 0)
+        for u, r in var_ccg:
+            assert(r == 0)
+            var.setAssignment(1 if u in vc else 0)
     else:  # Non-Boolean variable
         # Get all nodes relevant to the variable of interest. We shouldn't need to find all such
         # pairs, but this would be easier for debugging.
@@ -282,3 +424,66 @@ def set_var_value(var, vc, var_ccg, prng=np.random):
             var.setAssignment(0)
         else:
             var.setAssignment(node_rank_pairs[prng.randint(0, N)])
+
+
+class CCGDecoder:
+    """
+    Decodes a vertex cover of the CCG, given as a boolean mask over the nodes of a CCGIndex, into the values
+    of (a subset of) the DCOP variables, as set_var_value does for a single variable:
+        - Boolean variable: 1 if its node is in the cover, 0 otherwise.
+        - Non-Boolean variable: the rank of one of its nodes out of the cover, chosen at random, or 0 if
+          all of them are in the cover.
+    """
+    def __init__(self, variables, var_ccg_nodes, ccg_index):
+        """
+        :param variables: The list of variables to decode.
+        :param var_ccg_nodes: For each variable name, the list of (CCG node, rank) pairs associated to it.
+        """
+        self.variables = list(variables)
+        self.ccg_index = ccg_index
+        nodes = [var_ccg_nodes[var.name] for var in self.variables]
+        self.seg_ptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+        np.cumsum([len(l) for l in nodes], out=self.seg_ptr[1:])
+        self.node_id = np.asarray([ccg_index.index[u] for l in nodes for u, _ in l], dtype=np.int64)
+        self.node_rank = np.asarray([r for l in nodes for _, r in l], dtype=np.int64)
+        is_bool = np.asarray([len(var.domain) == 2 for var in self.variables], dtype=bool)
+        self.bool_vars = np.flatnonzero(is_bool & (self.seg_ptr[1:] > self.seg_ptr[:-1]))
+        self.non_bool_vars = np.flatnonzero(~is_bool)
+
+    def subset(self, variables):
+        """:return: The decoder of :param variables (a subset of the decoded variables)"""
+        var_ccg_nodes = {}
+        position = {var.name: i for i, var in enumerate(self.variables)}
+        for var in variables:
+            i = position[var.name]
+            ids = self.node_id[self.seg_ptr[i]:self.seg_ptr[i + 1]]
+            ranks = self.node_rank[self.seg_ptr[i]:self.seg_ptr[i + 1]]
+            var_ccg_nodes[var.name] = [(self.ccg_index.nodes[u], r) for u, r in zip(ids.tolist(), ranks.tolist())]
+        return CCGDecoder(variables, var_ccg_nodes, self.ccg_index)
+
+    def decode(self, cover, prng=np.random):
+        """
+        :param cover: The boolean mask of the vertex cover over the nodes of the CCG index.
+        :return: The array of the values of the variables.
+        """
+        in_cover = cover[self.node_id]
+        values = np.zeros(len(self.variables), dtype=np.int64)
+        values[self.bool_vars] = in_cover[self.seg_ptr[self.bool_vars]]
+
+        # Non-Boolean variables: pick one of the nodes out of the cover at random
+        out = ~in_cover
+        cum = np.zeros(len(out) + 1, dtype=np.int64)
+        np.cumsum(out, out=cum[1:])
+        vs = self.non_bool_vars
+        first = cum[self.seg_ptr[vs]]
+        counts = cum[self.seg_ptr[vs + 1]] - first
+        vs, first, counts = vs[counts > 0], first[counts > 0], counts[counts > 0]
+        if len(vs) > 0:
+            k = prng.randint(0, counts)
+            values[vs] = self.node_rank[np.flatnonzero(out)[first + k]]
+        return values
+
+    def assign(self, cover, prng=np.random):
+        """Sets the variables to the values decoded from the vertex cover mask :param cover"""
+        for var, val in zip(self.variables, self.decode(cover, prng).tolist()):
+            var.setAssignment(val)
@@ -0,0 +1,116 @@
+'''
+Checkpoints of the algorithm runs: the state of the algorithms (messages, views, PRNG states, counters), of
+the instance (assignment, agent states) and of the statistics collected so far, written to a compressed binary
+file so that a run killed midway can be resumed exactly where it stopped.
+'''
+import os
+import pickle
+import zlib
+
+from utils.stats_collector import StatsCollector
+
+CHECKPOINT_MAGIC = b'PYDCOPC1'
+
+
+def save(path, state):
+    """Writes :param state to :param path atomically: a crash while writing leaves the previous checkpoint intact"""
+    dirout = os.path.dirname(path)
+    if dirout:
+        os.makedirs(dirout, exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(CHECKPOINT_MAGIC)
+        f.write(zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL), 1))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def load(path):
+    with open(path, 'rb') as f:
+        assert f.read(len(CHECKPOINT_MAGIC)) == CHECKPOINT_MAGIC, 'Not a checkpoint: ' + path
+        return pickle.loads(zlib.decompress(f.read()))
+
+
+def instance_state(instance):
+    """:return: The state of :param instance: the variable values and the agent states, with their PRNG states"""
+    return {'values': {v.name: v.value for v in instance.variables.values()},
+            'var_prng': {v.name: v.prng.get_state() for v in instance.variables.values()},
+            'agents': {a.name: {'prng': a.prng.get_state(),
+                                'state_prng': a.state.prng.get_state(),
+                                'assignments': dict(a.state.variables_assignments),
+                                'assignment_it': a.state.assignment_it}
+                       for a in instance.agents.values()}}
+
+
+def set_instance_state(instance, state):
+    for vname, value in state['values'].items():
+        instance.variables[vname].setAssignment(value)
+        instance.variables[vname].prng.set_state(state['var_prng'][vname])
+    for aname, s in state['agents'].items():
+        agt = instance.agents[aname]
+        agt.prng.set_state(s['prng'])
+        agt.state.prng.set_state(s['state_prng'])
+        agt.state.variables_assignments = dict(s['assignments'])
+        agt.state.assignment_it = s['assignment_it']
+
+
+def stats_state():
+    """
+    :return: The state of the statistics, with the number of records streamed to the sink of StatsCollector if
+    any (flushed, so that they are all in its file)
+    """
+    sink_records = None
+    if StatsCollector.sink is not None:
+        StatsCollector.sink.flush()
+        sink_records = StatsCollector.sink.n_written
+    return {'iter_stats': list(StatsCollector.iter_stats), 'best_cost': StatsCollector.best_cost,
+            'sink_records': sink_records,
+            'best_assignment': StatsCollector.best_assignment,
+            'best_assignment_cost': StatsCollector.best_assignment_cost,
+            'sink_best': dict(StatsCollector._sink_best)}
+
+
+def set_stats_state(state):
+    StatsCollector.iter_stats = list(state['iter_stats'])
+    StatsCollector.best_cost = state['best_cost']
+    StatsCollector.best_assignment = state['best_assignment']
+    StatsCollector.best_assignment_cost = state['best_assignment_cost']
+    StatsCollector._sink_best = dict(state['sink_best'])
+
+
+def restore(state, stages):
+    """Restores the state of the algorithms :param stages, of their instance and of the statistics from :param state"""
+    assert len(state['stages']) == len(stages), 'The checkpoint is of a different pipeline'
+    for alg, s in zip(stages, state['stages']):
+        alg.setState(s)
+    set_instance_state(stages[0].instance, state['instance'])
+    set_stats_state(state['stats'])
+
+
+class Checkpointer:
+    """
+    Saves the state of a run to :param path every :param every iterations.
+    The run is a pipeline of algorithms (stages) repeated for a number of rounds: self.stage and self.round
+    are the position of the running algorithm, set by the caller.
+    """
+    def __init__(self, path, every, stages, algorithm=None):
+        self.path = path
+        self.every = every
+        self.stages = stages
+        self.algorithm = algorithm
+        self.stage = 0
+        self.round = 0
+
+    def step(self, alg):
+        """Called at the end of every iteration of :param alg"""
+        if self.every > 0 and alg.curr_iteration % self.every == 0:
+            self.save()
+
+    def save(self):
+        save(self.path, {'algorithm': self.algorithm,
+                         'stage': self.stage,
+                         'round': self.round,
+                         'stages': [alg.getState() for alg in self.stages],
+                         'instance': instance_state(self.stages[0].instance),
+                         'stats': stats_state()})
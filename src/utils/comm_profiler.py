@@ -0,0 +1,97 @@
+'''Byte-level accounting of the messages exchanged among agents'''
+import os
+import pathlib
+import numpy as np
+
+# Size (in bytes) of a single variable value exchanged by value-based algorithms (e.g., DSA)
+VALUE_NBYTES = np.dtype(np.int64).itemsize
+
+
+class CommProfiler:
+    """
+    Records, for every iteration, the number of messages and bytes sent over each (sender, receiver)
+    agent link. The records of the iteration in progress are accumulated in a dictionary and moved
+    into columnar lists when the iteration ends.
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._curr = {}
+        self.iters, self.senders, self.receivers, self.msgs, self.bytes = [], [], [], [], []
+
+    def record(self, sender, receiver, nbytes, nmsgs=1):
+        """
+        Records a message of :param nbytes bytes sent from agent :param sender to agent :param receiver
+        """
+        rec = self._curr.get((sender, receiver))
+        if rec is None:
+            self._curr[(sender, receiver)] = [nmsgs, nbytes]
+        else:
+            rec[0] += nmsgs
+            rec[1] += nbytes
+
+    def endIteration(self, itr):
+        for (src, dst), (m, b) in self._curr.items():
+            self.iters.append(itr)
+            self.senders.append(src)
+            self.receivers.append(dst)
+            self.msgs.append(m)
+            self.bytes.append(b)
+        self._curr = {}
+
+    def getLinkDataFrame(self, exclude_local=False):
+        """
+        :return: A DataFrame with one row per (iteration, sender, receiver) with the messages and bytes sent.
+        :param exclude_local: If True, messages an agent sends to itself are discarded.
+        """
+        import pandas as pd
+        df = pd.DataFrame({'iter': self.iters, 'src': self.senders, 'dst': self.receivers,
+                           'msgs': self.msgs, 'bytes': self.bytes})
+        if exclude_local:
+            df = df[df.src != df.dst]
+        return df
+
+    def getAgentDataFrame(self, exclude_local=True, per_iteration=False):
+        """
+        :return: A DataFrame with the messages and bytes sent and received by each agent (and iteration,
+        if :param per_iteration is True).
+        """
+        import pandas as pd
+        links = self.getLinkDataFrame(exclude_local)
+        keys = ['iter'] if per_iteration else []
+        sent = links.groupby(keys + ['src'])[['msgs', 'bytes']].sum()
+        recv = links.groupby(keys + ['dst'])[['msgs', 'bytes']].sum()
+        sent.index.names = keys + ['agent']
+        recv.index.names = keys + ['agent']
+        df = pd.concat([sent.add_suffix('_sent'), recv.add_suffix('_recv')], axis=1).fillna(0).astype(np.int64)
+        df['bytes_total'] = df['bytes_sent'] + df['bytes_recv']
+        return df.reset_index()
+
+    def getHotspots(self, exclude_local=True):
+        """
+        :return: The agents sorted by decreasing traffic (bytes sent + received) with their share and
+        cumulative share of the total traffic.
+        """
+        df = self.getAgentDataFrame(exclude_local).sort_values('bytes_total', ascending=False)
+        total = max(1, df['bytes_total'].sum())
+        df['share'] = df['bytes_total'] / total
+        df['cum_share'] = df['share'].cumsum()
+        return df.reset_index(drop=True)
+
+    def giniIndex(self, exclude_local=True):
+        """Gini coefficient of the per-agent traffic (0 = evenly spread, 1 = a single hub)"""
+        x = np.sort(self.getAgentDataFrame(exclude_local)['bytes_total'].values.astype(float))
+        if len(x) == 0 or x.sum() == 0:
+            return 0.0
+        n = len(x)
+        return float((2 * np.sum(np.arange(1, n + 1) * x) / (n * x.sum())) - (n + 1) / n)
+
+    def toCsv(self, prefix, exclude_local=True):
+        """Writes the link, agent and hotspot profiles on <prefix>_links.csv, _agents.csv and _hotspots.csv"""
+        dirout = os.path.split(prefix)[0]
+        if dirout:
+            pathlib.Path(dirout).mkdir(parents=True, exist_ok=True)
+        self.getLinkDataFrame(exclude_local).to_csv(prefix + '_links.csv', index=False)
+        self.getAgentDataFrame(exclude_local, per_iteration=True).to_csv(prefix + '_agents.csv', index=False)
+        self.getHotspots(exclude_local).to_csv(prefix + '_hotspots.csv', index=False)
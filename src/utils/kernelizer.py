@@ -0,0 +1,89 @@
+'''
+Kernelization of the MWVC problem on a CCG (the in-process counterpart of the wcsp Kernelizer): reduction
+rules fix nodes in or out of the vertex cover and remove them from the graph.
+'''
+from utils.mwvc import MWVCProblem
+
+
+def _degreeRules(adj, w, values):
+    """
+    Degree-0: an isolated node is not in the cover.
+    Degree-1: a leaf u with neighbor v and w(u) >= w(v) is not in the cover (and v is).
+    Domination: if u, v are adjacent, N[u] is a subset of N[v] and w(v) <= w(u), v is in the cover.
+    :return: True if some node has been fixed.
+    """
+    changed = False
+    queue = list(adj)
+    while queue:
+        u = queue.pop()
+        if u not in adj:
+            continue
+        nbrs = adj[u]
+        if not nbrs:
+            _fix(adj, values, u, 0)
+            changed = True
+        elif len(nbrs) == 1:
+            v = next(iter(nbrs))
+            if w[u] >= w[v]:
+                queue.extend(adj[v])
+                _fix(adj, values, v, 1)
+                changed = True
+        else:
+            closed_u = nbrs | {u}
+            for v in nbrs:
+                if w[v] <= w[u] and closed_u <= adj[v] | {v}:
+                    # The neighbors of v (u among them) are re-examined with their reduced neighborhood
+                    queue.extend(adj[v])
+                    _fix(adj, values, v, 1)
+                    changed = True
+                    break
+    return changed
+
+
+def _fix(adj, values, u, x):
+    """Fixes node :param u to value :param x and removes it from the graph"""
+    values[u] = x
+    for v in adj.pop(u):
+        adj[v].discard(u)
+
+
+def _lpRule(adj, w, values, backend='highs', tol=1e-6):
+    """
+    Nemhauser-Trotter: some optimal cover agrees with the integral part of a half-integral optimal
+    solution of the LP relaxation. The nodes with LP value 1 are fixed in the cover, those with LP value 0
+    out of it.
+    :return: True if some node has been fixed.
+    """
+    import networkx as nx
+    if not adj:
+        return False
+    G = nx.Graph()
+    G.add_nodes_from((u, {'weight': w[u]}) for u in adj)
+    G.add_edges_from((u, v) for u in adj for v in adj[u])
+    problem = MWVCProblem(G)
+    x = problem.solve(relax=True, backend=backend)
+    ones = [u for u, xu in zip(problem.nodes, x) if xu >= 1 - tol]
+    zeros = [u for u, xu in zip(problem.nodes, x) if xu <= tol]
+    for u in ones:
+        _fix(adj, values, u, 1)
+    for u in zeros:
+        if u in adj:
+            _fix(adj, values, u, 0)
+    return len(ones) + len(zeros) > 0
+
+
+def kernelize(G, lp=True, backend='highs'):
+    """
+    Applies the degree, domination and (if :param lp) LP reduction rules to :param G until none applies.
+    :param G: A networkx Graph with a 'weight' attribute for each node.
+    :return: The subgraph induced by the nodes not fixed (the kernel), and a dictionary mapping each fixed
+    node to its value (1 if in the cover, 0 otherwise).
+    """
+    adj = {u: set(G.neighbors(u)) for u in G.nodes()}
+    w = {u: G.nodes[u]['weight'] for u in G.nodes()}
+    values = {}
+    while True:
+        _degreeRules(adj, w, values)
+        if not (lp and _lpRule(adj, w, values, backend)):
+            break
+    return G.subgraph(adj).copy(), values
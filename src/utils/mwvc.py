@@ -0,0 +1,181 @@
+'''
+Minimum weighted vertex cover (MWVC) LP/ILP of a CCG, assembled as a sparse edge-node incidence matrix
+and solved either by SciPy's HiGHS interface (open source) or by Gurobi.
+'''
+import numpy as np
+
+BACKENDS = ('highs', 'gurobi')
+
+
+class MWVCProblem:
+    """
+    The MWVC program  min w.x  s.t.  x_u + x_v >= 1 for every edge (u, v),  x in {0,1} (or [0,1] if relaxed).
+    Nodes are indexed by their position in self.nodes.
+    """
+    def __init__(self, ccg):
+        self.nodes = list(ccg.nodes())
+        index = {u: i for i, u in enumerate(self.nodes)}
+        self.weights = np.fromiter((ccg.nodes[u]['weight'] for u in self.nodes), dtype=float,
+                                   count=len(self.nodes))
+        edges = np.fromiter((index[x] for e in ccg.edges() for x in e), dtype=np.int64,
+                            count=2 * ccg.number_of_edges()).reshape(-1, 2)
+        self.edge_u = edges[:, 0]
+        self.edge_v = edges[:, 1]
+
+    @property
+    def n_nodes(self):
+        return len(self.nodes)
+
+    @property
+    def n_edges(self):
+        return len(self.edge_u)
+
+    def incidence(self):
+        """:return: The (n_edges, n_nodes) sparse CSR matrix with a 1 for each edge endpoint"""
+        from scipy.sparse import csr_matrix
+        m = self.n_edges
+        rows = np.repeat(np.arange(m), 2)
+        cols = np.column_stack((self.edge_u, self.edge_v)).ravel()
+        return csr_matrix((np.ones(2 * m), (rows, cols)), shape=(m, self.n_nodes))
+
+    def solve(self, relax=True, backend='highs'):
+        """:return: The (n_nodes,) array of the optimal values of the node variables"""
+        if self.n_nodes == 0:
+            return np.zeros(0)
+        if backend == 'highs':
+            return self._solveHighs(relax)
+        elif backend == 'gurobi':
+            return self._solveGurobi(relax)
+        raise ValueError('Unknown LP backend ' + str(backend) + '. Available: ' + ', '.join(BACKENDS))
+
+    def _solveHighs(self, relax):
+        from scipy.optimize import linprog, milp, LinearConstraint, Bounds
+        if self.n_edges == 0:
+            return np.zeros(self.n_nodes)
+        A = self.incidence()
+        if relax:
+            res = linprog(self.weights, A_ub=-A, b_ub=-np.ones(self.n_edges), bounds=(0, 1), method='highs')
+        else:
+            res = milp(self.weights, constraints=LinearConstraint(A, lb=1, ub=np.inf),
+                       integrality=np.ones(self.n_nodes), bounds=Bounds(0, 1))
+        if res.x is None:
+            raise RuntimeError('HiGHS failed to solve the MWVC program: ' + str(res.message))
+        return res.x
+
+    def _solveGurobi(self, relax):
+        from gurobipy import Model, GRB
+        model = Model()
+        model.setParam('OutputFlag', False)
+        model.setParam('OptimalityTol', 1e-6)
+        vtype = GRB.CONTINUOUS if relax else GRB.BINARY
+        X = model.addMVar(self.n_nodes, lb=0, ub=1, vtype=vtype)
+        if self.n_edges > 0:
+            model.addConstr(self.incidence() @ X >= 1)
+        model.setObjective(self.weights @ X, GRB.MINIMIZE)
+        model.optimize()
+        if model.status != GRB.OPTIMAL and model.status != GRB.SUBOPTIMAL:
+            print('Gurobi status:', model.status)
+        return X.X
+
+
+def _packingBound(adj, w, nodes):
+    """
+    Lower bound on the MWVC weight of the subgraph induced by :param nodes, from a greedy edge packing
+    (a feasible solution of the LP dual). The nodes whose residual weight drops to 0 form a cover.
+    :return: The bound and the cover.
+    """
+    r = {u: w[u] for u in nodes}
+    bound = 0.0
+    for u in nodes:
+        for v in adj[u]:
+            if v in r and r[u] > 0 and r[v] > 0:
+                y = min(r[u], r[v])
+                r[u] -= y
+                r[v] -= y
+                bound += y
+    cover = set(u for u in nodes if r[u] <= 0 and any(v in r for v in adj[u]))
+    return bound, cover
+
+
+def _reduce(adj, w, nodes, cover):
+    """
+    Applies the reduction rules to the subgraph induced by :param nodes until none applies, moving the nodes
+    decided to be in the cover to :param cover and removing the decided ones from :param nodes:
+        - Degree 0: an isolated node is not in the cover.
+        - Neighborhood weight: if w(u) >= w(N(u)), then N(u) is in the cover (this covers degree 1 nodes
+          heavier than their neighbor).
+    """
+    changed = True
+    while changed:
+        changed = False
+        for u in list(nodes):
+            if u not in nodes:
+                continue
+            nbrs = [v for v in adj[u] if v in nodes]
+            if not nbrs:
+                nodes.discard(u)
+                changed = True
+            elif w[u] >= sum(w[v] for v in nbrs):
+                cover.update(nbrs)
+                nodes.difference_update(nbrs)
+                nodes.discard(u)
+                changed = True
+
+
+def solve_mwvc_exact(G):
+    """
+    Solves the MWVC problem on a (small) graph exactly by branch-and-reduce: reduction rules, then
+    branching on a maximum degree node u (either u or all its neighbors are in the cover), with the edge
+    packing lower bound used to prune.
+    :param G: A networkx Graph with a 'weight' attribute for each node.
+    :return: The set of nodes of a minimum weight vertex cover.
+    """
+    adj = {u: set(G.neighbors(u)) for u in G.nodes()}
+    w = {u: G.nodes[u]['weight'] for u in G.nodes()}
+    nodes = set(adj)
+
+    # Initial upper bound: the cover of the edge packing (a 2-approximation)
+    _, cover = _packingBound(adj, w, nodes)
+    ub = sum(w[u] for u in cover)
+    best = [cover]
+
+    def branch(nodes, cover):
+        nonlocal ub
+        _reduce(adj, w, nodes, cover)
+        cost = sum(w[u] for u in cover)
+        if not nodes:
+            if cost < ub:
+                ub, best[0] = cost, cover
+            return
+        lb, _ = _packingBound(adj, w, nodes)
+        if cost + lb >= ub:
+            return
+        u = max(nodes, key=lambda x: sum(1 for v in adj[x] if v in nodes))
+        nbrs = [v for v in adj[u] if v in nodes]
+        # Branch 1: u in the cover
+        branch(nodes - {u}, cover | {u})
+        # Branch 2: u not in the cover, hence all its neighbors are
+        branch(nodes - {u} - set(nbrs), cover | set(nbrs))
+
+    branch(nodes, set())
+    return best[0]
+
+
+def solve_small_components(G, max_size):
+    """
+    Solves exactly the MWVC problem on the connected components of :param G with at most :param max_size
+    nodes.
+    :return: The subgraph induced by the remaining (large) components, and a dictionary mapping each node of
+    the solved components to its value (1 if in the cover, 0 otherwise).
+    """
+    import networkx as nx
+    values = {}
+    large = []
+    for comp in nx.connected_components(G):
+        if len(comp) > max_size:
+            large.extend(comp)
+            continue
+        cover = solve_mwvc_exact(G.subgraph(comp))
+        for u in comp:
+            values[u] = 1 if u in cover else 0
+    return G.subgraph(large).copy(), values
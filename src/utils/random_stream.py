@@ -0,0 +1,112 @@
+'''Block-buffered random number streams for the hot loops of the algorithms'''
+import numpy as np
+
+
+class _Block:
+    """A block of pre-drawn samples handed out sequentially, either one at a time or as array slices"""
+    def __init__(self, prng, draw, block_size):
+        self.prng = prng
+        self.draw = draw
+        self.block_size = block_size
+        self.samples = np.empty(0)
+        self.size = 0
+        # Python floats of the current block (built on the first scalar request)
+        self.items = None
+        self.pos = 0
+        # Scaled copies of the current block, to avoid a multiplication on every (small) request
+        self.scaled = {}
+
+    def refill(self, n):
+        # Carry over the unused samples and append a new block
+        self.samples = np.concatenate((self.samples[self.pos:], self.draw(max(self.block_size, n))))
+        self.samples.flags.writeable = False
+        self.size = len(self.samples)
+        self.items = None
+        self.pos = 0
+        self.scaled = {}
+
+    def next(self):
+        if self.pos >= self.size:
+            self.refill(1)
+        if self.items is None:
+            self.items = self.samples.tolist()
+        self.pos += 1
+        return self.items[self.pos - 1]
+
+    def take(self, n):
+        pos = self.pos
+        if pos + n > self.size:
+            self.refill(n)
+            pos = 0
+        self.pos = pos + n
+        return self.samples[pos:pos + n]
+
+    def takeScaled(self, n, scale):
+        if 8 * n > self.block_size:
+            return scale * self.take(n)
+        pos = self.pos
+        if pos + n > self.size:
+            self.refill(n)
+            pos = 0
+        self.pos = pos + n
+        samples = self.scaled.get(scale)
+        if samples is None:
+            samples = self.scaled[scale] = scale * self.samples
+            samples.flags.writeable = False
+        return samples[pos:pos + n]
+
+    def getState(self):
+        return {'prng': self.prng.get_state(), 'samples': self.samples[self.pos:].copy()}
+
+    def setState(self, state):
+        self.prng.set_state(state['prng'])
+        self.samples = state['samples'].copy()
+        self.samples.flags.writeable = False
+        self.size = len(self.samples)
+        self.items = None
+        self.pos = 0
+        self.scaled = {}
+
+
+class RandomStream:
+    """
+    Draws uniform and standard normal samples in large blocks and hands out slices of them. Each kind of
+    sample has its own RandomState, so the sequence of samples of each kind only depends on the seed, not on
+    how the requests are sliced or interleaved: runs are reproducible for a given seed.
+    Arrays are returned as read-only views of the blocks.
+    """
+    def __init__(self, seed=1234, block_size=1 << 16):
+        self.seed = seed
+        uniform, normal = np.random.RandomState([seed, 0]), np.random.RandomState([seed, 1])
+        self._uniform = _Block(uniform, uniform.random_sample, block_size)
+        self._normal = _Block(normal, normal.standard_normal, block_size)
+
+    def getState(self):
+        """:return: The states of the generators and the unused samples, from which the stream continues unchanged"""
+        return {'uniform': self._uniform.getState(), 'normal': self._normal.getState()}
+
+    def setState(self, state):
+        self._uniform.setState(state['uniform'])
+        self._normal.setState(state['normal'])
+
+    def uniform(self, size=None):
+        """Uniform samples in [0, 1): a float if :param size is None, an array otherwise"""
+        if size is None:
+            return self._uniform.next()
+        if isinstance(size, int):
+            return self._uniform.take(size)
+        return self._uniform.take(int(np.prod(size))).reshape(size)
+
+    def normal(self, scale=1.0, size=None):
+        """Normal samples with mean 0 and std :param scale: a float if :param size is None, an array otherwise"""
+        if size is None:
+            return scale * self._normal.next()
+        if isinstance(size, int):
+            return self._normal.takeScaled(size, scale)
+        return self._normal.takeScaled(int(np.prod(size)), scale).reshape(size)
+
+    def binomial(self, p, size=None):
+        """Bernoulli trials with success probability :param p (i.e., binomial with n=1)"""
+        if size is None:
+            return int(self._uniform.next() < p)
+        return (self.uniform(size) < p).astype(np.int64)
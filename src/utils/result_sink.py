@@ -0,0 +1,244 @@
+'''Streaming sinks of the per-iteration statistics, written in buffered batches while the algorithms run'''
+import atexit
+import os
+import pathlib
+import signal
+import weakref
+import numpy as np
+
+# Columns of the records, as in StatsCollector.getDataFrameSummary (cost is the anytime cost)
+RECORD_FIELDS = ['alg', 'iter', 'msgs', 'time', 'cost', 'replica', 'seed']
+
+# Record layout of the binary log
+BINARY_MAGIC = b'PYDCOPR1'
+BINARY_DTYPE = np.dtype([('alg', 'S24'), ('iter', '<i8'), ('msgs', '<i8'), ('time', '<f8'), ('cost', '<f8'),
+                         ('replica', '<i4'), ('seed', '<i8')])
+
+_open_sinks = weakref.WeakSet()
+
+
+class ResultSink:
+    """
+    Buffers the iteration records and writes them in batches of :param batch_size records.
+    The open sinks are flushed and closed at exit and, once close_on_signals() is called, on SIGTERM, SIGINT
+    and SIGHUP.
+    If :param append (see the subclasses), the records of an existing file are kept and the new ones appended.
+    """
+    def __init__(self, path, batch_size=1024):
+        self.path = path
+        self.batch_size = batch_size
+        self.buffer = []
+        self.n_written = 0
+        self.closed = False
+        dirout = os.path.dirname(path)
+        if dirout:
+            pathlib.Path(dirout).mkdir(parents=True, exist_ok=True)
+        _open_sinks.add(self)
+
+    def write(self, alg, itr, msgs, time, cost, replica=0, seed=-1):
+        self.buffer.append((str(alg), int(itr), int(msgs), float(time), float(cost), int(replica),
+                            -1 if seed is None else int(seed)))
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer and not self.closed:
+            self._writeBatch(self.buffer)
+            self.n_written += len(self.buffer)
+            self.buffer = []
+
+    def truncate(self, n_records):
+        """
+        Keeps only the first :param n_records records, e.g., those streamed before the checkpoint a run is resumed
+        from (see utils.checkpoint.stats_state).
+        """
+        self.flush()
+        if n_records > self.n_written:
+            raise ValueError('The result sink ' + self.path + ' holds ' + str(self.n_written) + ' records, fewer than '
+                             + str(n_records))
+        self._truncate(n_records)
+        self.n_written = n_records
+
+    def close(self):
+        if not self.closed:
+            self.flush()
+            self._close()
+            self.closed = True
+            _open_sinks.discard(self)
+
+    def _writeBatch(self, records):
+        pass
+
+    def _truncate(self, n_records):
+        pass
+
+    def _close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CsvSink(ResultSink):
+    """Appends to a CSV file in the format of StatsCollector.getDataFrameSummary().to_csv"""
+    def __init__(self, path, batch_size=1024, append=False):
+        super(CsvSink, self).__init__(path, batch_size)
+        if append and os.path.exists(path):
+            self.f = open(path, 'a')
+            with open(path, 'rb') as f:
+                self.n_written = max(0, sum(1 for line in f if line.endswith(b'\n')) - 1)
+            # Drops a line cut by a crash
+            self._truncate(self.n_written)
+        else:
+            self.f = open(path, 'w')
+            self.f.write(',' + ','.join(RECORD_FIELDS) + '\n')
+
+    def _writeBatch(self, records):
+        i = self.n_written
+        self.f.write(''.join('%d,%s,%d,%d,%r,%r,%d,%d\n' % ((i + k,) + r) for k, r in enumerate(records)))
+        self.f.flush()
+
+    def _truncate(self, n_records):
+        self.f.flush()
+        with open(self.path, 'r+b') as f:
+            # The header, then the records
+            for _ in range(n_records + 1):
+                f.readline()
+            f.truncate(f.tell())
+
+    def _close(self):
+        self.f.close()
+
+
+class BinarySink(ResultSink):
+    """
+    Append-only binary log: BINARY_MAGIC followed by fixed size records (BINARY_DTYPE). A record cut by a
+    crash is ignored by read_binary_log.
+    """
+    def __init__(self, path, batch_size=1024, append=False):
+        super(BinarySink, self).__init__(path, batch_size)
+        if append and os.path.exists(path) and os.path.getsize(path) >= len(BINARY_MAGIC):
+            with open(path, 'rb') as f:
+                assert f.read(len(BINARY_MAGIC)) == BINARY_MAGIC, 'Not a result log: ' + path
+            self.f = open(path, 'ab')
+            self.n_written = (os.path.getsize(path) - len(BINARY_MAGIC)) // BINARY_DTYPE.itemsize
+            # Drops a record cut by a crash
+            self._truncate(self.n_written)
+        else:
+            self.f = open(path, 'wb')
+            self.f.write(BINARY_MAGIC)
+
+    def _writeBatch(self, records):
+        np.array(records, dtype=BINARY_DTYPE).tofile(self.f)
+        self.f.flush()
+
+    def _truncate(self, n_records):
+        self.f.flush()
+        os.truncate(self.path, len(BINARY_MAGIC) + n_records * BINARY_DTYPE.itemsize)
+
+    def _close(self):
+        self.f.close()
+
+
+class ParquetSink(ResultSink):
+    """
+    Writes each batch as a Parquet row group (requires pyarrow). The file is readable once closed, hence it can
+    be appended to only if it was closed (not after a crash). The records of the file appended to are rewritten
+    when the first batch is written.
+    """
+    def __init__(self, path, batch_size=8192, append=False):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        super(ParquetSink, self).__init__(path, batch_size)
+        self.pa = pa
+        self.pq = pq
+        self.schema = pa.schema([('alg', pa.string()), ('iter', pa.int64()), ('msgs', pa.int64()),
+                                 ('time', pa.float64()), ('cost', pa.float64()), ('replica', pa.int32()),
+                                 ('seed', pa.int64())])
+        self.writer = None
+        # The records of the file appended to, not rewritten yet
+        self.kept = None
+        if append and os.path.exists(path):
+            try:
+                self.kept = pq.read_table(path, schema=self.schema)
+            except Exception as e:
+                raise ValueError('Cannot append to the result sink ' + path + ', which was not closed (use a .csv '
+                                 'or .bin sink to resume runs after a crash): ' + str(e))
+            self.n_written = self.kept.num_rows
+        else:
+            self._openWriter()
+
+    def _openWriter(self):
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.path, self.schema)
+            if self.kept is not None and self.kept.num_rows > 0:
+                self.writer.write_table(self.kept)
+            self.kept = None
+
+    def _writeBatch(self, records):
+        self._openWriter()
+        columns = list(zip(*records))
+        self.writer.write_table(self.pa.table([list(c) for c in columns], schema=self.schema))
+
+    def _truncate(self, n_records):
+        if self.writer is not None:
+            raise ValueError('The records written to the Parquet file ' + self.path + ' cannot be dropped')
+        self.kept = self.kept.slice(0, n_records)
+
+    def _close(self):
+        self._openWriter()
+        self.writer.close()
+
+
+SINKS = {'.csv': CsvSink, '.bin': BinarySink, '.parquet': ParquetSink}
+
+
+def open_sink(path, batch_size=None, append=False):
+    """
+    :return: The sink of the format given by the extension of :param path (.csv, .bin or .parquet)
+    :param append: If True, the records of an existing file are kept (e.g., to resume a run, see ResultSink.truncate).
+    """
+    ext = os.path.splitext(path)[1]
+    if ext not in SINKS:
+        raise ValueError('Unknown result sink format ' + ext + '. Available: ' + ', '.join(SINKS))
+    if batch_size is None:
+        return SINKS[ext](path, append=append)
+    return SINKS[ext](path, batch_size, append=append)
+
+
+def read_binary_log(path):
+    """:return: The records of a binary log as a dictionary of arrays"""
+    with open(path, 'rb') as f:
+        assert f.read(len(BINARY_MAGIC)) == BINARY_MAGIC, 'Not a result log: ' + path
+        data = f.read()
+    n = len(data) // BINARY_DTYPE.itemsize
+    rec = np.frombuffer(data, dtype=BINARY_DTYPE, count=n)
+    out = {name: rec[name] for name in BINARY_DTYPE.names}
+    out['alg'] = np.char.decode(rec['alg'], 'utf-8').astype(object)
+    return out
+
+
+def close_all():
+    for sink in list(_open_sinks):
+        sink.close()
+
+
+def close_on_signals(signums=(signal.SIGTERM, signal.SIGINT, signal.SIGHUP)):
+    """Closes the open sinks when one of :param signums is received, then runs the previous handler"""
+    def handler(signum, frame):
+        close_all()
+        prev = previous.get(signum)
+        if callable(prev):
+            prev(signum, frame)
+        else:
+            raise SystemExit(128 + signum)
+
+    previous = {}
+    for s in signums:
+        previous[s] = signal.signal(s, handler)
+
+
+atexit.register(close_all)
@@ -1,23 +1,65 @@
 import numpy as np
-import pandas as pd
 
 
 class StatsCollector:
     best_cost = np.inf
     iter_stats = []
+    # The best assignment (array of value indexes) recorded so far and its cost
+    best_assignment = None
+    best_assignment_cost = np.inf
+    # Optional streaming sink of the records (see utils.result_sink)
+    sink = None
+    keep_history = True
+    _sink_best = {}
 
     @staticmethod
     def reset():
         StatsCollector.iter_stats = []
         StatsCollector.best_cost = np.inf
+        StatsCollector.best_assignment = None
+        StatsCollector.best_assignment_cost = np.inf
+        StatsCollector._sink_best = {}
+
+    @staticmethod
+    def attachSink(sink, keep_history=False):
+        """
+        Streams the records to :param sink as they are collected. If not :param keep_history, only the last
+        record is kept in memory (the one needed to chain runs).
+        """
+        StatsCollector.sink = sink
+        StatsCollector.keep_history = keep_history
+        StatsCollector._sink_best = {}
+
+    @staticmethod
+    def detachSink():
+        if StatsCollector.sink is not None:
+            StatsCollector.sink.flush()
+        StatsCollector.sink = None
+        StatsCollector.keep_history = True
+
+    @staticmethod
+    def _append(s):
+        sink = StatsCollector.sink
+        if sink is not None:
+            k = s.get('replica', 0)
+            best = min(s['cost'], StatsCollector._sink_best.get(k, np.inf))
+            StatsCollector._sink_best[k] = best
+            sink.write(s['alg'], s['iteration'], s['messages'], s['time'], best, k, s.get('seed'))
+            if not StatsCollector.keep_history:
+                StatsCollector.iter_stats = []
+        StatsCollector.iter_stats.append(s)
 
     @staticmethod
     def updateIterStats(alg, interactive=True, anytime=True):
-        StatsCollector.iter_stats.append({'alg': alg.name,
+        cost = alg.instance.cost()
+        if cost < StatsCollector.best_assignment_cost:
+            StatsCollector.best_assignment = alg.getAssignment()
+            StatsCollector.best_assignment_cost = cost
+        StatsCollector._append({'alg': alg.name,
                            'iteration': alg.curr_iteration,
                            'messages': alg.num_messages_sent,
                            'time': alg.curr_runtime,
-                           'cost': alg.instance.cost()})
+                           'cost': cost})
 
         if interactive:
             if alg.curr_iteration == 0:
@@ -27,9 +69,32 @@ class StatsCollector:
             print(s['alg'], s['iteration'], s['messages'], round(s['time'], 4),
                   StatsCollector.best_cost if anytime else s['cost'], sep='\t\t')
 
+    @staticmethod
+    def updateBatchIterStats(alg, costs, interactive=True, anytime=True):
+        """Stores one record per replica of a batched (multi-seed) algorithm run"""
+        k = int(np.argmin(costs))
+        if costs[k] < StatsCollector.best_assignment_cost:
+            StatsCollector.best_assignment = alg.X[k].copy()
+            StatsCollector.best_assignment_cost = costs[k]
+        for k, cost in enumerate(costs):
+            StatsCollector._append({'alg': alg.name,
+                               'iteration': alg.curr_iteration,
+                               'messages': alg.num_messages_sent,
+                               'time': alg.curr_runtime,
+                               'cost': cost,
+                               'replica': k,
+                               'seed': alg.seeds[k]})
+
+        if interactive:
+            if alg.curr_iteration == 0:
+                print('alg\titer\tmsgs\ttime\tcost')
+            StatsCollector.best_cost = min(np.min(costs), StatsCollector.best_cost)
+            print(alg.name, alg.curr_iteration, alg.num_messages_sent, round(alg.curr_runtime, 4),
+                  StatsCollector.best_cost if anytime else np.min(costs), sep='\t\t')
+
     @staticmethod
     def addIterStats(algname, itr, cost, msgs, time):
-        StatsCollector.iter_stats.append({'alg': algname,
+        StatsCollector._append({'alg': algname,
                            'iteration': itr,
                            'messages': msgs,
                            'time': time,
@@ -39,27 +104,37 @@ class StatsCollector:
     @staticmethod
     def printSummary(anytime=True, print_n_iter=1):
         print('alg\titer\tmsgs\ttime\tcost')
-        best_cost = np.inf
+        best_cost = {}
         for s in StatsCollector.iter_stats:
-            best_cost = min(s['cost'], best_cost)
+            k = s.get('replica', 0)
+            best_cost[k] = min(s['cost'], best_cost.get(k, np.inf))
             if s['iteration'] % print_n_iter == 0:
-                print(s['alg'], s['iteration'], s['messages'], round(s['time'], 4),
-                      best_cost if anytime else s['cost'], sep='\t\t')
+                print(s['alg'] if k == 0 else s['alg'] + '#' + str(k), s['iteration'], s['messages'],
+                      round(s['time'], 4), best_cost[k] if anytime else s['cost'], sep='\t\t')
 
     @staticmethod
-    def getDataFrameSummary(anytime=True):
+    def getArraySummary(anytime=True):
+        """:return: A dictionary of column arrays (alg, iter, msgs, time, cost[, replica, seed]) of the iterations"""
         if anytime:
-            best_cost, costs = np.inf, []
+            best_cost, costs = {}, []
             for s in StatsCollector.iter_stats:
-                best_cost = min(s['cost'], best_cost)
-                costs.append(best_cost)
+                k = s.get('replica', 0)
+                best_cost[k] = min(s['cost'], best_cost.get(k, np.inf))
+                costs.append(best_cost[k])
         else:
             costs = [s['cost'] for s in StatsCollector.iter_stats]
 
-        return pd.DataFrame(
-            {'alg': [s['alg'] for s in StatsCollector.iter_stats],
-             'iter': [s['iteration'] for s in StatsCollector.iter_stats],
-             'msgs': [s['messages'] for s in StatsCollector.iter_stats],
-             'time': [s['time'] for s in StatsCollector.iter_stats],
-             'cost': costs
-             })
+        summary = {'alg': np.asarray([s['alg'] for s in StatsCollector.iter_stats], dtype=object),
+                   'iter': np.asarray([s['iteration'] for s in StatsCollector.iter_stats], dtype=np.int64),
+                   'msgs': np.asarray([s['messages'] for s in StatsCollector.iter_stats], dtype=np.int64),
+                   'time': np.asarray([s['time'] for s in StatsCollector.iter_stats], dtype=float),
+                   'cost': np.asarray(costs, dtype=float)}
+        if any('replica' in s for s in StatsCollector.iter_stats):
+            summary['replica'] = np.asarray([s.get('replica', 0) for s in StatsCollector.iter_stats], dtype=np.int64)
+            summary['seed'] = np.asarray([s.get('seed') for s in StatsCollector.iter_stats], dtype=object)
+        return summary
+
+    @staticmethod
+    def getDataFrameSummary(anytime=True):
+        import pandas as pd
+        return pd.DataFrame(StatsCollector.getArraySummary(anytime))
@@ -1,4 +1,5 @@
 import networkx as nx
+import numpy as np
 
 def takeMin(cost, best_c, i=None, best_i=None):
     if cost < best_c:
@@ -16,3 +17,15 @@ def insertInTuple(_tuple, _pos, _val):
     _tuple_l = list(_tuple)
     _tuple_l[_pos] = _val
     return tuple(_tuple_l)
+
+def minOverAxes(a, axes):
+    '''
+    Minimum of :param a over :param axes. It folds np.minimum over the slices of each axis, which is much
+    faster than ndarray.min on the short (domain sized) axes of cost tables.
+    '''
+    for axis in sorted(axes, reverse=True):
+        m = np.take(a, 0, axis=axis).copy()
+        for k in range(1, a.shape[axis]):
+            np.minimum(m, np.take(a, k, axis=axis), out=m)
+        a = m
+    return a
@@ -0,0 +1,153 @@
+'''
+Export of DCOP instances to the input formats of the wcsp program: DIMACS (text) and binary.
+Both are built from whole constraint tables at once rather than tuple by tuple, and written to a file or pipe
+in a single buffer (see utils.ccg_utils.run_wcsp).
+'''
+import numpy as np
+
+# Binary format (all little endian):
+#   magic (8 bytes), int64[3]: number of variables, maximum domain size, number of constraints,
+#   int32[n_vars]: domain sizes,
+#   int32[n_cons]: arities, float64[n_cons]: default costs, int64[n_cons]: numbers of listed tuples,
+#   int32[sum of arities]: scopes (variable indexes), int32[sum of ntuples * arity]: the value indexes of the
+#   listed tuples (row major, see _groupTuples), float64[sum of ntuples]: their costs.
+# The constraints, and the tuples of each constraint, are stored in the same order as in the DIMACS format.
+BINARY_MAGIC = b'WCSPBIN1'
+
+
+def cost_offset(instance):
+    """
+    :return: The cost to add to the costs reported by wcsp (e.g., the optimal value and the ccg-maxsum trace) on the
+    exported instance: the sum of the finite default costs, by which the constraints are shifted (see _groupTuples).
+    """
+    defaults = np.asarray([con.default_value for con in instance.constraints.values()], dtype=float)
+    return float(defaults[np.isfinite(defaults)].sum())
+
+
+def _groupTuples(instance):
+    """
+    The listed tuples of the constraints, by constraint group of the compiled instance. A constraint with a finite
+    default cost is exported shifted by it: default cost 0 and the tuples whose cost differs from the default,
+    listed at their cost minus the default, possibly negative (wcsp counts the unlisted tuples at cost 0 in the
+    costs it reports, hence the shift, which leaves the CCG unchanged, see cost_offset). A constraint with an
+    infinite default cost lists all its tuples.
+    Yields (group, defaults, counts, T, costs), where defaults are the exported default costs, T is the
+    (N, arity) array of the value indexes of the listed tuples of the group constraints, sorted by constraint
+    then in row major order, costs their exported costs and counts the number of listed tuples of each
+    constraint.
+    """
+    ci = instance.compiled
+    cons = [instance.constraints[cname] for cname in ci.con_names]
+    for g in ci.groups:
+        defaults = np.asarray([cons[cid].default_value for cid in g.con_ids], dtype=float)
+        shift = np.where(np.isfinite(defaults), defaults, 0)
+        if instance.sparse:
+            tables = [cons[cid].table for cid in g.con_ids]
+            full = [np.arange(t.size) if t.hard else None for t in tables]
+            counts = np.asarray([t.nnz if f is None else t.size for t, f in zip(tables, full)], dtype=np.int64)
+            T = np.concatenate([t.tuples if f is None else np.stack(np.unravel_index(f, t.dom_sizes), axis=1)
+                                for t, f in zip(tables, full)] + [np.zeros((0, g.arity), dtype=np.int64)])
+            costs = np.concatenate([t.costs if f is None else t.lookup(f) for t, f in zip(tables, full)]
+                                   + [np.zeros(0)])
+        else:
+            default = defaults.reshape((-1,) + (1,) * g.arity)
+            keep = (g.tables != default) | np.isinf(default)
+            for j in range(g.arity):
+                # Entries outside the domains are padding
+                shape = [len(g)] + [1] * g.arity
+                vals_shape = [1] * (g.arity + 1)
+                vals_shape[1 + j] = ci.max_dom
+                keep &= np.arange(ci.max_dom).reshape(vals_shape) < ci.dom_size[g.scopes[:, j]].reshape(shape)
+            nz = np.nonzero(keep)
+            counts = np.bincount(nz[0], minlength=len(g))
+            T = np.stack(nz[1:], axis=1).reshape(-1, g.arity)
+            costs = g.tables[nz]
+        costs = costs - np.repeat(shift, counts)
+        yield g, defaults - shift, counts, T, costs
+
+
+def _costValues(costs):
+    """:return: The object array of :param costs, the integral ones as ints (printed without decimals)"""
+    values = costs.astype(object)
+    integral = np.isfinite(costs) & (costs == np.round(costs))
+    values[integral] = costs[integral].astype(np.int64).tolist()
+    return values
+
+
+def _formatRows(fmt, columns):
+    """:return: The list of the rows of :param columns (arrays of the same length) formatted with :param fmt"""
+    n = len(columns[0])
+    if n == 0:
+        return []
+    flat = np.empty((n, len(columns)), dtype=object)
+    for j, col in enumerate(columns):
+        flat[:, j] = col
+    return ('\n'.join([fmt] * n) % tuple(flat.ravel().tolist())).split('\n')
+
+
+def dimacs_text(instance):
+    """
+    :return: The instance in the DIMACS format read by the wcsp program. Variables are numbered in the order of
+    instance.variables and the values of a variable by their index in its domain; the tuples listed are those
+    described in _groupTuples.
+    """
+    ci = instance.compiled
+    groups = list(_groupTuples(instance))
+    # Each constraint is a block of lines (its signature, then its tuples), the blocks in constraint order
+    block_len = np.ones(len(ci.con_names), dtype=np.int64)
+    for g, _, counts, _, _ in groups:
+        block_len[g.con_ids] += counts
+    start = 2 + np.cumsum(block_len) - block_len
+    lines = np.empty(2 + int(block_len.sum()), dtype=object)
+    lines[0] = 'edges {} {} {} 9999999'.format(ci.n_vars, ci.max_dom, len(ci.con_names))
+    lines[1] = ' '.join(map(str, ci.dom_size.tolist()))
+    for g, defaults, counts, T, costs in groups:
+        a = g.arity
+        heads = _formatRows(' '.join(['%d'] * (a + 1) + ['%s', '%d']),
+                            [np.full(len(g), a)] + list(g.scopes.T) + [_costValues(defaults), counts])
+        rows = _formatRows(' '.join(['%d'] * a + ['%s']), list(T.T) + [_costValues(costs)])
+        lines[start[g.con_ids]] = heads
+        if rows:
+            offset = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+            lines[np.repeat(start[g.con_ids] + 1, counts) + offset] = rows
+    return '\n'.join(lines.tolist()) + '\n'
+
+
+def write_dimacs(instance, f):
+    """Writes the instance in DIMACS format (see dimacs_text) to the binary file or pipe :param f"""
+    f.write(dimacs_text(instance).encode('ascii'))
+
+
+def write_binary(instance, f):
+    """Writes the instance in the binary format (see BINARY_MAGIC) to the binary file or pipe :param f"""
+    ci = instance.compiled
+    nc = len(ci.con_names)
+    arity = np.zeros(nc, dtype='<i4')
+    defaults = np.zeros(nc, dtype='<f8')
+    counts = np.zeros(nc, dtype='<i8')
+    scopes, scope_owner, vals, val_owner, costs, cost_owner = [], [], [], [], [], []
+    for g, g_defaults, g_counts, T, g_costs in _groupTuples(instance):
+        arity[g.con_ids] = g.arity
+        defaults[g.con_ids] = g_defaults
+        counts[g.con_ids] = g_counts
+        scopes.append(g.scopes.ravel())
+        scope_owner.append(np.repeat(g.con_ids, g.arity))
+        owner = np.repeat(g.con_ids, g_counts)
+        vals.append(T.ravel())
+        val_owner.append(np.repeat(owner, g.arity))
+        costs.append(g_costs)
+        cost_owner.append(owner)
+
+    def ordered(parts, owners, dtype):
+        # Stable sort by constraint: the entries of each constraint keep their order
+        if not parts:
+            return np.zeros(0, dtype=dtype)
+        owner = np.concatenate(owners)
+        return np.concatenate(parts)[np.argsort(owner, kind='stable')].astype(dtype)
+
+    f.write(BINARY_MAGIC)
+    f.write(np.asarray([ci.n_vars, ci.max_dom, nc], dtype='<i8').tobytes())
+    f.write(ci.dom_size.astype('<i4').tobytes())
+    for arr in (arity, defaults, counts, ordered(scopes, scope_owner, '<i4'), ordered(vals, val_owner, '<i4'),
+                ordered(costs, cost_owner, '<f8')):
+        f.write(arr.tobytes())
@@ -0,0 +1,130 @@
+'''
+Persistent wcsp processes. A WcspWorker keeps one wcsp executable running in serve mode (wcsp --serve) and sends
+it the instances to solve over its standard input, so that runs on many small instances do not pay a process
+spawn each. Requests and responses are length prefixed (all integers little endian):
+    request:  uint64 length of the rest, uint32 number of arguments, each argument as uint32 length and bytes,
+              then the instance in the input format selected by the arguments,
+    response: uint64 length of the rest, int32 exit status, then the standard output of the run.
+A WcspPool dispatches requests to several workers concurrently.
+'''
+import io
+import os
+import queue
+import struct
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.wcsp_io import write_dimacs, write_binary
+
+
+def encode_request(instance, options, binary=True):
+    """
+    :return: The request (a bytes-like object) running wcsp with the command line :param options on
+    :param instance.
+    """
+    args = (['-f', 'b'] if binary else []) + list(options)
+    buf = io.BytesIO()
+    buf.write(bytes(8))
+    buf.write(struct.pack('<I', len(args)))
+    for arg in args:
+        arg = arg.encode('utf-8')
+        buf.write(struct.pack('<I', len(arg)))
+        buf.write(arg)
+    (write_binary if binary else write_dimacs)(instance, buf)
+    data = buf.getbuffer()
+    data[:8] = struct.pack('<Q', len(data) - 8)
+    return data
+
+
+class WcspWorker:
+    """
+    A wcsp executable running in serve mode. Requests are served one at a time (see WcspPool to run several
+    concurrently); the process exits when the worker is closed.
+    """
+    def __init__(self, executable):
+        self.executable = executable
+        self.proc = subprocess.Popen([executable, '--serve'], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        # The process which started the worker: a forked process must not share the pipes of its parent's workers
+        self.owner_pid = os.getpid()
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def run(self, instance, options, binary=True):
+        """
+        Runs wcsp with the command line :param options on :param instance.
+        :param binary: Whether to send the instance in binary format rather than DIMACS.
+        :return: The standard output of the run.
+        :raise subprocess.CalledProcessError: If the run fails, or the process exits (the worker is then dead).
+        """
+        cmd = [self.executable] + list(options)
+        try:
+            self.proc.stdin.write(encode_request(instance, options, binary))
+            self.proc.stdin.flush()
+            header = self.proc.stdout.read(8)
+            response = self.proc.stdout.read(struct.unpack('<Q', header)[0]) if len(header) == 8 else b''
+        except BrokenPipeError:
+            response = b''
+        if len(response) < 4:
+            raise subprocess.CalledProcessError(self.proc.wait(), cmd)
+        status, = struct.unpack('<i', response[:4])
+        output = response[4:].decode('utf-8')
+        if status != 0:
+            raise subprocess.CalledProcessError(status, cmd, output)
+        return output
+
+    def close(self):
+        if self.proc.stdin is not None and not self.proc.stdin.closed:
+            try:
+                self.proc.stdin.close()
+            except BrokenPipeError:
+                pass
+        self.proc.wait()
+        self.proc.stdout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class WcspPool:
+    """
+    A pool of :param n_workers WcspWorkers (default: the number of CPUs). Each request is served by the first
+    free worker; a worker whose process died is replaced.
+    """
+    def __init__(self, executable, n_workers=None):
+        self.executable = executable
+        self.workers = [WcspWorker(executable) for _ in range(n_workers or os.cpu_count() or 1)]
+        self._free = queue.Queue()
+        for w in self.workers:
+            self._free.put(w)
+
+    def run(self, instance, options, binary=True):
+        """See WcspWorker.run"""
+        w = self._free.get()
+        try:
+            return w.run(instance, options, binary)
+        finally:
+            if not w.alive():
+                w.close()
+                self.workers.remove(w)
+                w = WcspWorker(self.executable)
+                self.workers.append(w)
+            self._free.put(w)
+
+    def map(self, instances, options, binary=True):
+        """:return: The list of the outputs of the runs of wcsp with :param options on :param instances"""
+        with ThreadPoolExecutor(len(self.workers)) as ex:
+            return list(ex.map(lambda instance: self.run(instance, options, binary), instances))
+
+    def close(self):
+        for w in self.workers:
+            w.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
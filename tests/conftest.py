@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules are imported from src (e.g., `from core.dcop_instance import DCOPInstance`), as by the scripts there
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
@@ -0,0 +1,40 @@
+'''Random DCOP instances for the tests, built with the dynamic instance API'''
+import itertools
+
+import numpy as np
+
+from core.dcop_instance import DCOPInstance
+
+
+def random_instance(n_agents=4, vars_per_agent=2, max_dom=3, p=0.4, max_arity=2, hard=0.0, sparse=False,
+                    shifted=False, seed=0):
+    """
+    :return: A DCOPInstance of n_agents agents controlling vars_per_agent variables each (of domain sizes in
+    [2, max_dom], whose values are their indexes unless shifted), where each set of at most max_arity variables is constrained with
+    probability p, with integral costs in [0, 20) and a fraction hard of infinite costs.
+    """
+    rng = np.random.RandomState(seed)
+    dcop = DCOPInstance(seed=seed, sparse=sparse)
+    with dcop.batch():
+        for a in range(n_agents):
+            for k in range(vars_per_agent):
+                dsize = rng.randint(2, max_dom + 1)
+                domain = [10 * d + 1 for d in range(dsize)] if shifted else list(range(dsize))
+                dcop.add_variable('v%d_%d' % (a, k), domain, 'a%d' % a)
+        names = list(dcop.variables)
+        for arity in range(1, max_arity + 1):
+            for scope in itertools.combinations(names, arity):
+                if rng.rand() >= p:
+                    continue
+                size = int(np.prod([len(dcop.variables[v].domain) for v in scope]))
+                costs = rng.randint(0, 20, size=size).astype(float)
+                costs[rng.rand(size) < hard] = np.inf
+                dcop.add_constraint('c_' + '_'.join(scope), list(scope), costs)
+    return dcop
+
+
+
+def all_assignments(dcop):
+    """:return: The (N, n_vars) array of all the assignments (value indexes) of :param dcop, in product order"""
+    domains = [range(len(var.domain)) for var in dcop.variables.values()]
+    return np.asarray(list(itertools.product(*domains)), dtype=np.int64).reshape(-1, len(domains))
@@ -0,0 +1,100 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from core.constraint import Constraint
+from core.cost_table import SparseCostTable, _minExcluding
+from core.variable import Variable
+
+
+def random_table(rng, dom_sizes, density, default):
+    size = int(np.prod(dom_sizes))
+    costs = np.full(size, float(default))
+    explicit = rng.rand(size) < density
+    costs[explicit] = rng.randint(0, 20, size=explicit.sum())
+    return SparseCostTable.fromCosts(dom_sizes, costs, default), costs.reshape(dom_sizes)
+
+
+def dense_min_marginals(dense, msgs):
+    S = dense.copy()
+    for i, q in enumerate(msgs):
+        shape = [1] * dense.ndim
+        shape[i] = -1
+        S = S + q.reshape(shape)
+    out = []
+    for i, q in enumerate(msgs):
+        axes = tuple(j for j in range(dense.ndim) if j != i)
+        out.append((np.min(S, axis=axes) if axes else S) - q)
+    return out
+
+
+@pytest.mark.parametrize('dom_sizes', [(3,), (2, 3), (3, 3, 2), (2, 2, 2, 3)])
+@pytest.mark.parametrize('density', [0.0, 0.2, 0.7, 1.0])
+@pytest.mark.parametrize('default', [0, 5, np.inf])
+def test_min_marginals_match_dense(dom_sizes, density, default):
+    rng = np.random.RandomState(len(dom_sizes) + int(10 * density))
+    for _ in range(5):
+        table, dense = random_table(rng, dom_sizes, density, default)
+        msgs = [rng.normal(0, 5, size=d) for d in dom_sizes]
+        for m, ref in zip(table.minMarginals(msgs), dense_min_marginals(dense, msgs)):
+            np.testing.assert_allclose(m, ref)
+
+
+def test_min_excluding_matches_enumeration():
+    rng = np.random.RandomState(0)
+    for _ in range(50):
+        dom_sizes = rng.randint(1, 4, size=rng.randint(1, 4))
+        msgs = [rng.randint(0, 5, size=d).astype(float) for d in dom_sizes]
+        tuples = list(itertools.product(*[range(d) for d in dom_sizes]))
+        excluded = {t for t in tuples if rng.rand() < 0.6}
+        ref = min((sum(q[i] for q, i in zip(msgs, t)) for t in tuples if t not in excluded), default=np.inf)
+        assert _minExcluding(msgs, excluded) == ref
+
+
+def test_lookups_match_dense():
+    rng = np.random.RandomState(1)
+    table, dense = random_table(rng, (3, 4, 2), 0.3, 7)
+    np.testing.assert_array_equal(table.toDense(), dense)
+    X = np.stack(np.unravel_index(np.arange(dense.size), dense.shape), axis=1)
+    np.testing.assert_array_equal(table.evaluateMany(X), dense.ravel())
+    assert [table.cost(k) for k in range(dense.size)] == dense.ravel().tolist()
+    np.testing.assert_array_equal(table.bestResponse((1, 0, 1), 1), dense[1, :, 1])
+    np.testing.assert_array_equal(table.condition({2: 0}), dense[:, :, 0])
+
+
+def test_with_default_keeps_costs():
+    rng = np.random.RandomState(2)
+    table, dense = random_table(rng, (3, 3), 0.8, 0)
+    for default in (None, 0, 3, np.inf):
+        np.testing.assert_array_equal(table.withDefault(default).toDense(), dense)
+    assert table.withDefault(3).default == 3
+
+
+def test_constraint_values_derived_from_table():
+    x = Variable('x', domain=['a', 'b', 'c'])
+    y = Variable('y', domain=[10, 20])
+    con = Constraint('c', scope=[x, y], values={('a', 10): 4, ('b', 20): 1, ('c', 10): 0}, default_value=1)
+    assert con.values == {('a', 10): 4, ('c', 10): 0}
+    assert [con.evaluateTuple(t) for t in itertools.product(x.domain, y.domain)] == [4, 1, 1, 1, 0, 1]
+    con.sparsify(0)
+    assert con.default_value == 0
+    assert [con.evaluateTuple(t) for t in itertools.product(x.domain, y.domain)] == [4, 1, 1, 1, 0, 1]
+    x.value, y.value = 'b', 10
+    assert con.evaluate() == 1
+
+
+def test_sparse_instance_keeps_costs():
+    from core.dcop_generator import DCOPGenerator
+    from core.dcop_instance import DCOPInstance
+    instances = []
+    for sparse in (False, True):
+        G = DCOPGenerator(seed=3).random_graph(nnodes=12, p1=0.3)
+        dcop = DCOPInstance(seed=3, sparse=sparse)
+        dcop.generate_from_graph(G=G, dsize=3, max_clique_size=2, cost_range=(0, 10), p2=0.8)
+        instances.append(dcop)
+    dense, sparse = instances
+    assert all(con.default_value == 0 for con in dense.constraints.values())
+    X = np.random.RandomState(0).randint(0, 3, size=(100, len(dense.variables)))
+    np.testing.assert_array_equal(dense.cost_many(X), sparse.cost_many(X))
+    np.testing.assert_array_equal(dense.compiled.cost(X), sparse.cost_many(X))
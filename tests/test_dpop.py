@@ -0,0 +1,20 @@
+import numpy as np
+import pytest
+
+import api
+from algorithms.dpop import ENTRY_NBYTES
+from helpers import random_instance, all_assignments
+
+
+@pytest.mark.parametrize('seed', range(4))
+@pytest.mark.parametrize('memory_limit', [None, 3 * ENTRY_NBYTES, 9 * ENTRY_NBYTES, 27 * ENTRY_NBYTES])
+@pytest.mark.parametrize('hard', [0.0, 0.2])
+def test_dpop_matches_enumeration(seed, memory_limit, hard):
+    dcop = random_instance(n_agents=4, vars_per_agent=2, max_dom=3, p=0.35, max_arity=3, hard=hard, seed=seed)
+    optimum = dcop.cost_many(all_assignments(dcop)).min()
+
+    res = api.run(dcop, 'dpop', {'memory_limit': memory_limit})
+    assert res['optimal_cost'] == optimum
+    assert dcop.cost_many(res['assignment'])[0] == optimum
+    if memory_limit is not None:
+        assert ENTRY_NBYTES * res['util_msg_sizes'].max() <= memory_limit
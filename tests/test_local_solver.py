@@ -0,0 +1,35 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from core.local_solver import LocalSolver
+from helpers import random_instance
+
+
+def enumerate_best(agt, view):
+    """The first assignment of the product of the agent domains of minimum cost, and its cost"""
+    constraints = list(dict.fromkeys(con for var in agt.variables for con in var.constraints))
+    best = (np.inf, None)
+    for values in itertools.product(*[var.domain for var in agt.variables]):
+        full = dict(view, **{var.name: val for var, val in zip(agt.variables, values)})
+        cost = sum(con.evaluate(full) for con in constraints)
+        if best[1] is None or cost < best[0]:
+            best = (cost, list(values))
+    return best
+
+
+@pytest.mark.parametrize('seed', range(6))
+@pytest.mark.parametrize('hard', [0.0, 0.3])
+def test_local_solver_matches_enumeration(seed, hard):
+    dcop = random_instance(n_agents=3, vars_per_agent=3, max_dom=3, p=0.5, max_arity=3, hard=hard,
+                           shifted=True, seed=seed)
+    rng = np.random.RandomState(seed)
+    for agt in dcop.agents.values():
+        solver = LocalSolver(agt)
+        for _ in range(4):
+            view = {var.name: var.domain[rng.randint(len(var.domain))] for var in dcop.variables.values()}
+            cost, values = solver.solve(view)
+            ref_cost, ref_values = enumerate_best(agt, view)
+            assert cost == ref_cost
+            assert values == ref_values
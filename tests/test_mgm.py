@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+import api
+from helpers import random_instance
+
+
+class CostRecorder:
+    """Monitor recording the cost of every replica at the end of each iteration"""
+    def __init__(self):
+        self.costs = []
+        self.alg = None
+
+    def step(self, alg):
+        self.alg = alg
+        self.costs.append(alg.compiled.cost(alg.X))
+        return False
+
+
+def run(dcop, algorithm, n_replicas, max_iter=60, seed=7, **params):
+    monitor = CostRecorder()
+    params.update({'max_iter': max_iter, 'n_replicas': n_replicas})
+    api.run(dcop, algorithm, params, seed=seed, monitor=monitor)
+    return np.asarray(monitor.costs), monitor.alg
+
+
+@pytest.mark.parametrize('algorithm', ['mgm', 'mgm2'])
+@pytest.mark.parametrize('seed', range(4))
+@pytest.mark.parametrize('hard', [0.0, 0.1])
+def test_cost_never_increases(algorithm, seed, hard):
+    dcop = random_instance(n_agents=6, vars_per_agent=2, max_dom=4, p=0.3, max_arity=3, hard=hard, seed=seed)
+    costs, _ = run(dcop, algorithm, n_replicas=3, seed=seed)
+    assert np.all(costs[1:] <= costs[:-1])
+
+
+@pytest.mark.parametrize('algorithm', ['mgm', 'mgm2'])
+def test_converges_to_local_optimum(algorithm):
+    dcop = random_instance(n_agents=6, vars_per_agent=2, max_dom=4, p=0.3, seed=1)
+    _, alg = run(dcop, algorithm, n_replicas=4, max_iter=200)
+    _, gain, _ = alg.unilateralGains(alg.X)
+    assert not gain.any()
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_mgm2_converges_to_pairwise_optimum(seed):
+    # No joint move of two neighbors improves the final assignments (checked on the instance costs), which MGM
+    # alone does not reach on these instances
+    dcop = random_instance(n_agents=8, vars_per_agent=1, max_dom=3, p=0.4, seed=seed)
+    _, alg = run(dcop, 'mgm2', n_replicas=3, max_iter=300)
+    ci = alg.compiled
+    for x in alg.X:
+        cost = dcop.cost_many(x)[0]
+        for u, v in zip(ci.adj_row, ci.adj_idx):
+            Y = np.repeat(x[None], ci.dom_size[u] * ci.dom_size[v], axis=0)
+            Y[:, u], Y[:, v] = np.divmod(np.arange(len(Y)), ci.dom_size[v])
+            assert dcop.cost_many(Y).min() >= cost
+
+
+def test_replicas_start_apart():
+    dcop = random_instance(n_agents=8, vars_per_agent=2, max_dom=4, p=0.3, seed=2)
+    costs, _ = run(dcop, 'mgm', n_replicas=4, max_iter=20)
+    single, _ = run(dcop, 'mgm', n_replicas=1, max_iter=20)
+    # The first replica starts from the instance assignment, as a single run does; the others elsewhere
+    np.testing.assert_array_equal(costs[:, 0], single[:, 0])
+    assert len({tuple(c) for c in costs.T}) == 4
@@ -31,6 +31,8 @@
 #include <utility>
 #include <tuple>
 #include <chrono>
+#include <iomanip>
+#include <limits>
 
 #include <boost/any.hpp>
 
@@ -104,7 +106,8 @@ public:
         double total_weight = 0.0;
         uintmax_t num_iterations = 0;
         uintmax_t net_load = 0;
-        uintmax_t best_cost = 1e10;
+        // Costs can be negative (e.g., constraints shifted by their default cost) or fractional
+        weight_t best_cost = std::numeric_limits<weight_t>::infinity();
 
 
         typedef std::chrono::high_resolution_clock Time;
@@ -239,10 +242,11 @@ public:
                     solution[v] = std::distance(bvs.begin(), false_v) + 1;
             }
 
-            uintmax_t a = instance.computeTotalWeight(solution);
+            weight_t a = instance.computeTotalWeight(solution);
             
             if (best_cost > a) best_cost = a;
-            std::cout << num_iterations << "\t" << best_cost << "\t" << net_load << "\t" 
+            std::cout << num_iterations << "\t" << std::setprecision(std::numeric_limits<weight_t>::max_digits10)
+                      << best_cost << "\t" << net_load << "\t"
                       << curr_time.count() << endl;
 
             //std::cout << num_iterations << "\t" << instance.computeTotalWeight(out) << "\t" << net_load << std::endl;
@@ -34,6 +34,7 @@
 #include <numeric>
 #include <set>
 #include <stdexcept>
+#include <string>
 #include <utility>
 #include <vector>
 
@@ -487,12 +488,20 @@ public:
      */
     void loadUAI(std::istream& f);
 
+    /** \brief Load the problem in the binary format written by the Python package (utils/wcsp_io.py): the
+     * content of the DIMACS format stored as little endian arrays, the values of the tuples being value indexes.
+     *
+     * \param[in] f The input stream, opened in binary mode.
+     */
+    void loadBinary(std::istream& f);
+
     /** List of supported input file formats.
      */
     enum class Format
     {
         DIMACS,
-        UAI
+        UAI,
+        BINARY
     };
 
     /** \brief Construct a WCSP instance from an input stream in a given format.
@@ -511,6 +520,9 @@ public:
         case Format::UAI:
             loadUAI(f);
             break;
+        case Format::BINARY:
+            loadBinary(f);
+            break;
         }
     }
 
@@ -1021,6 +1033,128 @@ void WCSPInstance<VarIdType, WeightType, ConstraintValueType, NonBooleanValueTyp
     }
 }
 
+/** \brief Read \p n values from a binary stream (the stream and the host are assumed to be little endian).
+ */
+template <class T>
+inline void readBinaryArray(std::istream& f, T* data, size_t n)
+{
+    f.read(reinterpret_cast<char*>(data), n * sizeof(T));
+    if (!f)
+        throw std::runtime_error("Truncated binary WCSP input");
+}
+
+template <class VarIdType, class WeightType, class ConstraintValueType, class NonBooleanValueType>
+void WCSPInstance<VarIdType, WeightType, ConstraintValueType, NonBooleanValueType>::loadBinary(
+    std::istream& f)
+{
+    char magic[8];
+    readBinaryArray(f, magic, 8);
+    if (std::string(magic, 8) != "WCSPBIN1")
+        throw std::runtime_error("Not a binary WCSP input");
+
+    // number of variables, max domain size, number of constraints
+    int64_t header[3];
+    readBinaryArray(f, header, 3);
+    size_t nv = header[0], max_domain_size = header[1], nc = header[2];
+
+    std::vector<int32_t> domain_sizes(nv);
+    readBinaryArray(f, domain_sizes.data(), nv);
+    variable_id_t cur_var_id = 0;
+    nonBooleanVariables.clear();
+    nonBooleanVariables.reserve(nv);
+    for (size_t i = 0; i < nv; ++ i)
+    {
+        // Boolean variables corresponding to the current variable
+        std::vector<variable_id_t> vs(domain_sizes[i]-1);
+        std::iota(vs.begin(), vs.end(), cur_var_id);
+        cur_var_id += vs.size();
+        nonBooleanVariables.push_back(std::move(vs));
+    }
+
+    std::vector<int32_t> arities(nc);
+    std::vector<double> default_costs(nc);
+    std::vector<int64_t> ntuples(nc); // number of tuples not having the default cost of each constraint
+    readBinaryArray(f, arities.data(), nc);
+    readBinaryArray(f, default_costs.data(), nc);
+    readBinaryArray(f, ntuples.data(), nc);
+    size_t nscopes = std::accumulate(arities.begin(), arities.end(), size_t(0));
+    size_t nentries = 0, ntotal = 0;
+    for (size_t i = 0; i < nc; ++ i)
+    {
+        nentries += arities[i] * ntuples[i];
+        ntotal += ntuples[i];
+    }
+    std::vector<int32_t> scopes(nscopes), tuple_values(nentries);
+    std::vector<double> costs(ntotal);
+    readBinaryArray(f, scopes.data(), nscopes);
+    readBinaryArray(f, tuple_values.data(), nentries);
+    readBinaryArray(f, costs.data(), ntotal);
+
+    constraints.clear();
+    constraints.resize(nc);
+
+    // iterate over constraints
+    auto scope_it = scopes.cbegin();
+    auto value_it = tuple_values.cbegin();
+    auto cost_it = costs.cbegin();
+    for (size_t i = 0; i < nc; ++ i)
+    {
+        size_t arity = arities[i];
+        weight_t default_cost = default_costs[i];
+
+        // the variables in the constraint, and the corresponding Boolean variables
+        std::vector<variable_id_t> non_bool_variables(scope_it, scope_it + arity);
+        scope_it += arity;
+        std::vector<variable_id_t> variables;
+        variables.reserve(arity*max_domain_size);
+        for (variable_id_t vid : non_bool_variables)
+        {
+            const auto& nbv = nonBooleanVariables[vid];
+            variables.insert(variables.end(), nbv.begin(), nbv.end());
+        }
+        constraints[i].setVariables(std::move(variables));
+        constraints[i].setNonBooleanVariables(std::move(non_bool_variables));
+        if (default_cost > std::abs(1e-6))   // non-zero default cost
+        {
+            constraint_value_t values;
+            values.resize(constraints[i].getVariables().size());
+            unsigned long te = (1u << constraints[i].getVariables().size());
+            for (unsigned long l = 0; l < te; ++ l)
+            {
+                for (unsigned long k = 0; k < values.size(); ++ k)
+                    values.set(k, (l & (1u << k)) ? 1 : 0);
+                constraints[i].setWeight(values, default_cost);
+            }
+        }
+
+        // the entries in the constraints
+        for (int64_t j = 0; j < ntuples[i]; ++ j)
+        {
+            weight_t cost = *cost_it ++;
+            constraint_value_t values;
+            values.resize(constraints[i].getVariables().size());
+            values.set();
+            std::vector<non_boolean_value_t> non_boolean_values(arity);
+            for (size_t k = 0, cur_bit = 0; k < arity; ++ k)
+            {
+                int val = *value_it ++;
+                non_boolean_values[k] = val;
+                size_t bvs = nonBooleanVariables[constraints[i].getNonBooleanVariables()[k]].size();
+                if (bvs == 1)
+                    values.set(cur_bit ++, val ? true : false);
+                else
+                {
+                    if (val != 0)
+                        values.set(cur_bit + val - 1, false);
+                    cur_bit += bvs;
+                }
+            }
+            constraints[i].setWeight(std::move(non_boolean_values), cost);
+            constraints[i].setWeight(std::move(values), cost);
+        }
+    }
+}
+
 template <class VarIdType, class WeightType, class ConstraintValueType, class NonBooleanValueType>
 void WCSPInstance<VarIdType, WeightType, ConstraintValueType, NonBooleanValueType>::loadUAI(
     std::istream& f)
@@ -17,7 +17,9 @@
   along with WCSPLift.  If not, see <http://www.gnu.org/licenses/>.
 */
 
+#include <cstdint>
 #include <iostream>
+#include <sstream>
 
 #include <boost/algorithm/string.hpp>
 #include <boost/program_options.hpp>
@@ -47,7 +49,9 @@ static void print_results(const T1& instance, const T2& assignments)
     std::cout << "Optimal value: " << opt_value << std::endl;
 }
 
-int main(int argc, const char** argv)
+// Run the program on the command line argc, argv. If input is not null, the problem is read from it rather than
+// from the input file.
+static int run(int argc, const char** argv, std::istream* input = nullptr)
 {
     RunningTime::GetInstance().setStartingTime(std::chrono::high_resolution_clock::now());
 
@@ -68,14 +72,15 @@ int main(int argc, const char** argv)
              "specify the file that the output CCG should be written into (default is stdout)")
             ("file-format,f", po::value<>(&file_format)->default_value('d')->notifier(
                 [](char x){
-                    if (x != 'd' && x != 'u')
+                    if (x != 'd' && x != 'u' && x != 'b')
                         throw po::validation_error(
                             po::validation_error::invalid_option_value,
                             "file-format", std::string(1, x));
                 }),
              "specify the input file format:\n"
              "d: DIMACS\n"
-             "u: UAI\n")
+             "u: UAI\n"
+             "b: binary (see WCSPInstance::loadBinary)\n")
             ("ccg-only,g", "print the CCG only without solving the MWVC problem on it")
             ("no-kernelization,k", "don't kernelize")
             ("kernelization-only,K", "exit after kernelization")
@@ -96,7 +101,12 @@ int main(int argc, const char** argv)
             ("parameters,p", po::value<>(&parameters)->default_value(""))
             ("time-limit,t",
              po::value<double>(&time_limit)->default_value(std::numeric_limits<double>::max()),
-             "specify the time limit in seconds (currently used for message passing and linear programming algorithms)");
+             "specify the time limit in seconds (currently used for message passing and linear programming algorithms)")
+            ("serve",
+             "serve requests read from stdin until it is closed, without an input file (must be the only option). "
+             "Request: uint64 length of the rest, uint32 number of arguments, each argument as uint32 length and "
+             "bytes, then the problem. Response on stdout: uint64 length of the rest, int32 exit status, then the "
+             "output of the run. All integers are little endian.");
 
         po::options_description desc_hidden("Hidden Options");
         desc_hidden.add_options()
@@ -147,7 +157,11 @@ int main(int argc, const char** argv)
         }
     }
 
-    std::ifstream in(vm["input-file"].as<std::string>());
+    std::ifstream file_in;
+    if (!input)
+        file_in.open(vm["input-file"].as<std::string>(),
+                     file_format == 'b' ? std::ios::in | std::ios::binary : std::ios::in);
+    std::istream& in = input ? *input : file_in;
 
     if (!in)
     {
@@ -165,12 +179,15 @@ int main(int argc, const char** argv)
     case 'u':
         fformat = WCSPInstance<>::Format::UAI;
         break;
+    case 'b':
+        fformat = WCSPInstance<>::Format::BINARY;
+        break;
     }
     WCSPInstance<> instance(in, fformat);
     instance.displayNonBooleanVariableMapping();
 
-    if (time_limit != std::numeric_limits<double>::max())  // time limit is set
-        RunningTime::GetInstance().setTimeLimit(std::chrono::duration<double>(time_limit));
+    // max() if no time limit is set (also resets the limit of a previous request in serve mode)
+    RunningTime::GetInstance().setTimeLimit(std::chrono::duration<double>(time_limit));
 
 #if 0
     if (vm.count("message-passing"))
@@ -267,7 +284,7 @@ int main(int argc, const char** argv)
         }
 
         if (vm.count("kernelization-only"))
-            std::exit(0);
+            return 0;
 
         switch (mwvc_solver)
         {
@@ -318,3 +335,69 @@ int main(int argc, const char** argv)
 
     return 0;
 }
+
+// Serve the requests read from stdin (see the "serve" option).
+static int serve(const char* argv0)
+{
+    std::streambuf* stdout_buf = std::cout.rdbuf();
+    uint64_t length;
+    while (std::cin.read(reinterpret_cast<char*>(&length), sizeof(length)))
+    {
+        std::string request(length, '\0');
+        if (!std::cin.read(&request[0], length))
+        {
+            std::cerr << "Truncated request" << std::endl;
+            return 2;
+        }
+
+        // The arguments of the run, then the problem
+        std::istringstream rs(request);
+        uint32_t nargs;
+        rs.read(reinterpret_cast<char*>(&nargs), sizeof(nargs));
+        std::vector<std::string> args{argv0};
+        for (uint32_t i = 0; i < nargs; ++ i)
+        {
+            uint32_t len;
+            rs.read(reinterpret_cast<char*>(&len), sizeof(len));
+            std::string arg(len, '\0');
+            rs.read(&arg[0], len);
+            args.push_back(std::move(arg));
+        }
+        args.push_back("-");  // the input file, unused
+        std::vector<const char*> run_argv;
+        for (const auto& arg : args)
+            run_argv.push_back(arg.c_str());
+        std::istringstream problem(request.substr(static_cast<size_t>(rs.tellg())),
+                                   std::ios::in | std::ios::binary);
+
+        // The output of the run is captured and sent as the response
+        std::ostringstream out;
+        std::cout.rdbuf(out.rdbuf());
+        int32_t status;
+        try
+        {
+            status = run(static_cast<int>(run_argv.size()), run_argv.data(), &problem);
+        }
+        catch (const std::exception& e)
+        {
+            std::cerr << e.what() << std::endl;
+            status = 3;
+        }
+        std::cout.rdbuf(stdout_buf);
+
+        std::string response = out.str();
+        uint64_t response_length = sizeof(status) + response.size();
+        std::cout.write(reinterpret_cast<const char*>(&response_length), sizeof(response_length));
+        std::cout.write(reinterpret_cast<const char*>(&status), sizeof(status));
+        std::cout.write(response.data(), response.size());
+        std::cout.flush();
+    }
+    return 0;
+}
+
+int main(int argc, const char** argv)
+{
+    if (argc == 2 && std::string(argv[1]) == "--serve")
+        return serve(argv[0]);
+    return run(argc, argv);
+}